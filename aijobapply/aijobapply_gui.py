@@ -4,12 +4,9 @@ import os
 # Set the PYTHONPATH to the root of the project
 import sys
 import tkinter as tk
-from re import T
 from threading import Thread
 from tkinter import filedialog, messagebox, scrolledtext, ttk
 
-import docx
-
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from aijobapply.main import run_application
@@ -201,7 +198,8 @@ class AIJobApplyGUI:
                     messagebox.showerror("Invalid File", "Only .docx files are supported.")
                     return
                 
-                # Get the content of the file
+                # Get the content of the file, python-docx is only imported when a file is picked
+                import docx
                 content = "\n".join([paragraph.text for paragraph in docx.Document(path).paragraphs])
 
                 # Insert the content into the text widget
@@ -1,6 +1,8 @@
 import argparse
-import imp
 import os
+import subprocess
+import sys
+from collections import defaultdict
 
 cwd = os.getcwd()
 os.environ["PYTHONPATH"] = cwd
@@ -8,11 +10,13 @@ os.environ["PYTHONPATH"] = cwd
 
 import logging
 
-from src.job_processor import JobProcessor
 from src.utils import validate_arguments
 
 logging.basicConfig(level=logging.INFO)
 
+# Modules imported by a full run, profiled by --PROFILE_STARTUP
+PROFILED_IMPORTS = "import aijobapply.main; from src.job_processor import JobProcessor; from src.llm_handler import LLMConnectorClass"
+
 
 def run_application(args: dict) -> None:
     """
@@ -38,8 +42,21 @@ def run_application(args: dict) -> None:
         logging.exception(f"Error validating arguments: {e}")
         return
 
+    if validated_args["DRAIN_OUTBOX"]:
+        try:
+            logging.info("Draining the outbox...")
+            # Imported here as it pulls in the LinkedIn handler, which --help does not need
+            from src.outbox import run_outbox_drain
+            run_outbox_drain(validated_args)
+        except Exception as e:
+            logging.exception(f"Error draining the outbox: {e}")
+        return
+
     try:
         logging.info("Creating job processor object...")
+        # Imported here as it pulls in pandas and the Google clients, which --help does not need
+        from src.job_processor import JobProcessor
+
         # Create job processor object
         job_processor = JobProcessor(validated_args)
 
@@ -51,6 +68,45 @@ def run_application(args: dict) -> None:
         return
 
 
+def profile_startup(limit: int = 15) -> None:
+    """
+    Print an import-time breakdown of the modules a run imports, measured with `python -X importtime`
+    in a fresh interpreter.
+
+    Parameters:
+    -----------
+    limit: int
+        Number of top-level packages to list.
+
+    Returns:
+    --------
+    None
+
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROFILED_IMPORTS],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+    )
+
+    # Lines look like "import time:       412 |       1250 |   pandas.core"
+    self_times = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, _, module = line[len("import time:"):].split("|")
+        self_times[module.strip().split(".")[0]] += int(self_time)
+
+    total = sum(self_times.values())
+    print(f"Total import time: {total / 1e6:.2f} s")
+    print(f"{'package':<32}{'seconds':>10}{'share':>8}")
+    for package, self_time in sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:limit]:
+        print(f"{package:<32}{self_time / 1e6:>10.3f}{self_time / max(total, 1):>8.1%}")
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else "Profiling failed.")
+
+
 def aijobapply_cli():
     """
     Command-line interface function for AI job application process.
@@ -60,6 +116,20 @@ def aijobapply_cli():
     parser.add_argument("--USE_GMAIL", action="store_true", help="Use Gmail to send emails")
     parser.add_argument("--GMAIL_ADDRESS", type=str, default=None, help="Gmail address to send emails from")
     parser.add_argument("--GMAIL_PASSWORD", type=str, default=None, help="Password to gmail account")
+    parser.add_argument("--SMTP_HOST", type=str, default=None, help="SMTP server to send emails through (default: smtp.gmail.com)")
+    parser.add_argument("--SMTP_PORT", type=int, default=None, help="Port of the SMTP server (default: 587)")
+    parser.add_argument("--SMTP_MAX_MESSAGES_PER_CONNECTION", type=int, default=None, help="Messages sent over an SMTP connection before it is replaced (default: 100)")
+    parser.add_argument("--EMAIL_CONCURRENCY", type=int, default=None, help="Number of emails sent at once, each over its own SMTP connection (default: 1)")
+    parser.add_argument("--EMAIL_MESSAGES_PER_MINUTE", type=int, default=None, help="Maximum number of emails sent per minute, 0 for no limit (default: 0)")
+    parser.add_argument("--EMAIL_DAILY_LIMIT", type=int, default=None, help="Maximum number of emails sent per day, later emails wait for the next run (default: 0, no limit)")
+    parser.add_argument("--EMAIL_QUOTA_STATE_PATH", type=str, default=None, help="Path to the count of the emails sent today (default: .aijobapply/email_quota.json)")
+    parser.add_argument("--EMAIL_MAX_RETRIES", type=int, default=None, help="Maximum number of deferred retries of an email after a temporary (4xx) error (default: 3)")
+    parser.add_argument("--USE_OUTBOX", action="store_true", default=None, help="Queue the rendered emails and LinkedIn notes to an on-disk outbox, sent by its drain")
+    parser.add_argument("--OUTBOX_PATH", type=str, default=None, help="Folder of the outbox (default: .aijobapply/outbox)")
+    parser.add_argument("--OUTBOX_SEPARATE_DRAIN", action="store_true", default=None, help="With USE_OUTBOX, only queue the messages, a separate --DRAIN_OUTBOX run sends them")
+    parser.add_argument("--OUTBOX_MAX_ATTEMPTS", type=int, default=None, help="Drains a queued message is tried in before it fails for good (default: 5)")
+    parser.add_argument("--DRAIN_OUTBOX", action="store_true", default=None, help="Only send the messages waiting in the outbox, without processing jobs")
+    parser.add_argument("--OUTBOX_DRAIN_INTERVAL", type=float, default=None, help="With DRAIN_OUTBOX, drain the outbox every this many seconds until interrupted, 0 to drain once (default: 0)")
     # parser.add_argument("--EMAIL_CONTENT", type=str, default=None, help="Email content")
     
     parser.add_argument("--USE_LINKEDIN", action="store_true", help="Use LinkedIn to send messages")
@@ -71,17 +141,55 @@ def aijobapply_cli():
     
     parser.add_argument( "--GOOGLE_API_CREDENTIALS_FILE", type=str, default=None, help="Path to the credentials file for google api")
     parser.add_argument("--GOOGLE_SHEET_NAME", type=str, default="AIJobApply", help="Name of the google sheet to read jobs from")
+    parser.add_argument("--USE_SHEET_MIRROR", action="store_true", default=None, help="Load the google sheet from a local mirror when it did not change since the last run")
+    parser.add_argument("--SHEET_MIRROR_PATH", type=str, default=None, help="Path to the local mirror of the google sheet")
+    parser.add_argument("--READ_PENDING_ROWS_ONLY", action="store_true", default=None, help="Only read the rows and columns of the google sheet that need work")
     
     # parser.add_argument("--LLM_API_URL", type=str, default="https://api.openai.com/v1/chat/completions", help="LLM API URL")
     parser.add_argument("--LLM_API_KEY", type=str, default=None, help="LLM api key")
     parser.add_argument("--LLM_MODEL", type=str, default=None, help="LLM model to use")
+    parser.add_argument("--NO_LLM_CACHE", action="store_true", default=None, help="Bypass the on-disk cache of generated content")
+    parser.add_argument("--LLM_CACHE_PATH", type=str, default=None, help="Path to the on-disk cache of generated content")
+    parser.add_argument("--LLM_CACHE_MAX_ENTRIES", type=int, default=None, help="Maximum number of cached responses (default: 5000)")
+    parser.add_argument("--LLM_CACHE_MAX_AGE_DAYS", type=float, default=None, help="Evict cached responses older than this many days (default: 30)")
+    parser.add_argument("--NO_DESCRIPTION_COMPACTION", action="store_true", default=None, help="Send job descriptions to the LLM without removing boilerplate and trimming them")
+    parser.add_argument("--DESCRIPTION_TOKEN_BUDGET", type=int, default=None, help="Maximum number of tokens of a compacted job description, 0 for no cap (default: 1500)")
+    parser.add_argument("--NO_DUPLICATE_REUSE", action="store_true", default=None, help="Generate content for every job, even for near-duplicate postings of the same company")
+    parser.add_argument("--DUPLICATE_SIMILARITY_THRESHOLD", type=float, default=None, help="Minimum similarity of two job descriptions of the same company to reuse generated content (default: 0.9)")
+    parser.add_argument("--LLM_BATCH_MODE", action="store_true", default=None, help="Generate content through the OpenAI Batch API instead of interactive calls")
+    parser.add_argument("--LLM_BATCH_STATE_PATH", type=str, default=None, help="Path to the file the pending batch ID is persisted in")
+    parser.add_argument("--LLM_BATCH_API_BASE_URL", type=str, default=None, help="Base URL of the Batch API (default: https://api.openai.com/v1)")
+    parser.add_argument("--LLM_BATCH_POLL_INTERVAL", type=float, default=None, help="Seconds between two batch status checks (default: 60)")
+    parser.add_argument("--LLM_BATCH_MAX_WAIT_MINUTES", type=float, default=None, help="Stop waiting for a batch after this many minutes, a later run picks up its results (default: 1440)")
+    parser.add_argument("--LLM_CONCURRENCY", type=int, default=None, help="Number of jobs to generate content for concurrently (default: 1)")
+    parser.add_argument("--LLM_REQUESTS_PER_MINUTE", type=int, default=None, help="Requests per minute budget shared by all LLM calls, 0 for no limit (default: 0)")
+    parser.add_argument("--LLM_TOKENS_PER_MINUTE", type=int, default=None, help="Estimated tokens per minute budget shared by all LLM calls, 0 for no limit (default: 0)")
+    parser.add_argument("--LLM_MAX_RETRIES", type=int, default=None, help="Maximum number of retries of a rate limited or failed LLM call (default: 6)")
+
+    parser.add_argument("--NO_JOB_JOURNAL", action="store_true", default=None, help="Do not journal finished rows locally for crash recovery")
+    parser.add_argument("--JOB_JOURNAL_PATH", type=str, default=None, help="Path to the local journal of finished rows")
+    parser.add_argument("--JOURNAL_FLUSH_INTERVAL", type=float, default=None, help="Seconds between two writes of finished rows to the google sheet during content generation, 0 to only write at the end (default: 60)")
+    parser.add_argument("--ARCHIVE_AFTER_DAYS", type=int, default=None, help="Move rows with a final status older than this many days to monthly archive worksheets, 0 to disable (default: 0)")
+    parser.add_argument("--DRIVE_UPLOAD_CONCURRENCY", type=int, default=None, help="Maximum number of concurrent google drive uploads across all jobs (default: 4)")
+    parser.add_argument("--DRIVE_FOLDER_INDEX_PATH", type=str, default=None, help="Path to the local index of the google drive job folder IDs")
+    parser.add_argument("--IN_MEMORY_ARTIFACTS", action="store_true", default=None, help="Render and upload the job documents in memory without writing them to the destination folder")
+    parser.add_argument("--WRITE_LOCAL_COPIES", action="store_true", default=None, help="With IN_MEMORY_ARTIFACTS, still write local copies of the documents in the background")
+    parser.add_argument("--ARTIFACT_MEMORY_LIMIT_MB", type=float, default=None, help="Maximum memory in MB held by the documents of the jobs being uploaded (default: 64)")
+    parser.add_argument("--RENDER_PROCESSES", type=int, default=None, help="Number of processes rendering the job documents, 0 to render them in the worker threads (default: 0)")
 
     parser.add_argument("--RESUME_PATH", type=str, default=None, help="Path to resume")
     parser.add_argument("--RESUME_PROFESSIONAL_SUMMARY", type=str, default=None, help="Professional summary for resume")
     parser.add_argument("--COVER_LETTER_PATH", type=str, default=None, help="Path to cover letter")
     parser.add_argument("--DESTINATION_FOLDER", type=str, default=None, help="Folder to save documents to")
+
+    parser.add_argument("--PROFILE_STARTUP", action="store_true", help="Print an import-time breakdown of the application and exit")
     
     args = parser.parse_args()
+
+    if args.PROFILE_STARTUP:
+        profile_startup()
+        return
+    del args.PROFILE_STARTUP
     
     run_application(vars(args))
 
@@ -0,0 +1,138 @@
+"""
+Benchmark of the Batch API mode against a local stand-in of the OpenAI Files and Batch endpoints.
+
+Each scenario submits --requests prompts through LLMBatchHandler, polls the batch until it reaches a
+final status and downloads its results, against a LocalBatchAPIServer:
+- completed: every request has a response.
+- request errors: a share of the requests (--request-error-rate) fail with a 500.
+- expired: the batch expires with only part of the requests run. The others have no result and are
+  left for a later run.
+- failed: the batch fails as a whole, no request has a result.
+- picked up later: the first run stops waiting before the batch finishes. A second run picks up the
+  persisted batch and gets its results.
+Each scenario checks which requests got a response, an error or no result, and reports the status checks
+and the wall time of the round trip.
+
+Usage:
+    python -m benchmarks.batch_benchmark --requests 200 --polls 3 --request-error-rate 0.1
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import LocalBatchAPIServer
+from src.llm_batch_handler import LLMBatchHandler
+
+
+def make_prompts(count: int) -> Dict[str, str]:
+    """Prompts keyed by custom ID, with the Job Details section the fake responses are built from."""
+    return {
+        f"job{index}:resume": (
+            "Job Details:\n"
+            f"- Job Title: Engineer {index}\n"
+            f"- Company Name: Company {index}\n"
+            f"- Contact Name: Contact {index}\n"
+        )
+        for index in range(count)
+    }
+
+
+def run_scenario(name: str, args: argparse.Namespace, folder: str, runs: int = 1, **server_options) -> Dict[str, object]:
+    """Submit the prompts, wait for the results over the given number of runs and count them by kind."""
+    prompts = make_prompts(args.requests)
+    state_path = os.path.join(folder, f"{name.replace(' ', '_')}.json")
+    with LocalBatchAPIServer(polls_to_complete=args.polls, seed=args.seed, **server_options) as server:
+        started_at = time.perf_counter()
+        results = None
+        for run in range(runs):
+            # Every run but the last stops waiting before the batch finishes
+            max_wait_minutes = 60 if run == runs - 1 else args.poll_interval / 60
+            batch_handler = LLMBatchHandler(
+                api_key="offline",
+                model_name="fake-replay",
+                state_path=state_path,
+                api_base_url=server.base_url,
+                poll_interval=args.poll_interval,
+                max_wait_minutes=max_wait_minutes,
+            )
+            pending_batch = batch_handler.get_pending_batch()
+            batch_id = pending_batch["batch_id"] if pending_batch else batch_handler.submit(prompts)
+            results = batch_handler.wait_for_results(batch_id)
+            if results is not None:
+                batch_handler.clear_pending_batch()
+        seconds = time.perf_counter() - started_at
+        status_checks = sum(batch["polls"] for batch in server.batches.values())
+        batches = len(server.batches)
+
+    responses = [custom_id for custom_id, result in results.items() if not isinstance(result, Exception)]
+    for custom_id in responses:
+        # Every response is the JSON of the requested job
+        if f"Company {custom_id[3:].split(':')[0]}" not in json.loads(results[custom_id])["cover_letter"]:
+            raise SystemExit(f"{name}: the response of {custom_id} is not the one of its prompt.")
+    return {
+        "requests": len(prompts),
+        "responses": len(responses),
+        "errors": len(results) - len(responses),
+        "not_run": len(prompts) - len(results),
+        "batches": batches,
+        "status_checks": status_checks,
+        "seconds": seconds,
+        "state_cleared": not os.path.exists(state_path),
+    }
+
+
+def check(name: str, result: Dict[str, object], expected: Dict[str, int]) -> None:
+    """Stop with an error if the counts of a scenario are not the expected ones."""
+    actual = {key: result[key] for key in expected}
+    if actual != expected:
+        raise SystemExit(f"{name}: expected {expected}, got {actual}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Batch API mode against a local stand-in server")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per batch")
+    parser.add_argument("--polls", type=int, default=3, help="Status checks before a batch finishes")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Seconds between two status checks")
+    parser.add_argument("--request-error-rate", type=float, default=0.1, help="Share of the requests failing with a 500")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the failing requests")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    requests = args.requests
+    expired_completed = int(requests * 0.5)
+    rows: List[tuple] = []
+    with tempfile.TemporaryDirectory() as folder:
+        result = run_scenario("completed", args, folder)
+        check("completed", result, {"responses": requests, "errors": 0, "not_run": 0, "batches": 1})
+        rows.append(("completed", result))
+
+        result = run_scenario("request errors", args, folder, request_error_rate=args.request_error_rate)
+        check("request errors", result, {"responses": requests - result["errors"], "not_run": 0, "batches": 1})
+        rows.append(("request errors", result))
+
+        result = run_scenario("expired", args, folder, final_status="expired", completed_share=0.5)
+        check("expired", result, {"responses": expired_completed, "errors": 0, "not_run": requests - expired_completed})
+        rows.append(("expired", result))
+
+        result = run_scenario("failed", args, folder, final_status="failed")
+        check("failed", result, {"responses": 0, "errors": 0, "not_run": requests})
+        rows.append(("failed", result))
+
+        result = run_scenario("picked up later", args, folder, runs=2)
+        check("picked up later", result, {"responses": requests, "not_run": 0, "batches": 1})
+        rows.append(("picked up later", result))
+
+    print(f"{'scenario':<18}{'requests':>10}{'responses':>11}{'errors':>8}{'not run':>9}{'checks':>8}{'seconds':>9}{'state cleared':>15}")
+    for name, result in rows:
+        print(
+            f"{name:<18}{result['requests']:>10}{result['responses']:>11}{result['errors']:>8}{result['not_run']:>9}"
+            f"{result['status_checks']:>8}{result['seconds']:>9.2f}{str(result['state_cleared']):>15}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,619 @@
+"""
+Offline stand-ins for the external services used by JobProcessor.
+
+- FakeChatModel: replay/fake LangChain chat model returning valid CustomJobApplicationMaterials JSON.
+- InMemorySheetsClient: gspread client stand-in, used through the real GoogleSheetsHandler.
+- InMemoryDriveService: Google Drive v3 service stand-in, used through the real GoogleDriveHandler.
+- LocalSMTPSink: local SMTP server accepting (and discarding) every message, used through the real EmailHandler.
+- LocalBatchAPIServer: local stand-in of the OpenAI Files and Batch endpoints, used through the real LLMBatchHandler.
+"""
+import email
+import hashlib
+import itertools
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+from langchain.chat_models.base import BaseChatModel
+from langchain.pydantic_v1 import PrivateAttr
+from langchain.schema import AIMessage, ChatGeneration, ChatResult
+
+from src.llm_handler import CustomJobApplicationMaterials
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model returning valid CustomJobApplicationMaterials JSON after a configurable latency.
+    Recorded responses can be replayed instead of the synthetic ones.
+    """
+
+    latency: float = 0.0
+    responses: List[str] = []
+    calls: int = 0
+    # Worker threads call the model concurrently, the count picks the replayed response
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-replay"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        prompt = "\n".join(str(message.content) for message in messages)
+        with self._lock:
+            self.calls += 1
+            call_index = self.calls - 1
+
+        if self.responses:
+            content = self.responses[call_index % len(self.responses)]
+        else:
+            content = self._synthetic_response(prompt)
+
+        token_usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        }
+        message = AIMessage(content=content, response_metadata={"token_usage": token_usage})
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": token_usage, "model_name": "fake-replay"},
+        )
+
+    @staticmethod
+    def _synthetic_response(prompt: str) -> str:
+        """Build a response for the job found in the Job Details section of the prompt."""
+        def job_detail(name: str) -> str:
+            match = re.search(rf"- {name}: (.*)", prompt)
+            return match.group(1).strip() if match else ""
+
+        position, company_name, name = job_detail("Job Title"), job_detail("Company Name"), job_detail("Contact Name")
+        materials = CustomJobApplicationMaterials(
+            cover_letter=f"Dear Hiring Manager,\n\nI am excited to apply for the {position} role at {company_name}.\n\nSincerely,\nApplicant",
+            resume_summary=f"Seeking a {position} at {company_name} to build reliable software.",
+            missing_keywords="Kubernetes, Terraform",
+            email_content=f"Hi {name},\n\nI am interested in the {position} role at {company_name}.\n\nBest regards,\nApplicant",
+            email_subject=f"{position} at {company_name}",
+            linkedin_note=f"Dear {name}, I am keen on an open {position} role at {company_name}.",
+        )
+        return json.dumps(materials.model_dump() if hasattr(materials, "model_dump") else materials.dict())
+
+
+class InMemoryWorksheet:
+    """Worksheet stand-in holding its values (header row first) in memory."""
+
+    def __init__(self, title: str, values: Optional[List[List[Any]]] = None, latency: float = 0.0):
+        self.title = title
+        self.values = values or []
+        self.latency = latency
+        self.api_calls = 0
+        self.bytes_received = 0
+        # Bumped on every write, stands in for the Drive modifiedTime
+        self.revision = 0
+
+    def _call(self, payload: Any = None) -> None:
+        time.sleep(self.latency)
+        self.api_calls += 1
+        if payload is not None:
+            self.bytes_received += len(json.dumps(payload, default=str))
+            self.revision += 1
+
+    def get_all_values(self) -> List[List[Any]]:
+        self._call()
+        return [list(row) for row in self.values]
+
+    def get_all_records(self) -> List[Dict[str, Any]]:
+        self._call()
+        if not self.values:
+            return []
+        header = self.values[0]
+        return [dict(itertools.zip_longest(header, row, fillvalue="")) for row in self.values[1:]]
+
+    def row_values(self, row: int) -> List[Any]:
+        self._call()
+        return list(self.values[row - 1]) if row <= len(self.values) else []
+
+    def col_values(self, col: int) -> List[Any]:
+        self._call()
+        column = [row[col - 1] if col <= len(row) else "" for row in self.values]
+        # Trailing empty cells are not returned, like the API
+        while column and column[-1] == "":
+            column.pop()
+        return column
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[Any]]]:
+        self._call()
+        value_ranges = []
+        for label in ranges:
+            first, _, last = label.partition(":")
+            first_row, first_col = _a1_to_rowcol(first)
+            last_row, last_col = _a1_to_rowcol(last or first)
+            value_ranges.append([
+                list(self.values[row - 1][first_col - 1:last_col]) if row <= len(self.values) else []
+                for row in range(first_row, last_row + 1)
+            ])
+        return value_ranges
+
+    @property
+    def col_count(self) -> int:
+        return max((len(row) for row in self.values), default=0)
+
+    def add_cols(self, cols: int) -> None:
+        self._call()
+
+    def append_rows(self, values: List[List[Any]], **kwargs) -> None:
+        self._call(values)
+        self._write(len(self.values) + 1, 1, values)
+
+    def clear(self) -> None:
+        self._call()
+        self.values = []
+        self.revision += 1
+
+    def update(self, values=None, range_name=None, **kwargs) -> None:
+        # Support both update(values) and the older update(range_name, values) argument order
+        if isinstance(values, str):
+            values, range_name = range_name, values
+        self._call(values)
+        row, col = _a1_to_rowcol(range_name or "A1")
+        self._write(row, col, values)
+
+    def batch_update(self, data: List[Dict[str, Any]], **kwargs) -> None:
+        self._call(data)
+        for update in data:
+            row, col = _a1_to_rowcol(update["range"])
+            self._write(row, col, update["values"])
+
+    def _write(self, row: int, col: int, values: List[List[Any]]) -> None:
+        for row_offset, row_values in enumerate(values):
+            row_index = row - 1 + row_offset
+            while len(self.values) <= row_index:
+                self.values.append([])
+            target = self.values[row_index]
+            for col_offset, value in enumerate(row_values):
+                col_index = col - 1 + col_offset
+                while len(target) <= col_index:
+                    target.append("")
+                target[col_index] = value
+
+
+class InMemorySpreadsheet:
+    """Spreadsheet stand-in, sheet1 first."""
+
+    def __init__(self, title: str, values: Optional[List[List[Any]]] = None, latency: float = 0.0):
+        self.title = title
+        self.id = hashlib.sha1(title.encode("utf-8")).hexdigest()
+        self.latency = latency
+        self.sheet1 = InMemoryWorksheet("Sheet1", values, latency)
+        self.other_worksheets: List[InMemoryWorksheet] = []
+
+    @property
+    def revision(self) -> int:
+        return sum(worksheet.revision for worksheet in [self.sheet1] + self.other_worksheets)
+
+    def worksheets(self) -> List[InMemoryWorksheet]:
+        time.sleep(self.latency)
+        return [self.sheet1] + self.other_worksheets
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26) -> InMemoryWorksheet:
+        time.sleep(self.latency)
+        worksheet = InMemoryWorksheet(title, latency=self.latency)
+        self.other_worksheets.append(worksheet)
+        return worksheet
+
+
+class InMemorySheetsClient:
+    """gspread client stand-in serving in-memory spreadsheets by name."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.spreadsheets: Dict[str, InMemorySpreadsheet] = {}
+
+    def add_spreadsheet(self, title: str, values: List[List[Any]]) -> InMemorySpreadsheet:
+        self.spreadsheets[title] = InMemorySpreadsheet(title, values, self.latency)
+        return self.spreadsheets[title]
+
+    def list_spreadsheet_files(self, title: Optional[str] = None) -> List[Dict[str, Any]]:
+        time.sleep(self.latency)
+        return [
+            {"id": spreadsheet.id, "name": spreadsheet.title, "modifiedTime": f"revision-{spreadsheet.revision}"}
+            for spreadsheet in self.spreadsheets.values() if title is None or spreadsheet.title == title
+        ]
+
+    def open(self, title: str) -> InMemorySpreadsheet:
+        time.sleep(self.latency)
+        if title not in self.spreadsheets:
+            from gspread.exceptions import SpreadsheetNotFound
+            raise SpreadsheetNotFound(title)
+        return self.spreadsheets[title]
+
+
+class _DriveRequest:
+    """Request stand-in whose execute() waits for the configured latency."""
+
+    def __init__(self, service: "InMemoryDriveService", callback):
+        self._service = service
+        self._callback = callback
+
+    def execute(self, **kwargs):
+        time.sleep(self._service.latency)
+        with self._service.lock:
+            self._service.api_calls += 1
+            if self._service.random.random() < self._service.error_rate:
+                self._service.errors += 1
+                raise HttpError(
+                    httplib2.Response({"status": "429", "retry-after": "0"}),
+                    b'{"error": {"code": 429, "errors": [{"reason": "userRateLimitExceeded"}]}}',
+                )
+            return self._callback()
+
+
+class _DriveFiles:
+    """files() resource stand-in."""
+
+    def __init__(self, service: "InMemoryDriveService"):
+        self._service = service
+
+    def create(self, body: Dict[str, Any], media_body=None, fields: str = "id", **kwargs) -> _DriveRequest:
+        def callback():
+            missing_parents = [parent for parent in body.get("parents", []) if parent not in self._service.stored_files]
+            if missing_parents:
+                raise HttpError(httplib2.Response({"status": "404"}), f"File not found: {missing_parents[0]}".encode("utf-8"))
+            file = dict(body, id=f"file-{next(self._service.file_ids)}")
+            if media_body is not None:
+                content = media_body.getbytes(0, media_body.size())
+                file["md5Checksum"] = hashlib.md5(content).hexdigest()
+                file["size"] = len(content)
+                self._service.bytes_uploaded += len(content)
+            self._service.stored_files[file["id"]] = file
+            return {"id": file["id"]}
+        return _DriveRequest(self._service, callback)
+
+    def update(self, fileId: str, media_body=None, fields: str = "id", **kwargs) -> _DriveRequest:
+        def callback():
+            if fileId not in self._service.stored_files:
+                raise HttpError(httplib2.Response({"status": "404"}), f"File not found: {fileId}".encode("utf-8"))
+            file = self._service.stored_files[fileId]
+            if media_body is not None:
+                content = media_body.getbytes(0, media_body.size())
+                file["md5Checksum"] = hashlib.md5(content).hexdigest()
+                file["size"] = len(content)
+                self._service.bytes_uploaded += len(content)
+            return {"id": fileId}
+        return _DriveRequest(self._service, callback)
+
+    def list(self, q: str = "", pageToken: Optional[str] = None, pageSize: int = 100, **kwargs) -> _DriveRequest:
+        def callback():
+            name = re.search(r"name='((?:[^'\\]|\\.)*)'", q)
+            parent = re.search(r"'([^']*)' in parents", q)
+            files = [
+                file for file in self._service.stored_files.values()
+                if (name is None or file.get("name") == name.group(1).replace("\\'", "'"))
+                and (parent is None or parent.group(1) in file.get("parents", []))
+                and ("mimeType='application/vnd.google-apps.folder'" not in q or file.get("mimeType") == "application/vnd.google-apps.folder")
+            ]
+            start = int(pageToken or 0)
+            response = {"files": files[start:start + pageSize]}
+            if start + pageSize < len(files):
+                response["nextPageToken"] = str(start + pageSize)
+            return response
+        return _DriveRequest(self._service, callback)
+
+
+class InMemoryDriveService:
+    """
+    Google Drive v3 service stand-in keeping file metadata in memory.
+    A share of the requests, error_rate, fails with a 429 rate limit error.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.errors = 0
+        self.stored_files: Dict[str, Dict[str, Any]] = {}
+        self.file_ids = itertools.count(1)
+        self.api_calls = 0
+        self.bytes_uploaded = 0
+        self.lock = threading.Lock()
+
+    def files(self) -> _DriveFiles:
+        return _DriveFiles(self)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, NOOP, RSET and QUIT."""
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self) -> None:
+        with self.server.lock:
+            self.server.connections += 1
+        # Stands in for the TCP, STARTTLS and login round trips of a real server
+        time.sleep(self.server.connect_latency)
+        self._reply("220 localhost ESMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif command.startswith("HELO"):
+                self._reply("250 localhost")
+            elif command.startswith("AUTH"):
+                self._reply("235 2.7.0 Authentication successful")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self._reply("250 2.0.0 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    size += len(data_line)
+                time.sleep(self.server.latency)
+                with self.server.lock:
+                    if self.server.quota is not None and self.server.messages >= self.server.quota:
+                        reply = "550 5.4.5 Daily user sending limit exceeded"
+                    elif self.server.random.random() < self.server.temporary_error_rate:
+                        self.server.temporary_errors += 1
+                        reply = "451 4.3.0 Temporary server error, try again later"
+                    else:
+                        self.server.messages += 1
+                        self.server.bytes_received += size
+                        reply = "250 2.0.0 Message accepted"
+                self._reply(reply)
+            elif command == "QUIT":
+                self._reply("221 2.0.0 Bye")
+                return
+            else:
+                self._reply("502 5.5.2 Command not implemented")
+
+
+class LocalSMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP server accepting messages, counting connections and messages.
+    latency is added to each message and connect_latency to each new connection. A share of the messages,
+    temporary_error_rate, is refused with a 451, and the messages past quota with a 550 5.4.5.
+    Use it as a context manager, it serves on an ephemeral port of 127.0.0.1.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        connect_latency: float = 0.0,
+        temporary_error_rate: float = 0.0,
+        quota: Optional[int] = None,
+        seed: int = 0,
+    ):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.temporary_error_rate = temporary_error_rate
+        self.quota = quota
+        self.random = random.Random(seed)
+        self.temporary_errors = 0
+        self.connections = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self) -> "LocalSMTPSink":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _BatchAPIHandler(BaseHTTPRequestHandler):
+    """Files (upload, content) and Batch (create, retrieve) endpoints of the OpenAI API."""
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _reply(self, status: int, body: Any, content_type: str = "application/json") -> None:
+        content = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self) -> None:
+        server = self.server
+        if self.path.rstrip("/").endswith("/files"):
+            # Multipart form of the upload, parsed as a MIME message
+            message = email.message_from_bytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("ascii") + self._body()
+            )
+            content = next(
+                part.get_payload(decode=True) for part in message.get_payload() if part.get_param("name", header="content-disposition") == "file"
+            )
+            self._reply(200, {"id": server.add_file(content), "object": "file", "purpose": "batch"})
+        elif self.path.rstrip("/").endswith("/batches"):
+            request = json.loads(self._body())
+            with server.lock:
+                if request.get("input_file_id") not in server.files:
+                    self._reply(404, {"error": {"message": "No such file"}})
+                    return
+                batch_id = f"batch_{next(server.ids)}"
+                server.batches[batch_id] = {
+                    "id": batch_id,
+                    "object": "batch",
+                    "status": "validating",
+                    "input_file_id": request["input_file_id"],
+                    "output_file_id": None,
+                    "error_file_id": None,
+                    "polls": 0,
+                }
+            self._reply(200, server.public_batch(batch_id))
+        else:
+            self._reply(404, {"error": {"message": "Unknown endpoint"}})
+
+    def do_GET(self) -> None:
+        server = self.server
+        path = self.path.rstrip("/")
+        if "/batches/" in path:
+            batch_id = path.rsplit("/", 1)[1]
+            if batch_id not in server.batches:
+                self._reply(404, {"error": {"message": "No such batch"}})
+                return
+            server.poll(batch_id)
+            self._reply(200, server.public_batch(batch_id))
+        elif "/files/" in path and path.endswith("/content"):
+            file_id = path.split("/files/")[1].split("/")[0]
+            if file_id not in server.files:
+                self._reply(404, {"error": {"message": "No such file"}})
+                return
+            self._reply(200, server.files[file_id], content_type="application/jsonl")
+        else:
+            self._reply(404, {"error": {"message": "Unknown endpoint"}})
+
+
+class LocalBatchAPIServer(ThreadingHTTPServer):
+    """
+    Local stand-in of the OpenAI Batch API: file upload, batch create and retrieve, and file download.
+
+    A batch is in progress for polls_to_complete status checks, then ends with final_status:
+    - completed: every request has a response, a share of them, request_error_rate, failed with a 500.
+    - expired or cancelled: the first completed_share of the requests have a response, the others are in
+      the error file with a batch_expired or batch_cancelled error.
+    - failed: the input file was rejected, no request ran.
+    Responses are built by respond from the prompt, by default like FakeChatModel.
+    Use it as a context manager, it serves on an ephemeral port of 127.0.0.1.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        polls_to_complete: int = 2,
+        final_status: str = "completed",
+        request_error_rate: float = 0.0,
+        completed_share: float = 0.5,
+        respond: Optional[Callable[[str], str]] = None,
+        seed: int = 0,
+    ):
+        super().__init__(("127.0.0.1", 0), _BatchAPIHandler)
+        self.polls_to_complete = polls_to_complete
+        self.final_status = final_status
+        self.request_error_rate = request_error_rate
+        self.completed_share = completed_share
+        self.respond = respond or FakeChatModel._synthetic_response
+        self.random = random.Random(seed)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def add_file(self, content: bytes) -> str:
+        with self.lock:
+            file_id = f"file_{next(self.ids)}"
+            self.files[file_id] = content
+        return file_id
+
+    def public_batch(self, batch_id: str) -> Dict[str, Any]:
+        with self.lock:
+            return {key: value for key, value in self.batches[batch_id].items() if key != "polls"}
+
+    def poll(self, batch_id: str) -> None:
+        """Advance the batch by one status check, running its requests when it finishes."""
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] not in ("validating", "in_progress"):
+                return
+            batch["polls"] += 1
+            if batch["polls"] < self.polls_to_complete:
+                batch["status"] = "in_progress"
+                return
+            # Checks made while the requests run see the batch finalizing
+            batch["status"] = "finalizing"
+            requests = [json.loads(line) for line in self.files[batch["input_file_id"]].splitlines() if line.strip()]
+
+        if self.final_status == "failed":
+            outputs, errors = [], []
+            batch_errors = {"object": "list", "data": [{"code": "invalid_request", "message": "The input file is invalid.", "line": 1}]}
+        else:
+            completed_count = len(requests)
+            if self.final_status in ("expired", "cancelled"):
+                completed_count = int(len(requests) * self.completed_share)
+            outputs = [self._output(request) for request in requests[:completed_count]]
+            errors = [
+                {"id": f"batch_req_{request['custom_id']}", "custom_id": request["custom_id"], "response": None,
+                 "error": {"code": f"batch_{self.final_status}", "message": f"This request could not be executed before the batch {self.final_status}."}}
+                for request in requests[completed_count:]
+            ]
+            batch_errors = None
+
+        output_file_id = self.add_file("".join(json.dumps(output) + "\n" for output in outputs).encode("utf-8")) if outputs else None
+        error_file_id = self.add_file("".join(json.dumps(error) + "\n" for error in errors).encode("utf-8")) if errors else None
+        with self.lock:
+            batch.update({
+                "status": self.final_status,
+                "errors": batch_errors,
+                "output_file_id": output_file_id,
+                "error_file_id": error_file_id,
+                "request_counts": {
+                    "total": len(requests),
+                    "completed": sum(1 for output in outputs if output["response"]["status_code"] == 200),
+                    "failed": sum(1 for output in outputs if output["response"]["status_code"] != 200) + len(errors),
+                },
+            })
+
+    def _output(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if self.random.random() < self.request_error_rate:
+            response = {"status_code": 500, "body": {"error": {"message": "The server had an error processing the request."}}}
+        else:
+            prompt = "\n".join(message["content"] for message in request["body"]["messages"])
+            response = {
+                "status_code": 200,
+                "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": self.respond(prompt)}}]},
+            }
+        return {"id": f"batch_req_{request['custom_id']}", "custom_id": request["custom_id"], "response": response, "error": None}
+
+    def __enter__(self) -> "LocalBatchAPIServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def _a1_to_rowcol(label: str):
+    """Convert the top-left cell of an A1 range (e.g. "B3" or "B3:D4") to 1-based (row, col)."""
+    match = re.match(r"([A-Za-z]+)(\d+)", label.split(":")[0].split("!")[-1])
+    if not match:
+        return 1, 1
+    letters, row = match.groups()
+    col = 0
+    for letter in letters.upper():
+        col = col * 26 + ord(letter) - ord("A") + 1
+    return int(row), col
@@ -0,0 +1,307 @@
+"""
+End-to-end benchmark of JobProcessor.process_jobs against offline stand-ins.
+
+No OpenAI, Google or Gmail account is needed: the LLM, Google Sheets, Google Drive and SMTP
+are replaced by the fakes of benchmarks.fakes, each with a configurable latency. For every
+number of synthetic jobs, rows/sec and the p50/p95 latency of each stage are reported.
+The llm and job_folder stages both run inside generate_content_for_jobs and share its wall time.
+
+Usage:
+    python -m benchmarks.pipeline_benchmark --jobs 10 100 1000 --llm-latency 0.05
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import date, timedelta
+from typing import Dict, List
+
+import docx
+
+import src.job_processor as job_processor_module
+from benchmarks.fakes import (FakeChatModel, InMemoryDriveService,
+                              InMemorySheetsClient, LocalBatchAPIServer,
+                              LocalSMTPSink)
+from src.email_handler import EmailHandler
+from src.google_drive_handler import GoogleDriveHandler
+from src.google_sheets_handler import GoogleSheetsHandler
+from src.job_processor import JobProcessor
+from src.llm_handler import LLMConnectorClass
+from src.sheet_mirror import SheetMirror
+
+SHEET_COLUMNS = [
+    "Company Name", "Position", "Description", "Contact Name", "Email", "LinkedIn Contact", "Status",
+    "Cover Letter", "Resume", "Missing Keywords", "Message Content", "Message Subject", "LinkedIn Note",
+    "Status Updated",
+]
+
+WORDS = (
+    "design build scale distributed systems python data pipelines cloud services customers team "
+    "ownership reliability testing deploy monitor machine learning models product analytics api "
+    "security performance collaborate mentor review architecture streaming storage latency"
+).split()
+
+
+class StageRecorder:
+    """Records per-call latencies and wall time of each pipeline stage."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.wall_times: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def patch(self, owner, attribute: str, *stages: str, per_call: bool = True):
+        """
+        Time every call of owner.attribute under the given stages while the context is active.
+        Per-call latencies feed the percentiles, otherwise the calls add up to the stage wall time.
+        """
+        original = getattr(owner, attribute)
+
+        def timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started_at
+                with self._lock:
+                    for stage in stages:
+                        if per_call:
+                            self.latencies[stage].append(elapsed)
+                        else:
+                            self.wall_times[stage] += elapsed
+
+        setattr(owner, attribute, timed)
+        try:
+            yield
+        finally:
+            setattr(owner, attribute, original)
+
+
+def make_synthetic_jobs(count: int, duplicate_ratio: float, history: int = 0, seed: int = 0) -> List[List[str]]:
+    """
+    Build the sheet values (header first) of synthetic "New Job" rows, after history rows of past runs
+    sent one a day up to yesterday.
+    """
+    generator = random.Random(seed)
+    history_rows = [
+        [f"Past Company {index}", "Engineer", "Past description " * 50, f"Past Contact {index}", f"past{index}@example.com",
+         "", "Email Sent", "Cover letter " * 60, "Resume summary " * 10, "Kubernetes", "Email " * 40, "Subject", "",
+         (date.today() - timedelta(days=history - index)).isoformat()]
+        for index in range(history)
+    ]
+    rows = []
+    for index in range(count):
+        if rows and generator.random() < duplicate_ratio:
+            # Repost of an earlier role under another contact
+            duplicate = list(generator.choice(rows))
+            duplicate[3] = f"Contact {index}"
+            duplicate[4] = f"contact{index}@example.com"
+            rows.append(duplicate)
+            continue
+        description = "\n".join(
+            " ".join(generator.choice(WORDS) for _ in range(25)) for _ in range(12)
+        )
+        rows.append([
+            f"Company {index}", f"Engineer {index % 7}", description, f"Contact {index}",
+            f"contact{index}@example.com", "", "New Job", "", "", "", "", "", "", "",
+        ])
+    return [SHEET_COLUMNS] + history_rows + rows
+
+
+def make_templates(folder: str) -> Dict[str, str]:
+    """Create the resume and cover letter .docx templates."""
+    resume = docx.Document()
+    resume.add_paragraph("Applicant Name")
+    resume.add_paragraph("{{ resume_professional_summary }}")
+    resume.add_paragraph("Experience: Software Engineer at Example Corp.")
+    resume_path = os.path.join(folder, "resume.docx")
+    resume.save(resume_path)
+
+    cover_letter = docx.Document()
+    cover_letter.add_paragraph("Dear Hiring Manager, <Two sentences about what inspires me to join the company.>")
+    cover_letter_path = os.path.join(folder, "cover_letter.docx")
+    cover_letter.save(cover_letter_path)
+    return {"RESUME_PATH": resume_path, "COVER_LETTER_PATH": cover_letter_path}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def sheet_totals(spreadsheet) -> tuple:
+    """API calls and bytes written across the worksheets of a spreadsheet, archive worksheets included."""
+    worksheets = [spreadsheet.sheet1] + spreadsheet.other_worksheets
+    return sum(worksheet.api_calls for worksheet in worksheets), sum(worksheet.bytes_received for worksheet in worksheets)
+
+
+def run_benchmark(job_count: int, args: argparse.Namespace) -> List[StageRecorder]:
+    """
+    Run process_jobs args.runs times on the same sheet of job_count synthetic jobs, each run with fresh
+    handlers like a new process, and return the recorded metrics of each run.
+    """
+    recorders = []
+    sheets_client = InMemorySheetsClient(latency=args.sheets_latency)
+    spreadsheet = sheets_client.add_spreadsheet("AIJobApply", make_synthetic_jobs(job_count, args.duplicate_ratio, args.history))
+    drive_service = InMemoryDriveService(latency=args.drive_latency, error_rate=args.drive_error_rate)
+
+    with tempfile.TemporaryDirectory() as folder, LocalSMTPSink(latency=args.smtp_latency) as smtp_sink, ExitStack() as stack:
+        batch_server = stack.enter_context(LocalBatchAPIServer()) if args.llm_batch else None
+        kwargs = {
+            "LLM_API_KEY": "offline",
+            "LLM_MODEL": "fake-replay",
+            "GOOGLE_API_CREDENTIALS_FILE": "offline.json",
+            "GOOGLE_SHEET_NAME": "AIJobApply",
+            "RESUME_PROFESSIONAL_SUMMARY": "Software engineer with 5 years of experience.",
+            "DESTINATION_FOLDER": os.path.join(folder, "Job Applications"),
+            "USE_GMAIL": True,
+            "GMAIL_ADDRESS": "applicant@example.com",
+            "GMAIL_PASSWORD": "offline",
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": smtp_sink.port,
+            "SMTP_STARTTLS": False,
+            "USE_LINKEDIN": False,
+            "INTERACTIVE": False,
+            "LLM_CONCURRENCY": args.concurrency,
+            "READ_PENDING_ROWS_ONLY": args.read_pending_rows_only,
+            "LLM_CACHE_PATH": os.path.join(folder, "llm_cache.sqlite"),
+            "JOB_JOURNAL_PATH": os.path.join(folder, "job_journal.sqlite"),
+            "JOURNAL_FLUSH_INTERVAL": args.journal_flush_interval,
+            "ARCHIVE_AFTER_DAYS": args.archive_after_days,
+            "DRIVE_UPLOAD_CONCURRENCY": args.drive_concurrency,
+            "IN_MEMORY_ARTIFACTS": args.in_memory_artifacts,
+            "RENDER_PROCESSES": args.render_processes,
+            "USE_OUTBOX": args.outbox,
+            "OUTBOX_PATH": os.path.join(folder, "outbox"),
+            "LLM_BATCH_MODE": args.llm_batch,
+            "LLM_BATCH_STATE_PATH": os.path.join(folder, "llm_batch.json"),
+            "LLM_BATCH_API_BASE_URL": batch_server.base_url if batch_server else "",
+            "LLM_BATCH_POLL_INTERVAL": 0.05,
+            **make_templates(folder),
+        }
+        os.makedirs(kwargs["DESTINATION_FOLDER"], exist_ok=True)
+
+        for run in range(args.runs):
+            if run and args.regenerate:
+                # Regenerate the new jobs, e.g. after a partially failed run
+                status_position = SHEET_COLUMNS.index("Status")
+                for row in spreadsheet.sheet1.values[1 + args.history:]:
+                    row[status_position] = "New Job"
+            recorder = StageRecorder()
+            sheet_api_calls, sheet_bytes_sent, messages = sheet_totals(spreadsheet) + (smtp_sink.messages,)
+            drive_api_calls, drive_errors, drive_bytes = drive_service.api_calls, drive_service.errors, drive_service.bytes_uploaded
+            sheet_mirror = SheetMirror(os.path.join(folder, "sheet_mirror.sqlite")) if args.sheet_mirror else None
+            job_processor = JobProcessor(
+                kwargs,
+                gc=GoogleSheetsHandler(kwargs["GOOGLE_API_CREDENTIALS_FILE"], client=sheets_client, mirror=sheet_mirror),
+                google_drive_handler=GoogleDriveHandler(
+                    kwargs["GOOGLE_API_CREDENTIALS_FILE"],
+                    service=drive_service,
+                    upload_concurrency=args.drive_concurrency,
+                    folder_index_path=os.path.join(folder, "drive_folder_index.json"),
+                ),
+                llm_client=FakeChatModel(latency=args.llm_latency),
+            )
+
+            with recorder.patch(LLMConnectorClass, "generate_custom_content", "llm"), \
+                    recorder.patch(job_processor_module, "create_job_folder", "job_folder"), \
+                    recorder.patch(EmailHandler, "send", "email"), \
+                    recorder.patch(GoogleSheetsHandler, "update_gsheet_from_dataframe", "sheet_writeback"), \
+                    recorder.patch(JobProcessor, "get_all_jobs", "sheet_read"), \
+                    recorder.patch(JobProcessor, "generate_content_for_jobs", "llm", "job_folder", per_call=False), \
+                    recorder.patch(JobProcessor, "send_messages_for_content_generated_jobs", "email", per_call=False):
+                started_at = time.perf_counter()
+                job_processor.process_jobs()
+                recorder.wall_times["total"] = time.perf_counter() - started_at
+            if sheet_mirror is not None:
+                sheet_mirror.close()
+
+            for stage in ("sheet_read", "sheet_writeback"):
+                recorder.wall_times[stage] = sum(recorder.latencies[stage])
+            recorder.rows = {
+                "llm": len(recorder.latencies["llm"]),
+                "job_folder": len(recorder.latencies["job_folder"]),
+                "email": smtp_sink.messages - messages,
+                "sheet_read": job_count,
+                "sheet_writeback": job_count * len(recorder.latencies["sheet_writeback"]),
+                "total": job_count,
+            }
+            recorder.sheet_api_calls = sheet_totals(spreadsheet)[0] - sheet_api_calls
+            recorder.sheet_bytes_sent = sheet_totals(spreadsheet)[1] - sheet_bytes_sent
+            recorder.active_rows = len(spreadsheet.sheet1.values) - 1
+            status_position = spreadsheet.sheet1.values[0].index("Status")
+            recorder.statuses = Counter(row[status_position] for row in spreadsheet.sheet1.values[1 + args.history:])
+            recorder.drive_api_calls = drive_service.api_calls - drive_api_calls
+            recorder.drive_errors = drive_service.errors - drive_errors
+            recorder.drive_bytes_uploaded = drive_service.bytes_uploaded - drive_bytes
+            recorder.artifact_stats = job_processor.artifact_memory_budget.stats
+            recorders.append(recorder)
+    return recorders
+
+
+def report(job_count: int, run: int, recorder: StageRecorder) -> None:
+    """Print rows/sec and p50/p95 latency of each stage."""
+    print(f"\n{job_count} jobs, run {run}")
+    print(f"{'stage':<16}{'rows':>8}{'wall s':>10}{'rows/sec':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage in ("sheet_read", "llm", "job_folder", "sheet_writeback", "email", "total"):
+        rows = recorder.rows.get(stage, 0)
+        wall_time = recorder.wall_times.get(stage, 0.0)
+        latencies = recorder.latencies.get(stage) or []
+        rows_per_second = rows / wall_time if wall_time else 0.0
+        p50 = percentile(latencies, 0.50) * 1000 if latencies else float("nan")
+        p95 = percentile(latencies, 0.95) * 1000 if latencies else float("nan")
+        print(f"{stage:<16}{rows:>8}{wall_time:>10.2f}{rows_per_second:>12.1f}{p50:>10.1f}{p95:>10.1f}")
+    print(
+        f"Google Sheets: {recorder.sheet_api_calls} worksheet API calls, {recorder.sheet_bytes_sent} bytes written, "
+        f"{recorder.active_rows} rows left in the active worksheet"
+    )
+    print("Statuses of the new jobs: " + ", ".join(f"{count} {status}" for status, count in sorted(recorder.statuses.items())))
+    print(
+        f"Google Drive: {recorder.drive_api_calls} API calls, {recorder.drive_bytes_uploaded} bytes uploaded, "
+        f"{recorder.drive_errors} rate limit errors retried"
+    )
+    print(
+        f"Documents: peak {recorder.artifact_stats['peak_bytes'] / 1024:.0f} KiB in memory, "
+        f"largest job {recorder.artifact_stats['largest_job_bytes'] / 1024:.0f} KiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the AIJobApply pipeline")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[10, 100, 1000], help="Numbers of synthetic jobs to benchmark")
+    parser.add_argument("--concurrency", type=int, default=1, help="LLM_CONCURRENCY of the run")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Share of near-duplicate postings")
+    parser.add_argument("--history", type=int, default=0, help="Number of already processed rows before the new jobs")
+    parser.add_argument("--read-pending-rows-only", action="store_true", help="Run with READ_PENDING_ROWS_ONLY")
+    parser.add_argument("--sheet-mirror", action="store_true", help="Run with USE_SHEET_MIRROR")
+    parser.add_argument("--archive-after-days", type=int, default=0, help="ARCHIVE_AFTER_DAYS of the run, history rows are dated one a day")
+    parser.add_argument("--journal-flush-interval", type=float, default=60.0, help="JOURNAL_FLUSH_INTERVAL of the run")
+    parser.add_argument("--runs", type=int, default=1, help="Runs on the same sheet, later runs find no new jobs")
+    parser.add_argument("--regenerate", action="store_true", help="Set the new jobs back to New Job before each later run")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Latency of a fake LLM call in seconds")
+    parser.add_argument("--sheets-latency", type=float, default=0.01, help="Latency of a fake Google Sheets call in seconds")
+    parser.add_argument("--drive-latency", type=float, default=0.01, help="Latency of a fake Google Drive call in seconds")
+    parser.add_argument("--drive-concurrency", type=int, default=4, help="DRIVE_UPLOAD_CONCURRENCY of the run")
+    parser.add_argument("--drive-error-rate", type=float, default=0.0, help="Share of fake Google Drive calls failing with a 429")
+    parser.add_argument("--in-memory-artifacts", action="store_true", help="Run with IN_MEMORY_ARTIFACTS")
+    parser.add_argument("--render-processes", type=int, default=0, help="RENDER_PROCESSES of the run")
+    parser.add_argument("--outbox", action="store_true", help="Run with USE_OUTBOX, queued messages are drained by the run")
+    parser.add_argument("--llm-batch", action="store_true", help="Run with LLM_BATCH_MODE against a local stand-in of the Batch API")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="Latency of the local SMTP sink per message in seconds")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    for job_count in args.jobs:
+        for run, recorder in enumerate(run_benchmark(job_count, args), start=1):
+            report(job_count, run, recorder)
+
+
+if __name__ == "__main__":
+    main()
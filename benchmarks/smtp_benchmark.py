@@ -0,0 +1,125 @@
+"""
+Benchmark of sending emails through EmailHandler against a local SMTP sink.
+
+Compares a new connection and login per message (before) with the long-lived connection of EmailHandler
+(after). The sink adds --connect-latency to every new connection, standing in for the TCP, STARTTLS and
+login round trips of a real server, and --latency to every message.
+
+Then the same messages are sent through an EmailDispatcher with --concurrency connections, within
+--messages-per-minute, while the sink refuses a share of them with a 451 (--temporary-error-rate)
+and all those past --quota with a 550 5.4.5. Reports messages/s, per-message latency, retries and
+the messages deferred to a later run.
+
+Usage:
+    python -m benchmarks.smtp_benchmark --messages 200 --connect-latency 0.05 --latency 0.005
+    python -m benchmarks.smtp_benchmark --latency 0.05 --concurrency 4 --temporary-error-rate 0.1 --quota 150
+"""
+import argparse
+import smtplib
+import time
+from typing import Callable
+
+from benchmarks.fakes import LocalSMTPSink
+from src.email_dispatcher import DailyQuota, EmailDispatcher
+from src.email_handler import EmailHandler
+
+
+def send_per_connection(sink: LocalSMTPSink, index: int) -> None:
+    """Send a message the way EmailHandler did before pooling its connection."""
+    with smtplib.SMTP("127.0.0.1", sink.port) as server:
+        server.login("sender@example.com", "password")
+        server.sendmail("sender@example.com", f"contact{index}@example.com", f"Subject: Job {index}\r\n\r\nEmail {index}")
+
+
+def messages_per_second(sink: LocalSMTPSink, send: Callable[[int], None], count: int) -> tuple:
+    """Messages per second and connections opened when sending count messages."""
+    connections = sink.connections
+    started_at = time.perf_counter()
+    for index in range(count):
+        send(index)
+    return count / (time.perf_counter() - started_at), sink.connections - connections
+
+
+def run_dispatcher(args) -> dict:
+    """Send the messages through an EmailDispatcher, returning its stats and the messages/s."""
+    with LocalSMTPSink(
+        latency=args.latency,
+        connect_latency=args.connect_latency,
+        temporary_error_rate=args.temporary_error_rate,
+        quota=args.quota,
+    ) as sink, EmailHandler(
+        "sender@example.com",
+        "password",
+        smtp_host="127.0.0.1",
+        smtp_port=sink.port,
+        use_starttls=False,
+        pool_size=args.concurrency,
+    ) as email_handler:
+        email_dispatcher = EmailDispatcher(
+            email_handler,
+            concurrency=args.concurrency,
+            messages_per_minute=args.messages_per_minute,
+            daily_quota=DailyQuota(0),
+            retry_base_delay=args.retry_delay,
+        )
+        messages = [
+            {"key": index, "recipient": f"contact{index}@example.com", "subject": f"Job {index}", "content": f"Email {index}"}
+            for index in range(args.messages)
+        ]
+        started_at = time.perf_counter()
+        email_dispatcher.dispatch(messages)
+        elapsed = time.perf_counter() - started_at
+        stats = email_dispatcher.stats
+        stats["messages_per_second"] = stats["sent"] / elapsed
+        stats["connections"] = sink.connections
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of EmailHandler against a local SMTP sink")
+    parser.add_argument("--messages", type=int, default=200, help="Messages sent per variant")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="Latency of a new connection in seconds")
+    parser.add_argument("--latency", type=float, default=0.005, help="Latency of a message in seconds")
+    parser.add_argument("--max-messages-per-connection", type=int, default=100, help="SMTP_MAX_MESSAGES_PER_CONNECTION")
+    parser.add_argument("--concurrency", type=int, default=4, help="EMAIL_CONCURRENCY of the dispatcher")
+    parser.add_argument("--messages-per-minute", type=float, default=0, help="EMAIL_MESSAGES_PER_MINUTE of the dispatcher")
+    parser.add_argument("--temporary-error-rate", type=float, default=0.0, help="Share of the messages the sink refuses with a 451")
+    parser.add_argument("--quota", type=int, default=None, help="Messages the sink accepts before refusing them with a 550 5.4.5")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="Delay of the first deferred retry of a message in seconds")
+    args = parser.parse_args()
+
+    with LocalSMTPSink(latency=args.latency, connect_latency=args.connect_latency) as sink:
+        before = messages_per_second(sink, lambda index: send_per_connection(sink, index), args.messages)
+        with EmailHandler(
+            "sender@example.com",
+            "password",
+            smtp_host="127.0.0.1",
+            smtp_port=sink.port,
+            use_starttls=False,
+            max_messages_per_connection=args.max_messages_per_connection,
+        ) as email_handler:
+            after = messages_per_second(
+                sink,
+                lambda index: email_handler.send(f"Email {index}", f"contact{index}@example.com", f"Job {index}"),
+                args.messages,
+            )
+
+    print(f"{'variant':<24}{'messages/s':>12}{'connections':>13}")
+    print(f"{'connection per message':<24}{before[0]:>12.1f}{before[1]:>13}")
+    print(f"{'pooled connection':<24}{after[0]:>12.1f}{after[1]:>13}")
+    print(f"speedup {after[0] / before[0]:.1f}x")
+
+    stats = run_dispatcher(args)
+    print(f"\nEmailDispatcher with {args.concurrency} connections")
+    print(
+        f"{stats['messages_per_second']:.1f} messages/s, {stats['sent']} sent, {stats['failed']} failed, "
+        f"{stats['deferred']} deferred to a later run, {stats['retries']} retries, {stats['connections']} connections"
+    )
+    print(
+        f"per-message SMTP send p50 {stats['p50_send_seconds'] * 1000:.1f} ms, p95 {stats['p95_send_seconds'] * 1000:.1f} ms; "
+        f"latency from the start of the dispatch p50 {stats['p50_latency']:.2f} s, p95 {stats['p95_latency']:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Startup time benchmark of the aijobapply CLI and Flask app.
+
+Every command runs in a fresh interpreter. The median wall time of each is checked against a
+startup budget, and the modules imported by the CLI entry point are checked for the heavy libraries
+that must only be imported once jobs are processed. Exits with status 1 if either check fails.
+
+Usage:
+    python -m benchmarks.startup_benchmark --runs 5 --budget 0.5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "import aijobapply.main": ["-c", "import aijobapply.main"],
+    "aijobapply --help": ["-m", "aijobapply.main", "--help"],
+    "import aijobapply.app": ["-c", "import aijobapply.app"],
+}
+
+# Libraries only needed on the code paths that process jobs
+HEAVY_MODULES = ["pandas", "langchain", "selenium", "gspread", "googleapiclient", "docx", "docxtpl", "tqdm"]
+
+
+def time_command(arguments: list, runs: int) -> float:
+    """Median wall time in seconds of running the interpreter with the given arguments."""
+    timings = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], cwd=ROOT_FOLDER, capture_output=True, check=True)
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings)
+
+
+def eagerly_imported_modules() -> list:
+    """Heavy libraries imported by the CLI entry point."""
+    script = (
+        "import sys, aijobapply.main; "
+        f"print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT_FOLDER, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark of the aijobapply entry points")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command")
+    parser.add_argument("--budget", type=float, default=0.5, help="Startup budget of the CLI entry point in seconds")
+    args = parser.parse_args()
+
+    # Interpreter startup is outside of our control and not counted against the budget
+    baseline = time_command(["-c", "pass"], args.runs)
+    print(f"{'command':<28}{'median s':>10}{'over interpreter s':>20}")
+    print(f"{'python -c pass':<28}{baseline:>10.3f}{0.0:>20.3f}")
+
+    within_budget = True
+    for name, arguments in COMMANDS.items():
+        median = time_command(arguments, args.runs)
+        print(f"{name:<28}{median:>10.3f}{median - baseline:>20.3f}")
+        # The Flask app pays for importing Flask itself, only the CLI is held to the budget
+        if name != "import aijobapply.app" and median - baseline > args.budget:
+            print(f"  over the {args.budget:.2f} s startup budget")
+            within_budget = False
+
+    heavy_modules = eagerly_imported_modules()
+    if heavy_modules:
+        print(f"Heavy modules imported at startup: {', '.join(heavy_modules)}")
+        within_budget = False
+
+    sys.exit(0 if within_budget else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Micro-benchmark of rendering the resume and reading the .docx templates.
+
+Compares rendering the resume from a freshly loaded DocxTemplate, saved and then rewritten with fixed
+zip timestamps (before), with rendering it from a copy of the template parsed once by the TemplateCache
+(after), and reading the templates with python-docx on every call with the cached get_file_content.
+Both renders of the same variables are checked to give the same bytes.
+
+Then all the documents of --jobs jobs are rendered by as many worker threads as rendering processes,
+in the threads themselves and through a DocumentRenderPool, to measure how rendering scales with the
+cores of the machine.
+
+Usage:
+    python -m benchmarks.template_benchmark --renders 200 --jobs 200 --processes 1 2 4
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import docx
+import docxtpl
+
+from benchmarks.pipeline_benchmark import make_templates
+from src.artifact_pipeline import DocumentRenderPool
+from src.template_cache import DOCX_ENTRY_DATE_TIME, TemplateCache
+from src.utils import get_file_content, render_documents
+
+
+def render_uncached(resume_path: str, context: Dict[str, str]) -> bytes:
+    """Render the resume the way create_job_folder did before the TemplateCache."""
+    resume = docxtpl.DocxTemplate(resume_path)
+    resume.render(context)
+    resume_content = io.BytesIO()
+    resume.save(resume_content)
+
+    normalized_content = io.BytesIO()
+    with zipfile.ZipFile(resume_content) as source, zipfile.ZipFile(normalized_content, "w", zipfile.ZIP_DEFLATED) as target:
+        for entry in source.infolist():
+            normalized_entry = zipfile.ZipInfo(entry.filename, date_time=DOCX_ENTRY_DATE_TIME)
+            normalized_entry.compress_type = zipfile.ZIP_DEFLATED
+            normalized_entry.external_attr = entry.external_attr
+            target.writestr(normalized_entry, source.read(entry.filename))
+    return normalized_content.getvalue()
+
+
+def read_uncached(path: str) -> str:
+    """Read a template the way get_file_content did before the TemplateCache."""
+    return "".join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+
+
+def per_second(function: Callable[[int], object], count: int) -> float:
+    """Calls per second of function, called with the index of each call."""
+    started_at = time.perf_counter()
+    for index in range(count):
+        function(index)
+    return count / (time.perf_counter() - started_at)
+
+
+def job_payloads(count: int) -> List[tuple]:
+    """Document payloads of synthetic jobs, see src.utils.get_document_payload."""
+    return [
+        (
+            f"Summary of job {index}. " * 20,
+            f"Dear Hiring Manager, cover letter of job {index}. " * 30,
+            f"Application for job {index}",
+            f"Email of job {index}. " * 10,
+            f"LinkedIn note of job {index}.",
+        )
+        for index in range(count)
+    ]
+
+
+def render_jobs_per_second(payloads: List[tuple], resume_path: str, processes: int) -> Dict[str, float]:
+    """
+    Jobs rendered per second by as many worker threads as processes, with and without a DocumentRenderPool.
+    With 0 processes (RENDER_PROCESSES rendering in the worker threads), one thread renders and there is no pool.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, processes)) as executor:
+        started_at = time.perf_counter()
+        list(executor.map(lambda payload: render_documents(payload, resume_path), payloads))
+        threads = len(payloads) / (time.perf_counter() - started_at)
+        if not processes:
+            return {"threads": threads, "processes": float("nan")}
+
+        render_pool = DocumentRenderPool(resume_path, processes)
+        try:
+            # Start the processes and parse the templates before timing
+            list(executor.map(render_pool.render, payloads[:processes]))
+            started_at = time.perf_counter()
+            list(executor.map(render_pool.render, payloads))
+            pool = len(payloads) / (time.perf_counter() - started_at)
+        finally:
+            render_pool.close()
+    return {"threads": threads, "processes": pool}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the .docx template cache")
+    parser.add_argument("--renders", type=int, default=200, help="Resumes rendered (and templates read) per variant")
+    parser.add_argument("--jobs", type=int, default=200, help="Jobs whose documents are rendered per number of processes")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="Numbers of rendering processes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        templates = make_templates(folder)
+        resume_path = templates["RESUME_PATH"]
+        cache = TemplateCache()
+
+        def context(index: int) -> Dict[str, str]:
+            return {"resume_professional_summary": f"Summary of job {index}"}
+
+        if render_uncached(resume_path, context(0)) != cache.render(resume_path, context(0)):
+            raise SystemExit("The cached render differs from the uncached render.")
+
+        results = {
+            "render resume": (
+                per_second(lambda index: render_uncached(resume_path, context(index)), args.renders),
+                per_second(lambda index: cache.render(resume_path, context(index)), args.renders),
+            ),
+            "read templates": (
+                per_second(lambda index: [read_uncached(path) for path in templates.values()], args.renders),
+                per_second(lambda index: [get_file_content(path) for path in templates.values()], args.renders),
+            ),
+        }
+        payloads = job_payloads(args.jobs)
+        scaling = {processes: render_jobs_per_second(payloads, resume_path, processes) for processes in args.processes}
+
+    print(f"{'operation':<18}{'before /s':>12}{'after /s':>12}{'speedup':>10}")
+    for operation, (before, after) in results.items():
+        print(f"{operation:<18}{before:>12.1f}{after:>12.1f}{after / before:>9.1f}x")
+
+    print(f"\n{os.cpu_count()} CPU cores")
+    print(f"{'processes':<18}{'threads jobs/s':>16}{'processes jobs/s':>18}")
+    for processes, result in scaling.items():
+        print(f"{processes:<18}{result['threads']:>16.1f}{result['processes']:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
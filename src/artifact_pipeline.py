@@ -0,0 +1,216 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils import (MANIFEST_FILE_NAME, render_documents,
+                       write_file_if_changed)
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+
+class ArtifactMemoryBudget:
+    """
+    Bounds the bytes of the rendered documents held in memory by the jobs in flight, across threads.
+
+    A job reserves an estimate of the size of its documents before rendering them, the size of the largest
+    job so far, and holds it, resized to the actual size once rendered, until they are uploaded. Jobs wait
+    while the budget is used up. A single job larger than the budget is still let through once no other job
+    holds memory.
+    """
+
+    def __init__(self, max_bytes: int, initial_job_bytes: int = 0):
+        """
+        Args:
+            max_bytes (int): Maximum number of bytes held by the jobs in flight.
+            initial_job_bytes (int): Estimated bytes of the documents of a job until a job is rendered.
+        """
+        self.max_bytes = max_bytes
+        self.initial_job_bytes = initial_job_bytes
+        self._in_flight_bytes = 0
+        self._condition = threading.Condition()
+        self._stats = {"jobs": 0, "peak_bytes": 0, "largest_job_bytes": 0, "waits": 0}
+
+    @contextmanager
+    def reserve(self, size: Optional[int] = None):
+        """
+        Hold size bytes of the budget for the duration of the block.
+
+        Args:
+            size (Optional[int]): Bytes of the documents of the job, by default the estimate of a job.
+
+        Yields:
+            ArtifactReservation: The reservation, to resize once the documents are rendered.
+        """
+        with self._condition:
+            if size is None:
+                size = self._stats["largest_job_bytes"] or self.initial_job_bytes
+            if self._in_flight_bytes and self._in_flight_bytes + size > self.max_bytes:
+                self._stats["waits"] += 1
+                self._condition.wait_for(lambda: not self._in_flight_bytes or self._in_flight_bytes + size <= self.max_bytes)
+            self._in_flight_bytes += size
+            self._stats["jobs"] += 1
+            self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._in_flight_bytes)
+        reservation = ArtifactReservation(self, size)
+        try:
+            yield reservation
+        finally:
+            with self._condition:
+                self._in_flight_bytes -= reservation.size
+                self._condition.notify_all()
+
+    def _resize(self, reservation: "ArtifactReservation", size: int) -> None:
+        """Change the bytes held by a reservation, without waiting: the documents are already in memory."""
+        with self._condition:
+            self._in_flight_bytes += size - reservation.size
+            reservation.size = size
+            self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._in_flight_bytes)
+            self._stats["largest_job_bytes"] = max(self._stats["largest_job_bytes"], size)
+            self._condition.notify_all()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs, peak bytes in flight, bytes of the largest job and number of jobs that waited."""
+        with self._condition:
+            return dict(self._stats)
+
+
+class ArtifactReservation:
+    """
+    Bytes of an ArtifactMemoryBudget held by a job, see ArtifactMemoryBudget.reserve.
+    """
+
+    def __init__(self, budget: ArtifactMemoryBudget, size: int):
+        self.budget = budget
+        self.size = size
+
+    def resize(self, size: int) -> None:
+        """
+        Hold the actual size of the documents of the job once they are rendered.
+
+        Args:
+            size (int): Bytes of the documents of the job.
+        """
+        self.budget._resize(self, size)
+
+
+class LocalCopyWriter:
+    """
+    Writes local copies of the uploaded documents on a background thread, off the path of the job.
+    Files already holding the same content are not rewritten.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-copy")
+
+    def submit(self, job_folder: str, files: List[Tuple[str, bytes]], manifest: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Queue writing the files, and the Google Drive manifest of the folder, to the job folder.
+
+        Args:
+            job_folder (str): Local job folder.
+            files (List[Tuple[str, bytes]]): Name and content of each file.
+            manifest (Optional[Dict[str, Any]]): Manifest of the job folder returned by GoogleDriveHandler.sync_files.
+        """
+        self._executor.submit(self._write, job_folder, files, manifest)
+
+    @staticmethod
+    def _write(job_folder: str, files: List[Tuple[str, bytes]], manifest: Optional[Dict[str, Any]]) -> None:
+        try:
+            os.makedirs(job_folder, exist_ok=True)
+            for file_name, content in files:
+                write_file_if_changed(os.path.join(job_folder, file_name), content)
+            if manifest is not None:
+                manifest_content = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+                write_file_if_changed(os.path.join(job_folder, MANIFEST_FILE_NAME), manifest_content)
+        except Exception as e:
+            # A local copy is a convenience, failing to write it does not fail the job
+            logger.warning(f"Failed to write the local copies of {job_folder}. Error: {str(e)}")
+
+    def close(self) -> None:
+        """Wait for the queued copies to be written."""
+        self._executor.shutdown(wait=True)
+
+
+# Resume template of the rendering process, set by its initializer
+_worker_resume_path: Optional[str] = None
+
+
+def _init_render_worker(resume_path: str) -> None:
+    """Parse the templates, and compile the Jinja templates of the resume, once per rendering process."""
+    global _worker_resume_path
+    _worker_resume_path = resume_path
+
+    from src.template_cache import TEMPLATE_CACHE
+    TEMPLATE_CACHE.document()
+    TEMPLATE_CACHE.render(resume_path, {})
+
+
+def _start_render_worker() -> None:
+    pass
+
+
+def _render_in_worker(payload: Tuple[str, ...]) -> List[Tuple[str, bytes]]:
+    return render_documents(payload, _worker_resume_path)
+
+
+class DocumentRenderPool:
+    """
+    Renders the documents of the jobs in a pool of processes, so rendering, which is CPU bound, is not serialized
+    by the GIL across the worker threads of a run.
+
+    Each process parses the templates once when it starts. A job is sent as its document payload,
+    a tuple of the generated contents, and its documents come back as the name and bytes of each file.
+    """
+
+    def __init__(self, resume_path: str, processes: int):
+        """
+        Args:
+            resume_path (str): Path to the resume template.
+            processes (int): Number of rendering processes.
+        """
+        # Processes are spawned rather than forked, forking a process running threads can deadlock the child
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_render_worker,
+            initargs=(resume_path,),
+        )
+        self._lock = threading.Lock()
+        self._stats = {"jobs": 0, "payload_bytes": 0, "document_bytes": 0}
+        # The executor starts a process per task submitted while no process is idle, up to max_workers, so one
+        # task per process starts them all. They start up while the jobs are read and their contents generated.
+        for _ in range(processes):
+            self._executor.submit(_start_render_worker)
+
+    def render(self, payload: Tuple[str, ...]) -> List[Tuple[str, bytes]]:
+        """
+        Render the documents of a job in one of the processes, blocking the calling thread until they are rendered.
+
+        Args:
+            payload (Tuple[str, ...]): Document payload of the job, see src.utils.get_document_payload.
+
+        Returns:
+            List[Tuple[str, bytes]]: Name and content of each document.
+        """
+        files = self._executor.submit(_render_in_worker, payload).result()
+        with self._lock:
+            self._stats["jobs"] += 1
+            self._stats["payload_bytes"] += sum(len(value.encode("utf-8")) for value in payload)
+            self._stats["document_bytes"] += sum(len(content) for _, content in files)
+        return files
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs rendered, and bytes of the payloads sent and of the documents received."""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        """Stop the rendering processes."""
+        self._executor.shutdown(wait=True)
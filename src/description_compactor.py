@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+
+class DescriptionCompactor:
+    """
+    Compacts job descriptions before they are sent to the LLM.
+
+    - Paragraphs that repeat across the postings of several companies of the current sheet (EEO
+      statements, benefits lists, application instructions) are treated as boilerplate and dropped.
+      Reposts of the same role by one company do not make their paragraphs boilerplate.
+    - The remaining text is trimmed with gptrim. Trimming is lossy, so when it would remove most of
+      the remaining text, the untrimmed text is kept instead.
+    - The result is capped at a token budget.
+    Compacted descriptions are cached per description hash, so each posting is compacted once.
+    """
+
+    def __init__(
+        self,
+        descriptions: Iterable[str],
+        companies: Iterable[str],
+        token_budget: int = 1500,
+        min_companies: int = 2,
+        min_paragraph_length: int = 60,
+        max_removed_share: float = 0.5,
+    ):
+        """
+        Find the boilerplate paragraphs shared by the given descriptions.
+
+        Args:
+            descriptions (Iterable[str]): All job descriptions of the current sheet.
+            companies (Iterable[str]): Company name of each description.
+            token_budget (int): Maximum number of tokens of a compacted description. No cap if 0.
+            min_companies (int): Number of distinct companies a paragraph must appear in to be boilerplate.
+            min_paragraph_length (int): Shorter paragraphs (such as headings) are never treated as boilerplate.
+            max_removed_share (float): Largest share of the tokens left after dropping the boilerplate that
+                trimming may remove. Above it, the text is kept untrimmed.
+        """
+        self.token_budget = token_budget
+        self.min_paragraph_length = min_paragraph_length
+        self.max_removed_share = max_removed_share
+        self._cache: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._encoding = self._load_encoding()
+        self._trim_available = True
+
+        paragraph_companies: Dict[str, Set[str]] = defaultdict(set)
+        for description, company in set(zip(descriptions, companies)):
+            company = self._normalize(company) if isinstance(company, str) else ""
+            for paragraph in self.split_paragraphs(description):
+                paragraph_companies[self._normalize(paragraph)].add(company)
+        self._boilerplate = {
+            paragraph
+            for paragraph, paragraph_company_names in paragraph_companies.items()
+            if len(paragraph_company_names) >= min_companies and len(paragraph) >= min_paragraph_length
+        }
+        logger.info(f"Found {len(self._boilerplate)} boilerplate paragraphs repeated across job descriptions.")
+
+    @staticmethod
+    def split_paragraphs(description: str) -> List[str]:
+        """Split a description into non-empty paragraphs (one per line)."""
+        if not isinstance(description, str):
+            return []
+        return [paragraph.strip() for paragraph in description.splitlines() if paragraph.strip()]
+
+    @staticmethod
+    def _normalize(paragraph: str) -> str:
+        """Normalize a paragraph for boilerplate matching."""
+        return re.sub(r"\s+", " ", paragraph).strip().lower()
+
+    @staticmethod
+    def _load_encoding():
+        """Load the tiktoken encoding used to count tokens, if tiktoken is installed."""
+        try:
+            import tiktoken
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            logger.info("tiktoken not available, estimating tokens from the number of characters.")
+            return None
+
+    def count_tokens(self, text: str) -> int:
+        """Count (or estimate) the number of tokens in a text."""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(text) // 4
+
+    def compact(self, description: str) -> str:
+        """
+        Compact a job description.
+
+        Args:
+            description (str): Raw job description.
+
+        Returns:
+            str: Compacted job description.
+        """
+        if not isinstance(description, str) or not description.strip():
+            return description
+
+        description_hash = hashlib.sha256(description.encode("utf-8")).hexdigest()
+        with self._lock:
+            if description_hash in self._cache:
+                return self._cache[description_hash]
+
+        paragraphs = [
+            paragraph
+            for paragraph in self.split_paragraphs(description)
+            if self._normalize(paragraph) not in self._boilerplate
+        ]
+        # Boilerplate repeated across companies is always dropped, only the lossy trimming is guarded
+        untrimmed = "\n".join(paragraphs)
+        compacted = self._trim(untrimmed)
+        if self.count_tokens(compacted) < self.count_tokens(untrimmed) * (1 - self.max_removed_share):
+            logger.info("Trimming would remove most of a job description, keeping it untrimmed.")
+            compacted = untrimmed
+        description_tokens = self.count_tokens(description)
+        compacted = self._truncate(compacted)
+        logger.info(
+            f"Compacted job description from {description_tokens} to {self.count_tokens(compacted)} tokens."
+        )
+
+        with self._lock:
+            self._cache[description_hash] = compacted
+        return compacted
+
+    def _trim(self, text: str) -> str:
+        """Trim the text with gptrim, falling back to collapsing whitespace."""
+        with self._lock:
+            trim_available = self._trim_available
+        if trim_available:
+            try:
+                from gptrim import trim
+                return trim(text)
+            except Exception as e:
+                with self._lock:
+                    if self._trim_available:
+                        logger.warning(f"gptrim unavailable, only collapsing whitespace in job descriptions. Error: {str(e)}")
+                    self._trim_available = False
+        return re.sub(r"[ \t]+", " ", text).strip()
+
+    def _truncate(self, text: str) -> str:
+        """Cap the text at the token budget."""
+        if not self.token_budget or self.count_tokens(text) <= self.token_budget:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text)[: self.token_budget])
+        return text[: self.token_budget * 4]
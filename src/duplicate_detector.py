@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+# Prime larger than any 32-bit shingle hash, for the MinHash permutations
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Per-row fields swapped into content reused across near-duplicate postings
+ADAPTED_COLUMNS = ("Contact Name", "Position")
+
+# Shorter values (e.g. a contact named "Al") cannot be replaced safely, the content is generated instead
+MIN_REPLACED_LENGTH = 3
+
+
+class NearDuplicateDetector:
+    """
+    Clusters near-duplicate job postings of the same company with MinHash and LSH.
+
+    Recruiters repost the same role under several links and locations. Descriptions are shingled
+    into word n-grams, MinHash signatures estimate the Jaccard similarity of the shingle sets, and
+    LSH banding only compares postings that share a band bucket within the same company.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        """
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity of two near-duplicate descriptions.
+            num_perm (int): Number of MinHash permutations.
+            shingle_size (int): Number of words per shingle.
+            seed (int): Seed of the MinHash permutations.
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = self._optimal_bands(threshold, num_perm)
+
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def _optimal_bands(threshold: float, num_perm: int):
+        """Pick the LSH bands and rows per band whose S-curve threshold is closest to the similarity threshold."""
+        candidates = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+        return min(candidates, key=lambda candidate: abs((1 / candidate[0]) ** (1 / candidate[1]) - threshold))
+
+    def _shingles(self, description: str) -> np.ndarray:
+        """Hash the word shingles of a description into 32-bit integers."""
+        words = re.findall(r"\w+", str(description).lower())
+        if len(words) < self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {
+                " ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)
+            }
+        return np.array(
+            [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") for shingle in shingles],
+            dtype=np.uint64,
+        )
+
+    def signature(self, description: str) -> np.ndarray:
+        """
+        Compute the MinHash signature of a description.
+
+        Args:
+            description (str): Job description.
+
+        Returns:
+            np.ndarray: MinHash signature of num_perm values.
+        """
+        shingles = self._shingles(description)
+        permuted = (np.outer(self._a, shingles) + self._b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1)
+
+    def cluster(self, jobs_df: pd.DataFrame) -> Dict[object, List[object]]:
+        """
+        Cluster the near-duplicate jobs of the DataFrame.
+
+        Args:
+            jobs_df (pd.DataFrame): Jobs with "Company Name" and "Description" columns.
+
+        Returns:
+            Dict[object, List[object]]: The duplicates of each representative job (first row of its cluster),
+            keyed by DataFrame index. Every job appears either as a key or in exactly one list.
+        """
+        indices = list(jobs_df.index)
+        positions = {index: position for position, index in enumerate(indices)}
+        signatures = {index: self.signature(jobs_df.at[index, "Description"]) for index in indices}
+        companies = {index: str(jobs_df.at[index, "Company Name"]).strip().lower() for index in indices}
+
+        parents = {index: index for index in indices}
+
+        def find(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        # Candidate pairs share a band bucket within the same company
+        buckets = {}
+        for index in indices:
+            for band in range(self.bands):
+                band_values = signatures[index][band * self.rows:(band + 1) * self.rows].tobytes()
+                buckets.setdefault((companies[index], band, band_values), []).append(index)
+
+        for bucket in buckets.values():
+            for other in bucket[1:]:
+                first = bucket[0]
+                if find(first) == find(other):
+                    continue
+                similarity = float(np.mean(signatures[first] == signatures[other]))
+                if similarity >= self.threshold:
+                    # The earliest row of the cluster stays its representative
+                    root, other_root = sorted((find(first), find(other)), key=positions.get)
+                    parents[other_root] = root
+
+        clusters = {}
+        for index in indices:
+            clusters.setdefault(find(index), []).append(index)
+        return {representative: members[1:] for representative, members in clusters.items()}
+
+
+def _whole_words(value: str) -> str:
+    """Regular expression matching the value only as whole words."""
+    return rf"(?<!\w){re.escape(value)}(?!\w)"
+
+
+def _adaptable_fields(source_job: pd.Series, target_job: pd.Series) -> Optional[List[Tuple[str, str]]]:
+    """
+    Get the (source, target) values of the per-row fields that differ between two jobs.
+
+    Returns:
+        Optional[List[Tuple[str, str]]]: Values to swap, None if a field of the source job is empty or too short
+        to be replaced safely in the generated content, or the field of the target job is empty.
+    """
+    replacements = []
+    for column in ADAPTED_COLUMNS:
+        source_value = str(source_job.get(column, "") or "").strip()
+        target_value = str(target_job.get(column, "") or "").strip()
+        if source_value == target_value:
+            continue
+        if len(source_value) < MIN_REPLACED_LENGTH or not target_value:
+            return None
+        replacements.append((source_value, target_value))
+    return replacements
+
+
+def can_adapt_generated_content(source_job: pd.Series, target_job: pd.Series) -> bool:
+    """
+    Check whether content generated for a job can be adapted to a near-duplicate job, see adapt_generated_content.
+    A job it cannot be adapted to has its content generated on its own.
+
+    Args:
+        source_job (pd.Series): Job the content is generated for.
+        target_job (pd.Series): Near-duplicate job.
+
+    Returns:
+        bool: Whether the content can be adapted.
+    """
+    return _adaptable_fields(source_job, target_job) is not None
+
+
+def adapt_generated_content(generated_content: Dict[str, str], source_job: pd.Series, target_job: pd.Series) -> Dict[str, str]:
+    """
+    Adapt content generated for a job to a near-duplicate job.
+    Only the cheap per-row fields (contact name and position) are swapped in, as whole words and in a single
+    pass, so a value is never replaced inside another word or inside the value swapped in.
+
+    Args:
+        generated_content (Dict[str, str]): Content generated for the source job.
+        source_job (pd.Series): Job the content was generated for.
+        target_job (pd.Series): Near-duplicate job to adapt the content to.
+
+    Returns:
+        Dict[str, str]: Adapted content.
+
+    Raises:
+        ValueError: If the content cannot be adapted, see can_adapt_generated_content.
+    """
+    replacements = _adaptable_fields(source_job, target_job)
+    if replacements is None:
+        raise ValueError("The contact name or position of the jobs cannot be swapped safely in the generated content.")
+    if not replacements:
+        return dict(generated_content)
+
+    substitutes = {}
+    for source_value, target_value in replacements:
+        substitutes[source_value] = target_value
+        # A target already in the content (e.g. "Senior Data Engineer" for "Data Engineer") is kept as it is
+        if re.search(_whole_words(source_value), target_value):
+            substitutes.setdefault(target_value, target_value)
+    # Longest values first, so a value containing another one is matched as a whole
+    pattern = re.compile(
+        "|".join(_whole_words(value) for value in sorted(substitutes, key=len, reverse=True))
+    )
+    return {
+        key: pattern.sub(lambda match: substitutes[match.group(0)], value) if isinstance(value, str) else value
+        for key, value in generated_content.items()
+    }
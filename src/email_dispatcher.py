@@ -0,0 +1,350 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.email_handler import CONNECTION_ERRORS, EmailHandler
+from src.rate_limiter import RateLimiter, backoff_delay
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+# Results of a message: sent, failed for good, or deferred to a later run (daily quota reached)
+SENT = "sent"
+FAILED = "failed"
+DEFERRED = "deferred"
+
+# Texts of the replies of a server refusing messages because the daily sending quota of the account is used up,
+# e.g. "550 5.4.5 Daily user sending limit exceeded" from Gmail
+QUOTA_REPLY_MARKERS = ["5.4.5", "quota", "sending limit"]
+
+
+def _smtp_reply(error: Exception) -> Optional[Tuple[int, str]]:
+    """Get the reply code and text of the server from an SMTP error, None if the server did not reply."""
+    if isinstance(error, smtplib.SMTPResponseException):
+        code, text = error.smtp_code, error.smtp_error
+    elif isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code, text = next(iter(error.recipients.values()))
+    else:
+        return None
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", "replace")
+    return code, str(text)
+
+
+def is_quota_error(error: Exception) -> bool:
+    """Whether the server refused a message because the daily sending quota of the account is used up."""
+    reply = _smtp_reply(error)
+    return reply is not None and any(marker in reply[1].lower() for marker in QUOTA_REPLY_MARKERS)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether sending a message may succeed later: a 4xx reply of the server, or a connection error."""
+    reply = _smtp_reply(error)
+    if reply is not None:
+        return 400 <= reply[0] < 500
+    # SMTP errors are OSErrors too, the others without a reply are not worth retrying
+    return isinstance(error, CONNECTION_ERRORS) or (isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException))
+
+
+class DailyQuota:
+    """
+    Count of the emails sent today, persisted across runs, against a daily limit of the account.
+    The count restarts at local midnight.
+    """
+
+    def __init__(self, daily_limit: int, state_path: Optional[str] = None):
+        """
+        Args:
+            daily_limit (int): Maximum number of emails per day. No limit if 0.
+            state_path (Optional[str]): Path to the JSON file holding the count. Kept in memory only if None.
+        """
+        self.daily_limit = daily_limit
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._day = date.today().isoformat()
+        self._sent = 0
+        if state_path and os.path.isfile(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as file:
+                    state = json.load(file)
+                if state.get("date") == self._day:
+                    self._sent = int(state.get("sent", 0))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring the unreadable email quota state {state_path}. Error: {str(e)}")
+
+    def _roll_over(self) -> None:
+        today = date.today().isoformat()
+        if today != self._day:
+            self._day, self._sent = today, 0
+
+    def available(self) -> bool:
+        """Whether another email fits in the daily limit."""
+        with self._lock:
+            self._roll_over()
+            return not self.daily_limit or self._sent < self.daily_limit
+
+    def record(self) -> None:
+        """Count an email sent."""
+        with self._lock:
+            self._roll_over()
+            self._sent += 1
+            self._save()
+
+    def exhaust(self) -> None:
+        """Mark the quota of today used up, e.g. when the server says so."""
+        with self._lock:
+            self._roll_over()
+            self._sent = max(self._sent, self.daily_limit)
+            self._save()
+
+    @property
+    def sent_today(self) -> int:
+        """Number of emails sent today."""
+        with self._lock:
+            self._roll_over()
+            return self._sent
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        state_folder = os.path.dirname(self.state_path)
+        if state_folder:
+            os.makedirs(state_folder, exist_ok=True)
+        temporary_path = f"{self.state_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump({"date": self._day, "sent": self._sent}, file)
+        os.replace(temporary_path, self.state_path)
+
+
+class EmailDispatcher:
+    """
+    Outbound queue sending emails over a few concurrent SMTP connections under a messages-per-minute budget.
+
+    A message refused with a 4xx reply, or whose connection failed, is deferred and retried later with backoff
+    while the other messages are sent. When the daily quota of the account is used up, the queue is paused:
+    the remaining messages are deferred to a later run instead of failed.
+    """
+
+    def __init__(
+        self,
+        email_handler: EmailHandler,
+        concurrency: int = 1,
+        messages_per_minute: float = 0,
+        daily_quota: Optional[DailyQuota] = None,
+        max_retries: int = 3,
+        retry_base_delay: float = 30.0,
+        retry_max_delay: float = 600.0,
+    ):
+        """
+        Args:
+            email_handler (EmailHandler): Handler sending the messages, with a pool of at least concurrency connections.
+            concurrency (int): Number of messages sent at once.
+            messages_per_minute (float): Maximum number of messages sent per minute. No limit if 0.
+            daily_quota (Optional[DailyQuota]): Daily limit of the account. No limit if None.
+            max_retries (int): Maximum number of retries of a message after transient errors.
+            retry_base_delay (float): Delay of the first retry of a message in seconds.
+            retry_max_delay (float): Upper bound of the delay of a retry in seconds.
+        """
+        self.email_handler = email_handler
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute=messages_per_minute)
+        self.daily_quota = daily_quota or DailyQuota(0)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        self._condition = threading.Condition()
+        # Messages ready to send at a given time: (ready_at, sequence, message, attempt)
+        self._queue: List[Tuple[float, int, Dict[str, Any], int]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused = False
+        self._latencies: List[float] = []
+        self._send_times: List[float] = []
+        self._stats = {"sent": 0, "failed": 0, "deferred": 0, "retries": 0}
+
+    def dispatch(
+        self,
+        messages: List[Dict[str, Any]],
+        on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+    ) -> Dict[Any, Dict[str, Any]]:
+        """
+        Send messages and wait until each is sent, failed or deferred.
+
+        Args:
+            messages (List[Dict[str, Any]]): Messages with a key, and the recipient, subject and content to send.
+            on_result (Optional[Callable]): Called with each message and its result as soon as it is known,
+                from the sending threads.
+
+        Returns:
+            Dict[Any, Dict[str, Any]]: Result of each message by key: status (sent, failed or deferred), attempts,
+            latency in seconds from the start of the dispatch, send_seconds of the SMTP transaction that sent it,
+            the last error if any, and whether it was transient (retries exhausted).
+        """
+        results = {}
+        results_lock = threading.Lock()
+        started_at = time.monotonic()
+
+        def report(
+            message: Dict[str, Any], status: str, attempts: int, error: Optional[Exception] = None, send_seconds: float = 0.0
+        ) -> None:
+            result = {
+                "status": status,
+                "attempts": attempts,
+                "latency": time.monotonic() - started_at,
+                "send_seconds": send_seconds,
+                "error": str(error) if error is not None else "",
+                "transient": error is not None and is_transient_error(error),
+            }
+            with results_lock:
+                results[message["key"]] = result
+            with self._condition:
+                self._stats[status] += 1
+                if status == SENT:
+                    self._latencies.append(result["latency"])
+                    self._send_times.append(send_seconds)
+            if on_result is not None:
+                on_result(message, result)
+
+        with self._condition:
+            self._paused = not self.daily_quota.available()
+            for message in messages:
+                heapq.heappush(self._queue, (started_at, next(self._sequence), message, 0))
+
+        workers = [
+            threading.Thread(target=self._work, args=(report,), name=f"email-{index}", daemon=True)
+            for index in range(min(self.concurrency, len(messages)))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # Messages left in the queue of a paused dispatch are sent by a later run
+        with self._condition:
+            remaining, self._queue = self._queue, []
+        if remaining:
+            logger.warning(
+                f"Daily email quota reached after {self.daily_quota.sent_today} emails today, "
+                f"deferring {len(remaining)} emails to a later run."
+            )
+        for _, _, message, attempt in remaining:
+            report(message, DEFERRED, attempt)
+        return results
+
+    def _next_message(self) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Wait for the next message ready to send, None once the queue is drained or paused."""
+        with self._condition:
+            while True:
+                if self._paused or (not self._queue and not self._in_flight):
+                    return None
+                now = time.monotonic()
+                if self._queue and self._queue[0][0] <= now:
+                    _, _, message, attempt = heapq.heappop(self._queue)
+                    self._in_flight += 1
+                    return message, attempt
+                # Wait for a deferred message to be ready, or for a message in flight to be deferred
+                self._condition.wait(timeout=self._queue[0][0] - now if self._queue else None)
+
+    def _requeue(self, message: Dict[str, Any], attempt: int, delay: float = 0.0) -> None:
+        with self._condition:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._sequence), message, attempt))
+
+    def _pause(self) -> None:
+        with self._condition:
+            self._paused = True
+
+    def _work(self, report: Callable) -> None:
+        while True:
+            next_message = self._next_message()
+            if next_message is None:
+                return
+            message, attempt = next_message
+            try:
+                self._send(message, attempt, report)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+    def _send(self, message: Dict[str, Any], attempt: int, report: Callable) -> None:
+        if not self.daily_quota.available():
+            self._pause()
+            self._requeue(message, attempt)
+            return
+
+        self.rate_limiter.acquire()
+        sending_started_at = time.monotonic()
+        try:
+            self.email_handler.send(content=message["content"], recepient_email=message["recipient"], subject=message["subject"])
+        except Exception as e:
+            if is_quota_error(e):
+                logger.warning(f"The server reports the daily email quota as used up: {str(e)}")
+                self.daily_quota.exhaust()
+                self._pause()
+                self._requeue(message, attempt)
+            elif is_transient_error(e) and attempt < self.max_retries:
+                delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                reply = _smtp_reply(e)
+                if reply is not None and reply[0] == 421:
+                    # The server is throttling the account, hold back every connection
+                    self.rate_limiter.pause(delay)
+                logger.info(f"Deferring the email to {message['recipient']} by {delay:.1f}s after error: {str(e)}")
+                with self._condition:
+                    self._stats["retries"] += 1
+                self._requeue(message, attempt + 1, delay)
+            else:
+                report(message, FAILED, attempt + 1, e)
+            return
+        self.daily_quota.record()
+        report(message, SENT, attempt + 1, send_seconds=time.monotonic() - sending_started_at)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Messages sent, failed and deferred, retries, and the p50/p95 latency and SMTP send time
+        of the messages sent in seconds.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            timings = {"latency": sorted(self._latencies), "send_seconds": sorted(self._send_times)}
+        for timing, values in timings.items():
+            for percentile, fraction in (("p50", 0.5), ("p95", 0.95)):
+                stats[f"{percentile}_{timing}"] = values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+        return stats
+
+
+def create_email_dispatcher(options: Dict[str, Any]) -> Tuple[EmailHandler, EmailDispatcher]:
+    """
+    Create the email handler and dispatcher of a run from its arguments.
+
+    Args:
+        options (Dict[str, Any]): Validated arguments of the run, see src.utils.validate_arguments.
+
+    Returns:
+        Tuple[EmailHandler, EmailDispatcher]: Handler, to be closed once the emails are sent, and dispatcher.
+    """
+    email_handler = EmailHandler(
+        options["GMAIL_ADDRESS"],
+        options["GMAIL_PASSWORD"],
+        smtp_host=options["SMTP_HOST"],
+        smtp_port=options["SMTP_PORT"],
+        use_starttls=options["SMTP_STARTTLS"],
+        pool_size=options["EMAIL_CONCURRENCY"],
+        max_messages_per_connection=options["SMTP_MAX_MESSAGES_PER_CONNECTION"],
+    )
+    email_dispatcher = EmailDispatcher(
+        email_handler,
+        concurrency=options["EMAIL_CONCURRENCY"],
+        messages_per_minute=options["EMAIL_MESSAGES_PER_MINUTE"],
+        daily_quota=DailyQuota(options["EMAIL_DAILY_LIMIT"], options["EMAIL_QUOTA_STATE_PATH"]),
+        max_retries=options["EMAIL_MAX_RETRIES"],
+    )
+    return email_handler, email_dispatcher
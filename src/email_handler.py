@@ -1,18 +1,122 @@
 import logging
 import smtplib
+import threading
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from typing import Dict, List
 
 # Setting up logger
 logger = logging.getLogger(__name__)
 
+# Errors of a connection the server dropped, e.g. after it was idle for too long
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class _PooledConnection:
+    """Authenticated SMTP connection, the number of messages sent over it and when it was last used."""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
 class EmailHandler:
-    def __init__(self, sender_email: str, sender_password: str):
+    def __init__(
+        self,
+        sender_email: str,
+        sender_password: str,
+        smtp_host: str = "smtp.gmail.com",
+        smtp_port: int = 587,
+        use_starttls: bool = True,
+        pool_size: int = 1,
+        max_messages_per_connection: int = 100,
+        noop_after_idle_seconds: float = 30.0,
+        timeout: float = 60.0,
+    ):
         """
-        Initialize EmailHandler object with Email credentials.
+        Initialize EmailHandler object with Email credentials and the SMTP server to send through.
+
+        Messages are sent over up to pool_size long-lived authenticated connections, so a message costs no
+        connection, STARTTLS or login round trips. A connection idle for noop_after_idle_seconds is checked
+        with NOOP before it is used, a dropped connection is replaced, and a connection is recycled after
+        max_messages_per_connection messages. Close the handler (or use it as a context manager) when done.
         """
         self.sender_email = sender_email
         self.sender_password = sender_password
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.use_starttls = use_starttls
+        self.max_messages_per_connection = max(1, max_messages_per_connection)
+        self.noop_after_idle_seconds = noop_after_idle_seconds
+        self.timeout = timeout
+
+        self._idle_connections: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        # A sender holds a slot of the pool for the time of its message
+        self._slots = threading.BoundedSemaphore(max(1, pool_size))
+        self._stats = {"messages": 0, "connections": 0, "reconnects": 0}
+
+    def __enter__(self) -> "EmailHandler":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _connect(self) -> _PooledConnection:
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=self.timeout)
+        try:
+            if self.use_starttls:
+                server.starttls()
+            server.login(self.sender_email, self.sender_password)
+        except Exception:
+            server.close()
+            raise
+        with self._lock:
+            self._stats["connections"] += 1
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _disconnect(connection: _PooledConnection) -> None:
+        try:
+            connection.server.quit()
+        except Exception:
+            # The server may already have dropped the connection
+            connection.server.close()
+
+    def _is_alive(self, connection: _PooledConnection) -> bool:
+        if time.monotonic() - connection.last_used < self.noop_after_idle_seconds:
+            return True
+        try:
+            return connection.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> _PooledConnection:
+        """Get an idle connection that is still alive, or a new one."""
+        while True:
+            with self._lock:
+                if not self._idle_connections:
+                    break
+                # The most recently used connection is the least likely to have been dropped
+                connection = self._idle_connections.pop()
+            if self._is_alive(connection):
+                return connection
+            logger.info("Dropped SMTP connection, reconnecting.")
+            with self._lock:
+                self._stats["reconnects"] += 1
+            self._disconnect(connection)
+        return self._connect()
+
+    def _release(self, connection: _PooledConnection) -> None:
+        """Return a connection to the pool, or close it once it has sent max_messages_per_connection messages."""
+        connection.last_used = time.monotonic()
+        if connection.messages >= self.max_messages_per_connection:
+            self._disconnect(connection)
+            return
+        with self._lock:
+            self._idle_connections.append(connection)
 
     def send(
         self,
@@ -22,23 +126,72 @@ class EmailHandler:
     ):
         """
         Send an email with the given content and subject.
+        A message sent over a reused connection the server dropped is sent again over a new connection.
 
         Args:
         - content (str): Message Content.
         - email (str): Recipient email address.
         - subject (str): Message subject line.
+
+        Raises:
+        - smtplib.SMTPException, OSError: If the message could not be sent.
         """
         message = MIMEMultipart()
         message["From"] = self.sender_email
         message["To"] = recepient_email
         message["Subject"] = subject
         message.attach(MIMEText(content, "plain"))
+        message_string = message.as_string()
 
         try:
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.sendmail(self.sender_email, recepient_email, message.as_string())
-                logger.info(f"Message sent to {recepient_email}")
+            with self._slots:
+                connection = self._acquire()
+                try:
+                    self._sendmail(connection, recepient_email, message_string)
+                except CONNECTION_ERRORS:
+                    if connection.messages == 0:
+                        raise
+                    # A reused connection can be dropped between the NOOP check and the message
+                    logger.info("SMTP connection dropped while sending, resending over a new connection.")
+                    with self._lock:
+                        self._stats["reconnects"] += 1
+                    connection = self._connect()
+                    self._sendmail(connection, recepient_email, message_string)
+            logger.info(f"Message sent to {recepient_email}")
         except Exception as e:
-            logger.exception(f"Error occurred while sending email: {e}")
\ No newline at end of file
+            # The caller decides whether the message is retried, no traceback for an expected refusal
+            logger.warning(f"Error occurred while sending email: {e}")
+            raise
+
+    def _sendmail(self, connection: _PooledConnection, recepient_email: str, message_string: str) -> None:
+        """Send a message over a connection, and return the connection to the pool unless it failed."""
+        try:
+            connection.server.sendmail(self.sender_email, recepient_email, message_string)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server refused the message and smtplib reset the transaction, the connection is still usable
+            # unless the server closed it (e.g. with a 421)
+            if connection.server.sock is None:
+                self._disconnect(connection)
+            else:
+                self._release(connection)
+            raise
+        except Exception:
+            self._disconnect(connection)
+            raise
+        connection.messages += 1
+        with self._lock:
+            self._stats["messages"] += 1
+        self._release(connection)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Messages sent, connections opened and dropped connections replaced."""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        with self._lock:
+            connections, self._idle_connections = self._idle_connections, []
+        for connection in connections:
+            self._disconnect(connection)
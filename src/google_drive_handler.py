@@ -1,63 +1,348 @@
+import hashlib
+import io
+import json
+import logging
 import os
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+
+from src.rate_limiter import RateLimiter, call_with_retries, parse_retry_after
+
+if TYPE_CHECKING:
+    from src.google_session import GoogleSession
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+MIME_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".txt": "text/plain",
+}
 
 
 class GoogleDriveHandler:
-    def __init__(self, credentials_file_path: str, folder_name: str = "Job Applications"):
+    def __init__(
+        self,
+        credentials_file_path: str,
+        folder_name: str = "Job Applications",
+        service=None,
+        session: Optional["GoogleSession"] = None,
+        upload_concurrency: int = 4,
+        max_retries: int = 5,
+        folder_index_path: Optional[str] = None,
+    ):
+        """
+        Initialize GoogleDriveHandler and get (or create) the root folder of the job applications.
+        An already built Drive service, e.g. an offline stand-in, can be passed instead of authenticating.
+        A GoogleSession shares its credentials and keep-alive connections with the Google Sheets client.
+        Uploads of every job share one pool of upload_concurrency workers, bounding the concurrent Drive requests.
+        The IDs of the job folders are kept in a name to ID index of the children of the root folder, listed once
+        and persisted to folder_index_path between runs, so resolving a job folder needs no Drive request.
+        """
         self.credentials_file_path = credentials_file_path
-        self.service = self.authenticate()
+        self.session = session
+        self.max_retries = max_retries
+        self.service = service if service is not None else self.authenticate()
+        # Rate limit errors pause every upload worker, not only the one that hit the limit
+        self._rate_limiter = RateLimiter()
+        self._upload_concurrency = max(1, int(upload_concurrency))
+        self._upload_pool: Optional[ThreadPoolExecutor] = None
+        self._upload_pool_lock = threading.Lock()
+        self.folder_index_path = folder_index_path
+        self._folder_index: Dict[str, str] = {}
+        # Whether the index was listed from Drive by this run, then a folder missing from it does not exist
+        self._folder_index_listed = False
+        # Folders created by this run, known to be empty until files are synced to them
+        self._created_folder_ids = set()
+        # Serializes creating folders, so two jobs with the same folder name do not both create it
+        self._folder_lock = threading.RLock()
         self.job_root_folder_id = self.get_folder(folder_name)
+        self._load_folder_index()
 
     def authenticate(self):
-        scopes = ['https://www.googleapis.com/auth/drive']
-        credentials = service_account.Credentials.from_service_account_file(
-                self.credentials_file_path, scopes=scopes)
-        service = build('drive', 'v3', credentials=credentials)
-        return service
+        if self.session is None:
+            from src.google_session import GoogleSession
+            self.session = GoogleSession(self.credentials_file_path)
+        return self.session.drive_service()
 
-    def upload_file(self, file_name: str, file_path: str, parent_id: str) -> None:
+    @staticmethod
+    def _media(file_name: str, content: bytes) -> MediaIoBaseUpload:
+        """Upload body of in-memory content, no file is read from disk."""
+        mimetype = MIME_TYPES.get(os.path.splitext(file_name)[1].lower(), 'application/octet-stream')
+        return MediaIoBaseUpload(io.BytesIO(content), mimetype=mimetype)
 
-        # Add the file to the parent folder
+    def upload_content(self, file_name: str, content: bytes, parent_id: str) -> str:
+        """Upload in-memory content as a file of a folder and return its ID."""
         file_metadata = {'name': file_name, 'parents': [parent_id]}
-        media = MediaFileUpload(file_path, mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-        file = self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        print('File ID: %s' % file.get('id'))
-        
+        media = self._media(file_name, content)
+        file = self.execute(self.service.files().create(body=file_metadata, media_body=media, fields='id'))
+        logger.info(f"Uploaded {file_name}, file ID: {file.get('id')}")
+        return file.get('id')
+
+    def update_content(self, file_id: str, file_name: str, content: bytes) -> str:
+        """Replace the content of a file in place, keeping its ID and sharing settings."""
+        file = self.execute(self.service.files().update(fileId=file_id, media_body=self._media(file_name, content), fields='id'))
+        logger.info(f"Updated {file_name}, file ID: {file.get('id')}")
+        return file.get('id')
+
+    def list_files(self, parent_id: str) -> Dict[str, Dict[str, Any]]:
+        """Get the ID and md5Checksum of the files in a folder by name, page by page."""
+        files = {}
+        page_token = None
+        while True:
+            response = self.execute(self.service.files().list(
+                q=f"'{parent_id}' in parents and trashed=false",
+                spaces='drive',
+                fields='nextPageToken, files(id, name, md5Checksum)',
+                pageSize=1000,
+                pageToken=page_token,
+            ))
+            for file in response.get('files', []):
+                files.setdefault(file['name'], file)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return files
+
+    def sync_files(
+        self,
+        files: List[Tuple[str, bytes]],
+        parent_id: str,
+        manifest: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Bring the files of a folder up to date from their in-memory content: files whose md5 matches the md5Checksum of the file of the same
+        name in the folder are skipped, changed files are updated in place and new files are uploaded, concurrently.
+        The manifest returned by the previous sync of the folder holds the IDs and checksums of its files. When the
+        files did not change since, the folder is skipped once a single list request shows that Drive still holds
+        the files of the manifest, so a file deleted or changed on Drive is uploaded again.
+        If the folder came from the folder index but was deleted from Drive, it is created again.
+
+        Returns the manifest of the folder after the sync: the folder ID and the ID and md5Checksum of each file.
+        """
+        checksums = {file_name: hashlib.md5(content).hexdigest() for file_name, content in files}
+        try:
+            return self._sync_files(files, checksums, parent_id, manifest)
+        except HttpError as e:
+            return self._sync_files(files, checksums, self._recreate_deleted_folder(e, parent_id))
+
+    def _sync_files(
+        self,
+        files: List[Tuple[str, bytes]],
+        checksums: Dict[str, str],
+        parent_id: str,
+        manifest: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Compare the files with the md5Checksum of the files in the folder, uploading or updating changed ones."""
+        existing_files = {} if parent_id in self._created_folder_ids else self.list_files(parent_id)
+        if manifest is not None and manifest.get("folder_id") == parent_id and all(
+            manifest["files"].get(file_name) == {'id': existing_files.get(file_name, {}).get('id'), 'md5Checksum': checksum}
+            and existing_files[file_name].get('md5Checksum') == checksum
+            for file_name, checksum in checksums.items()
+        ):
+            logger.info(f"Skipped {len(files)} unchanged files of folder {parent_id}.")
+            return manifest
+
+        synced_files = {}
+        tasks = []
+        for file_name, content in files:
+            existing_file = existing_files.get(file_name)
+            if existing_file is None:
+                tasks.append((file_name, partial(self.upload_content, file_name, content, parent_id)))
+            elif existing_file.get('md5Checksum') != checksums[file_name]:
+                tasks.append((file_name, partial(self.update_content, existing_file['id'], file_name, content)))
+            else:
+                synced_files[file_name] = {'id': existing_file['id'], 'md5Checksum': checksums[file_name]}
+
+        file_ids = self._run_on_upload_pool([task for _, task in tasks])
+        for (file_name, _), file_id in zip(tasks, file_ids):
+            synced_files[file_name] = {'id': file_id, 'md5Checksum': checksums[file_name]}
+        self._created_folder_ids.discard(parent_id)
+        logger.info(f"Uploaded {len(tasks)} and skipped {len(files) - len(tasks)} unchanged files of folder {parent_id}.")
+        return {"folder_id": parent_id, "files": synced_files}
+
+    def _recreate_deleted_folder(self, error: HttpError, parent_id: str) -> str:
+        """
+        Create a job folder again after a request failed because it was deleted from Drive,
+        re-raising the error if it has another cause.
+        """
+        folder_name = next((name for name, folder_id in self._folder_index.items() if folder_id == parent_id), None)
+        if int(error.resp.status) != 404 or folder_name is None:
+            raise error
+        logger.warning(f"Folder {folder_name} no longer exists in Google Drive, creating it again.")
+        with self._folder_lock:
+            if self._folder_index.get(folder_name) == parent_id:
+                del self._folder_index[folder_name]
+        return self.get_folder(folder_name, self.job_root_folder_id)
+
+    def _run_on_upload_pool(self, tasks: List[Callable[[], str]]) -> List[str]:
+        """
+        Run upload tasks on the upload pool and return their results, in order.
+        Waits for every task, so the first failed task is raised once the others finished.
+        """
+        with self._upload_pool_lock:
+            if self._upload_pool is None:
+                self._upload_pool = ThreadPoolExecutor(max_workers=self._upload_concurrency, thread_name_prefix="drive-upload")
+            futures = [self._upload_pool.submit(task) for task in tasks]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for future in futures]
+
+    def execute(self, request):
+        """Execute a Drive API request, retrying rate limit, server and connection errors with backoff."""
+        def execute_request():
+            self._rate_limiter.acquire()
+            return request.execute()
+
+        return call_with_retries(
+            execute_request,
+            is_retryable=self._is_retryable_error,
+            max_retries=self.max_retries,
+            get_retry_after=self._get_retry_after,
+            on_retry=self._on_retry,
+        )
+
+    @staticmethod
+    def _is_rate_limit_error(error: Exception) -> bool:
+        """Drive answers rate limits with 429, or with 403 and a (user)RateLimitExceeded reason."""
+        if not isinstance(error, HttpError):
+            return False
+        status = int(error.resp.status)
+        return status == 429 or (status == 403 and b"ateLimitExceeded" in (error.content or b""))
+
+    @classmethod
+    def _is_retryable_error(cls, error: Exception) -> bool:
+        """Rate limit, server (5xx), timeout and connection errors are retried."""
+        if isinstance(error, HttpError):
+            return cls._is_rate_limit_error(error) or int(error.resp.status) >= 500
+        return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in (
+            "ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout",
+        )
+
+    @staticmethod
+    def _get_retry_after(error: Exception) -> Optional[float]:
+        """Returns the Retry-After of a Drive API error in seconds, if any."""
+        return parse_retry_after(error.resp) if isinstance(error, HttpError) else None
+
+    def _on_retry(self, error: Exception, delay: float) -> None:
+        """Holds back every upload worker when the Drive quota is hit."""
+        if self._is_rate_limit_error(error):
+            self._rate_limiter.pause(delay)
+
+    def close(self) -> None:
+        """Wait for the pending uploads and stop the upload workers."""
+        with self._upload_pool_lock:
+            if self._upload_pool is not None:
+                self._upload_pool.shutdown(wait=True)
+                self._upload_pool = None
+
+    @staticmethod
+    def _escape_query_value(value: str) -> str:
+        """Escape a string for a single quoted value of a Drive query."""
+        return value.replace("\\", "\\\\").replace("'", "\\'")
+
+    def _load_folder_index(self) -> None:
+        """
+        Load the persisted folder index of the root folder, or list every child folder of the root folder
+        once, page by page, if the index was not persisted for this root folder yet.
+        """
+        if self.folder_index_path and os.path.isfile(self.folder_index_path):
+            with open(self.folder_index_path, "r", encoding="utf-8") as file:
+                persisted_index = json.load(file)
+            if persisted_index.get("root_folder_id") == self.job_root_folder_id:
+                self._folder_index = persisted_index["folders"]
+                logger.info(f"Loaded the IDs of {len(self._folder_index)} job folders from {self.folder_index_path}.")
+                return
+
+        query = f"'{self.job_root_folder_id}' in parents and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+        page_token = None
+        api_calls = 0
+        while True:
+            response = self.execute(self.service.files().list(
+                q=query, spaces='drive', fields='nextPageToken, files(id, name)', pageSize=1000, pageToken=page_token,
+            ))
+            api_calls += 1
+            for folder in response.get('files', []):
+                # Keep the first folder of a name, like the name query of get_folder
+                self._folder_index.setdefault(folder['name'], folder['id'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        self._folder_index_listed = True
+        logger.info(f"Listed {len(self._folder_index)} job folders in {api_calls} API calls.")
+        self._save_folder_index()
+
+    def _save_folder_index(self) -> None:
+        """Persist the folder index, replacing the previous file at once."""
+        if not self.folder_index_path:
+            return
+        index_folder = os.path.dirname(self.folder_index_path)
+        if index_folder:
+            os.makedirs(index_folder, exist_ok=True)
+        temporary_path = f"{self.folder_index_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump({"root_folder_id": self.job_root_folder_id, "folders": self._folder_index}, file, ensure_ascii=False)
+        os.replace(temporary_path, self.folder_index_path)
+
     def get_folder(self, folder_name: str, parent_id: Optional[str] = None) -> Optional[str]:
-        """Get the ID of a folder, creating it if it doesn't exist."""
-        # Formulate the query based on whether a parent ID is provided
-        if parent_id:
-            query = f"name='{folder_name}' and '{parent_id}' in parents and mimeType='application/vnd.google-apps.folder'"
-        else:
-            query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder'"
-
-        # Execute the query
-        response = self.service.files().list(q=query, spaces='drive', fields='files(id)').execute()
-
-        # Check if the folder exists
-        folders = response.get('files', [])
-        if folders:
-            # Return the ID of the existing folder
-            return folders[0].get('id')
-        else:
-            # Create the folder if it doesn't exist and return its ID
-            return self.create_folder(folder_name, parent_id)
+        """
+        Get the ID of a folder, creating it if it doesn't exist.
+        Child folders of the root folder are looked up in the folder index first.
+        """
+        indexed = parent_id is not None and parent_id == self.job_root_folder_id
+        if indexed and folder_name in self._folder_index:
+            return self._folder_index[folder_name]
+
+        with self._folder_lock:
+            # Another job may have created the folder while this one waited
+            if indexed and folder_name in self._folder_index:
+                return self._folder_index[folder_name]
+
+            # Formulate the query based on whether a parent ID is provided
+            name = self._escape_query_value(folder_name)
+            if parent_id:
+                query = f"name='{name}' and '{parent_id}' in parents and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+            else:
+                query = f"name='{name}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+
+            # Execute the query, unless the listing of the root folder already tells the folder does not exist
+            if indexed and self._folder_index_listed:
+                response = {}
+            else:
+                response = self.execute(self.service.files().list(q=query, spaces='drive', fields='files(id)'))
+
+            # Check if the folder exists
+            folders = response.get('files', [])
+            if folders:
+                # Return the ID of the existing folder
+                folder_id = folders[0].get('id')
+            else:
+                # Create the folder if it doesn't exist and return its ID
+                folder_id = self.create_folder(folder_name, parent_id)
+
+            if indexed:
+                self._folder_index[folder_name] = folder_id
+                self._save_folder_index()
+            return folder_id
 
     def create_folder(self, folder_name: str, parent_id: Optional[str] = None) -> str:
         """Create a new folder."""
         # Create the folder
         file_metadata = {
             'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
+            'mimeType': FOLDER_MIME_TYPE
         }
         if parent_id:
             file_metadata['parents'] = [parent_id]
-        file = self.service.files().create(body=file_metadata, fields='id').execute()
+        file = self.execute(self.service.files().create(body=file_metadata, fields='id'))
+        self._created_folder_ids.add(file.get('id'))
 
         # Return the ID of the created folder
         return file.get('id')
-
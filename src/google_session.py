@@ -0,0 +1,170 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httplib2
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+class _ConnectionCounter:
+    """Thread-safe count of the requests sent and the connections opened for them."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def add(self, requests_sent: int = 0, connections_opened: int = 0) -> None:
+        with self._lock:
+            self.requests += requests_sent
+            self.connections += connections_opened
+
+
+def _counting_pool(pool_class, counter: _ConnectionCounter):
+    """Subclass a urllib3 connection pool to count the connections (and TLS handshakes) it opens."""
+    class CountingConnectionPool(pool_class):
+        def _new_conn(self):
+            counter.add(connections_opened=1)
+            return super()._new_conn()
+    return CountingConnectionPool
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose keep-alive pools count the connections they open."""
+
+    def __init__(self, counter: _ConnectionCounter, **kwargs):
+        self._counter = counter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self._counter),
+            "https": _counting_pool(HTTPSConnectionPool, self._counter),
+        }
+
+
+class _RefreshingAuthorizedSession(AuthorizedSession):
+    """AuthorizedSession that refreshes the token ahead of its expiry, once for all threads."""
+
+    def __init__(self, credentials, counter: _ConnectionCounter, refresh_margin: timedelta, **kwargs):
+        super().__init__(credentials, **kwargs)
+        self._counter = counter
+        self._refresh_margin = refresh_margin
+        self._refresh_lock = threading.Lock()
+
+    def _is_expiring(self) -> bool:
+        # Credentials expiries are naive UTC datetimes
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return self.credentials.token is None or self.credentials.expiry is None or self.credentials.expiry - now <= self._refresh_margin
+
+    def _refresh_if_expiring(self) -> None:
+        if not self._is_expiring():
+            return
+        with self._refresh_lock:
+            # Another thread may have refreshed the token while this one waited
+            if self._is_expiring():
+                # The internal auth request has its own session, refreshing through self would recurse
+                self.credentials.refresh(self._auth_request)
+                logger.info(f"Refreshed the Google API token, valid until {self.credentials.expiry}.")
+
+    def request(self, method, url, *args, **kwargs):
+        self._refresh_if_expiring()
+        self._counter.add(requests_sent=1)
+        return super().request(method, url, *args, **kwargs)
+
+
+class _RequestsHttp:
+    """
+    httplib2.Http look-alike sending the requests of googleapiclient through a requests session,
+    so the Drive client shares the keep-alive connection pool of the Sheets client.
+    """
+
+    def __init__(self, session: requests.Session, timeout: Optional[float] = 120):
+        self.session = session
+        self.timeout = timeout
+        self.redirect_codes = set()
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+        info = {"status": str(response.status_code)}
+        info.update({key.lower(): value for key, value in response.headers.items()})
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+        return http_response, response.content
+
+
+class GoogleSession:
+    """
+    One set of service-account credentials and one pooled keep-alive HTTP session shared by the Google clients.
+
+    The credentials file is loaded once, the token is refreshed ahead of its expiry, and the Drive client is
+    built from the discovery document bundled with googleapiclient instead of fetching it.
+    """
+
+    def __init__(
+        self,
+        credentials_file_path: str,
+        scopes: Optional[List[str]] = None,
+        pool_maxsize: int = 16,
+        refresh_margin_seconds: float = 300,
+    ):
+        """
+        Args:
+            credentials_file_path (str): Path to the service account credentials file.
+            scopes (Optional[List[str]]): OAuth scopes. Defaults to Google Sheets and Google Drive.
+            pool_maxsize (int): Maximum number of kept-alive connections per host, at least the number of worker threads.
+            refresh_margin_seconds (float): Refresh the token when it expires within this many seconds.
+        """
+        if not credentials_file_path.endswith(".json"):
+            raise ValueError("Credentials file path must be a .json file.")
+        if not Path(credentials_file_path).is_file():
+            raise FileNotFoundError("Credentials file not found. Path provided: " + credentials_file_path)
+
+        self.credentials = service_account.Credentials.from_service_account_file(
+            credentials_file_path, scopes=scopes or SCOPES
+        )
+        self._counter = _ConnectionCounter()
+        self.http_session = _RefreshingAuthorizedSession(
+            self.credentials, self._counter, timedelta(seconds=refresh_margin_seconds)
+        )
+        adapter = _CountingHTTPAdapter(self._counter, pool_connections=4, pool_maxsize=pool_maxsize)
+        self.http_session.mount("https://", adapter)
+        self.http_session.mount("http://", adapter)
+
+    def gspread_client(self):
+        """Build a gspread client on the shared session."""
+        import gspread
+        return gspread.Client(auth=self.credentials, session=self.http_session)
+
+    def drive_service(self):
+        """Build a Google Drive v3 client on the shared session, from the bundled discovery document."""
+        from googleapiclient.discovery import build
+        return build("drive", "v3", http=_RequestsHttp(self.http_session), cache_discovery=False, static_discovery=True)
+
+    @property
+    def connection_stats(self) -> Dict[str, int]:
+        """Requests sent, connections opened and TLS handshakes saved by reusing connections."""
+        return {
+            "requests": self._counter.requests,
+            "connections": self._counter.connections,
+            "handshakes_saved": max(0, self._counter.requests - self._counter.connections),
+        }
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.http_session.close()
@@ -1,23 +1,58 @@
+import json
+import logging
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 import gspread
 import pandas as pd
 from gspread.exceptions import SpreadsheetNotFound
+from gspread.utils import rowcol_to_a1
+
+from src.sheet_mirror import SheetMirror
+
+if TYPE_CHECKING:
+    from src.google_session import GoogleSession
+
+# Setting up logger
+logger = logging.getLogger(__name__)
 
 
 class GoogleSheetsHandler:
-    def __init__(self, credentials_file_path: str):
+    def __init__(
+        self,
+        credentials_file_path: str,
+        client: Optional[gspread.Client] = None,
+        mirror: Optional[SheetMirror] = None,
+        session: Optional["GoogleSession"] = None,
+    ):
         """
         Initialize GoogleSheets object and establish connection with Google Sheets.
         Parameters
         ----------
         credentials_file_path : str
             Path to the credentials file for Google API.
-        gsheet_name : str
-            Name of the Google Sheet to read jobs from.
+        client : Optional[gspread.Client]
+            Already connected client to use instead of the service account, e.g. an offline stand-in.
+        mirror : Optional[SheetMirror]
+            Local mirror of the sheets, to skip downloading a sheet that did not change since the last run.
+        session : Optional[GoogleSession]
+            Credentials and keep-alive HTTP session shared with the Google Drive client, refreshing its own token.
         """
         
+        # Header, partial flag and cells of each sheet as last read or written, to only write back changed cells
+        self.snapshots: Dict[str, Dict[str, Any]] = {}
+        self.mirror = mirror
+
+        if client is not None:
+            self.credentials_file = None
+            self.gc = client
+            return
+
+        if session is not None:
+            self.credentials_file = None
+            self.gc = session.gspread_client()
+            return
+
         if not credentials_file_path.endswith(".json"):
             raise ValueError("Credentials file path must be a .json file.")
         
@@ -38,28 +73,349 @@ class GoogleSheetsHandler:
             raise ValueError(f"Google Sheet with name '{gsheet_name}' not found.")
         except Exception as e:
             raise ValueError(f"Error while getting Google Sheet: {str(e)}")
-        
+
+    def get_modified_time(self, gsheet_name: str) -> str:
+        """
+        Get the Drive modifiedTime of a Google Sheet with a single metadata call.
+        Parameters
+        ----------
+        gsheet_name : str
+            Name of the Google Sheet.
+        """
+        files = self.gc.list_spreadsheet_files(gsheet_name)
+        if not files:
+            raise ValueError(f"Google Sheet with name '{gsheet_name}' not found.")
+        return files[0]["modifiedTime"]
+
+    def _load_mirror(self, gsheet_name: str) -> tuple:
+        """Get the current modifiedTime of the sheet and its mirrored snapshot, if any."""
+        if self.mirror is None:
+            return None, None
+        return self.get_modified_time(gsheet_name), self.mirror.load(gsheet_name)
+
+    def _save_mirror(self, gsheet_name: str, modified_time: Optional[str]) -> None:
+        """Mirror the snapshot of the sheet as current for the given modifiedTime."""
+        if self.mirror is not None and modified_time is not None:
+            self.mirror.save(gsheet_name, modified_time, self.snapshots[gsheet_name])
+
+    def get_dataframe_from_gsheet(self, gsheet_name: str) -> pd.DataFrame:
+        """
+        Read the first worksheet of a Google Sheet into a dataframe and remember it as the snapshot
+        the next update_gsheet_from_dataframe is diffed against.
+        With a mirror, an unchanged sheet is loaded from the mirror. A changed sheet is read in full, since
+        rows inserted, removed or edited in any column cannot be told apart without reading them.
+        Parameters
+        ----------
+        gsheet_name : str
+            Name of the Google Sheet.
+        """
+        modified_time, mirrored = self._load_mirror(gsheet_name)
+        if mirrored is not None and not mirrored["partial"] and mirrored["modified_time"] == modified_time:
+            dataframe = self._from_cells(mirrored["cells"], mirrored["header"])
+            # The mirrored cells already are the snapshot of the sheet
+            self.snapshots[gsheet_name] = {"header": mirrored["header"], "cells": mirrored["cells"], "partial": False}
+            logger.info(f"Google Sheet '{gsheet_name}' is unchanged, loaded {len(dataframe)} rows from the mirror.")
+            return dataframe
+
+        gsheet = self.get_gsheet(gsheet_name)
+        dataframe = pd.DataFrame(gsheet.sheet1.get_all_records())
+
+        self._remember_snapshot(gsheet_name, dataframe.columns.tolist(), dataframe, partial=False)
+        self._save_mirror(gsheet_name, modified_time)
+        return dataframe
+
+    def get_pending_dataframe_from_gsheet(
+        self,
+        gsheet_name: str,
+        statuses: List[str],
+        columns: List[str],
+        status_column: str = "Status",
+        ranges_per_call: int = 200,
+    ) -> pd.DataFrame:
+        """
+        Read only the rows whose status needs work, and only the given columns, into a dataframe.
+        The header and the status column are read first, then the pending rows in batched range reads.
+        The rest of the sheet is left untouched by the next update_gsheet_from_dataframe.
+        With a mirror, an unchanged sheet is loaded from the mirror instead. Dataframe row i is still sheet row i + 2.
+        Parameters
+        ----------
+        gsheet_name : str
+            Name of the Google Sheet.
+        statuses : List[str]
+            Statuses of the rows to read.
+        columns : List[str]
+            Columns to read, columns missing from the sheet are skipped.
+        status_column : str
+            Name of the status column.
+        ranges_per_call : int
+            Maximum number of ranges per batch read.
+        """
+        modified_time, mirrored = self._load_mirror(gsheet_name)
+        if mirrored is not None and mirrored["modified_time"] == modified_time:
+            header = mirrored["header"]
+            projected_columns = [column for column in header if column in set(columns) | {status_column}]
+            mirrored_columns = set.intersection(*(set(cells) for cells in mirrored["cells"].values())) if mirrored["cells"] else set()
+            # A partial mirror only holds the rows pending at the time, which are the only candidates while the sheet is unchanged
+            if not mirrored["cells"] or set(projected_columns) <= mirrored_columns:
+                pending_cells = {
+                    index: cells for index, cells in mirrored["cells"].items() if cells.get(status_column) in statuses
+                }
+                dataframe = self._from_cells(pending_cells, projected_columns)
+                self._remember_snapshot(gsheet_name, header, dataframe, partial=True)
+                logger.info(f"Google Sheet '{gsheet_name}' is unchanged, loaded {len(dataframe)} pending rows from the mirror.")
+                return dataframe
+
+        worksheet = self.get_gsheet(gsheet_name).sheet1
+        header = worksheet.row_values(1)
+        if status_column not in header:
+            raise ValueError(f"Google Sheet '{gsheet_name}' has no '{status_column}' column.")
+
+        status_values = worksheet.col_values(header.index(status_column) + 1)
+        pending_rows = [
+            row_number for row_number, status in enumerate(status_values[1:], start=2) if status in statuses
+        ]
+        positions = sorted(header.index(column) for column in set(columns) | {status_column} if column in header)
+        projected_columns = [header[position] for position in positions]
+
+        records, api_calls = self._read_rows(worksheet, header, pending_rows, positions, ranges_per_call)
+        dataframe = self._from_cells({row_number - 2: record for row_number, record in records.items()}, projected_columns)
+        self._remember_snapshot(gsheet_name, header, dataframe, partial=True)
+        self._save_mirror(gsheet_name, modified_time)
+        logger.info(
+            f"Read {len(dataframe)} pending of {len(status_values) - 1} rows and {len(projected_columns)} of "
+            f"{len(header)} columns of Google Sheet '{gsheet_name}' in {api_calls + 3} API calls."
+        )
+        return dataframe
+
+    def _read_rows(
+        self,
+        worksheet: gspread.Worksheet,
+        header: List[str],
+        row_numbers: List[int],
+        positions: List[int],
+        ranges_per_call: int = 200,
+    ) -> tuple:
+        """
+        Read the given sheet rows and column positions in batched range reads.
+        Consecutive rows and consecutive columns are read as one range.
+        Returns the cells of each row keyed by sheet row number, and the number of API calls.
+        """
+        ranges = [
+            (first_row, last_row, first_position, last_position)
+            for first_row, last_row in self._runs(row_numbers)
+            for first_position, last_position in self._runs(positions)
+        ]
+        records = {row_number: {} for row_number in row_numbers}
+        api_calls = 0
+        for start in range(0, len(ranges), ranges_per_call):
+            chunk = ranges[start:start + ranges_per_call]
+            value_ranges = worksheet.batch_get([
+                f"{rowcol_to_a1(first_row, first_position + 1)}:{rowcol_to_a1(last_row, last_position + 1)}"
+                for first_row, last_row, first_position, last_position in chunk
+            ])
+            api_calls += 1
+            for (first_row, last_row, first_position, last_position), values in zip(chunk, value_ranges):
+                for row_offset, row_number in enumerate(range(first_row, last_row + 1)):
+                    # Trailing empty cells are not returned
+                    row_values = values[row_offset] if row_offset < len(values) else []
+                    for col_offset, position in enumerate(range(first_position, last_position + 1)):
+                        records[row_number][header[position]] = row_values[col_offset] if col_offset < len(row_values) else ""
+        return records, api_calls
+
+    @staticmethod
+    def _from_cells(cells: Dict[int, Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+        """Build a dataframe from the cells of each row keyed by dataframe index."""
+        dataframe = pd.DataFrame.from_dict(cells, orient="index", columns=columns)
+        return dataframe.sort_index() if len(dataframe) else pd.DataFrame(columns=columns)
+
+    @staticmethod
+    def _runs(numbers: List[int]) -> List[tuple]:
+        """Group sorted numbers into (first, last) runs of consecutive numbers."""
+        runs = []
+        for number in numbers:
+            if runs and number == runs[-1][1] + 1:
+                runs[-1] = (runs[-1][0], number)
+            else:
+                runs.append((number, number))
+        return runs
+
+    @staticmethod
+    def _to_values(dataframe: pd.DataFrame) -> List[List[Any]]:
+        """Convert a dataframe to sheet values, header row first. Missing values are empty cells."""
+        cells = dataframe.astype(object).where(dataframe.notna(), "")
+        return [dataframe.columns.values.tolist()] + cells.values.tolist()
+
+    def _remember_snapshot(self, gsheet_name: str, header: List[str], dataframe: pd.DataFrame, partial: bool) -> None:
+        """
+        Remember the sheet header and the cell values of the dataframe, keyed by dataframe index.
+        A partial snapshot only holds some rows and columns of the sheet.
+        """
+        self.snapshots[gsheet_name] = {
+            "header": list(header),
+            "cells": {
+                index: dict(zip(dataframe.columns, row))
+                for index, row in zip(dataframe.index, self._to_values(dataframe)[1:])
+            },
+            "partial": partial,
+        }
+
+    @staticmethod
+    def _diff(snapshot: Dict[str, Any], dataframe: pd.DataFrame, values: List[List[Any]]) -> List[Dict[str, Any]]:
+        """
+        Compute the ranges of the cells of the dataframe that changed since the snapshot.
+        Each run of consecutive changed cells of a row becomes one range. Dataframe row i is sheet row i + 2.
+        """
+        header = snapshot["header"]
+        columns = sorted(dataframe.columns, key=header.index)
+        ranges = []
+        for index, row in zip(dataframe.index, values[1:]):
+            row_cells = dict(zip(dataframe.columns, row))
+            previous_cells = snapshot["cells"].get(index, {})
+            changed_positions = [
+                header.index(column) for column in columns
+                if column not in previous_cells or previous_cells[column] != row_cells[column]
+            ]
+            for first_position, last_position in GoogleSheetsHandler._runs(changed_positions):
+                ranges.append({
+                    "range": rowcol_to_a1(index + 2, first_position + 1),
+                    "values": [[row_cells[header[position]] for position in range(first_position, last_position + 1)]],
+                })
+        return ranges
+
+    def _write_gsheet(self, dataframe: pd.DataFrame, gsheet_name: str) -> None:
+        """Write the dataframe to the sheet, only the changed cells when a snapshot with the same columns exists."""
+        gsheet = self.get_gsheet(gsheet_name)
+        snapshot = self.snapshots.get(gsheet_name)
+        values = self._to_values(dataframe)
+        api_calls = 1
+
+        if snapshot is not None and snapshot["partial"]:
+            # Only some rows and columns were read, so the sheet can only be updated cell by cell
+            missing_columns = [column for column in dataframe.columns if column not in snapshot["header"]]
+            if missing_columns:
+                raise ValueError(f"Columns {missing_columns} are not in Google Sheet '{gsheet_name}'.")
+            # A row that was not read could overwrite a row of the sheet that is not in the dataframe
+            unread_rows = [index for index in dataframe.index if index not in snapshot["cells"]]
+            if unread_rows:
+                raise ValueError(f"Rows {unread_rows} were not read from Google Sheet '{gsheet_name}'.")
+            rewrite = False
+        else:
+            # Changed columns or removed rows cannot be expressed as cell updates
+            rewrite = (
+                snapshot is None
+                or snapshot["header"] != values[0]
+                or len(dataframe) < len(snapshot["cells"])
+                or list(dataframe.index) != list(range(len(dataframe)))
+            )
+
+        ranges = []
+        if rewrite:
+            gsheet.sheet1.clear()
+            gsheet.sheet1.update(values)
+            api_calls += 2
+            bytes_sent = len(json.dumps(values, default=str))
+            logger.info(f"Rewrote Google Sheet '{gsheet_name}' ({len(values) - 1} rows): {bytes_sent} bytes in {api_calls} API calls.")
+        else:
+            ranges = self._diff(snapshot, dataframe, values)
+            bytes_sent = 0
+            if ranges:
+                gsheet.sheet1.batch_update(ranges)
+                api_calls += 1
+                bytes_sent = len(json.dumps(ranges, default=str))
+            logger.info(f"Updated {len(ranges)} changed ranges of Google Sheet '{gsheet_name}': {bytes_sent} bytes in {api_calls} API calls.")
+
+        header = snapshot["header"] if snapshot is not None and snapshot["partial"] else values[0]
+        self._remember_snapshot(gsheet_name, header, dataframe, partial=snapshot is not None and snapshot["partial"])
+        # Our own write changes the modifiedTime, and a later metadata call could not tell it apart from
+        # an edit made by the user in between, so the next read downloads the sheet again
+        if self.mirror is not None and (rewrite or ranges):
+            self.mirror.invalidate(gsheet_name)
+
     def update_gsheet_from_dataframe(self, dataframe: pd.DataFrame, gsheet_name: str):
         """
-        Update Google Sheet with the given dataframe
+        Update Google Sheet with the given dataframe.
+        If the sheet was read with get_dataframe_from_gsheet (or written before) and its columns did not change,
+        only the changed cells are sent in one batch update. A dataframe read with get_pending_dataframe_from_gsheet
+        is always written cell by cell, leaving the other rows and columns untouched. Dataframe row i is sheet row i + 2.
         Parameters
         ----------
         dataframe : pd.DataFrame
             Dataframe to update Google Sheet with.
         """
         try:
-            gsheet = self.get_gsheet(gsheet_name)
-            gsheet.sheet1.clear()
-            gsheet.sheet1.update([dataframe.columns.values.tolist()] + dataframe.values.tolist())
+            self._write_gsheet(dataframe, gsheet_name)
         except Exception as initial_exception:
             try:
-                # Re-authenticate with the Google Sheets API
-                self.gc = gspread.service_account(filename=self.credentials_file)
-                # Attempt to get the Google Sheet and update it again
-                gsheet = self.get_gsheet(gsheet_name)
-                gsheet.sheet1.clear()
-                gsheet.sheet1.update([dataframe.columns.values.tolist()] + dataframe.values.tolist())
+                # Re-authenticate with the Google Sheets API, a shared session refreshes its token itself
+                if self.credentials_file is not None:
+                    self.gc = gspread.service_account(filename=self.credentials_file)
+                # The failed write may have been partially applied, so write every cell again
+                snapshot = self.snapshots.get(gsheet_name)
+                if snapshot is not None and snapshot["partial"]:
+                    snapshot["cells"] = {index: {} for index in snapshot["cells"]}
+                else:
+                    self.snapshots.pop(gsheet_name, None)
+                self._write_gsheet(dataframe, gsheet_name)
             except Exception as retry_exception:
                 raise ValueError(f"Error while updating Google Sheet after retry: {str(retry_exception)}") from initial_exception
-            
-            
\ No newline at end of file
+
+    def append_to_worksheets(self, gsheet_name: str, dataframes: Dict[str, pd.DataFrame]) -> None:
+        """
+        Append dataframes to other worksheets of a Google Sheet, e.g. archive worksheets, creating the missing ones.
+        Columns a worksheet does not have yet are added after its last column.
+        Parameters
+        ----------
+        gsheet_name : str
+            Name of the Google Sheet.
+        dataframes : Dict[str, pd.DataFrame]
+            Rows to append, keyed by worksheet title.
+        """
+        gsheet = self.get_gsheet(gsheet_name)
+        worksheets = {worksheet.title: worksheet for worksheet in gsheet.worksheets()}
+        api_calls = 2
+        for title, dataframe in dataframes.items():
+            worksheet = worksheets.get(title)
+            if worksheet is None:
+                values = self._to_values(dataframe)
+                worksheet = gsheet.add_worksheet(title, rows=len(values), cols=len(values[0]))
+                api_calls += 1
+            else:
+                header = worksheet.row_values(1)
+                api_calls += 1
+                new_columns = [column for column in dataframe.columns if column not in header]
+                if new_columns:
+                    if len(header) + len(new_columns) > worksheet.col_count:
+                        worksheet.add_cols(len(header) + len(new_columns) - worksheet.col_count)
+                        api_calls += 1
+                    worksheet.update([new_columns], rowcol_to_a1(1, len(header) + 1))
+                    api_calls += 1
+                    header += new_columns
+                values = self._to_values(dataframe.reindex(columns=header))[1:]
+            worksheet.append_rows(values)
+            api_calls += 1
+        logger.info(
+            f"Appended {sum(len(dataframe) for dataframe in dataframes.values())} rows to {len(dataframes)} worksheets "
+            f"of Google Sheet '{gsheet_name}' in {api_calls} API calls."
+        )
+
+    def get_archived_values(self, gsheet_name: str, column: str, title_prefix: str) -> set:
+        """
+        Get the values of a column across the worksheets of a Google Sheet whose title starts with title_prefix,
+        reading only that column of each worksheet.
+        Parameters
+        ----------
+        gsheet_name : str
+            Name of the Google Sheet.
+        column : str
+            Name of the column.
+        title_prefix : str
+            Title prefix of the archive worksheets.
+        """
+        values = set()
+        for worksheet in self.get_gsheet(gsheet_name).worksheets():
+            if not worksheet.title.startswith(title_prefix):
+                continue
+            header = worksheet.row_values(1)
+            if column in header:
+                values.update(worksheet.col_values(header.index(column) + 1)[1:])
+        return values
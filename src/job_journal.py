@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+import pandas as pd
+
+from src.utils import get_job_key
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+
+class JobJournal:
+    """
+    Crash-safe, append-only journal of the per-row outputs of the pipeline.
+
+    Every row is journaled as soon as one of its stages finishes, before the Google Sheet is updated.
+    Entries are checkpointed once the sheet reflects them; entries left by a crashed run are replayed
+    on the next start, so finished work is never recomputed (and no email is sent twice).
+    """
+
+    def __init__(self, journal_path: str):
+        """
+        Open (or create) the journal database.
+
+        Args:
+            journal_path (str): Path to the SQLite journal file.
+        """
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+
+        journal_folder = os.path.dirname(journal_path)
+        if journal_folder:
+            os.makedirs(journal_folder, exist_ok=True)
+
+        self._connection = sqlite3.connect(journal_path, check_same_thread=False)
+        # WAL commits survive a crash of the process and do not block readers
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_key TEXT NOT NULL,
+                outputs TEXT NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(job: pd.Series) -> str:
+        """
+        Create the journal key of a row: the job posting and its contact, as near-duplicate postings share the posting key.
+
+        Args:
+            job (pd.Series): Job row.
+
+        Returns:
+            str: Journal key.
+        """
+        contact = "\x1f".join(str(job.get(column, "")) for column in ("Email", "LinkedIn Contact"))
+        return f"{get_job_key(job)}:{hashlib.sha1(contact.encode('utf-8')).hexdigest()}"
+
+    def record(self, job: pd.Series, columns: Iterable[str]) -> int:
+        """
+        Journal the given columns of a row, committed before returning.
+
+        Args:
+            job (pd.Series): Job row holding the outputs of the finished stage.
+            columns (Iterable[str]): Columns written by the stage.
+
+        Returns:
+            int: ID of the entry, to checkpoint it once the row is written to the sheet.
+        """
+        outputs = {column: job[column] for column in columns if column in job.index}
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO journal (job_key, outputs, recorded_at) VALUES (?, ?, ?)",
+                (self.make_key(job), json.dumps(outputs, ensure_ascii=False, default=str), time.time()),
+            )
+            return cursor.lastrowid
+
+    def last_entry_id(self) -> int:
+        """
+        Get the ID of the latest entry, to checkpoint up to it once the sheet is updated.
+
+        Returns:
+            int: ID of the latest entry, 0 if the journal is empty.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(MAX(id), 0) FROM journal").fetchone()[0]
+
+    def checkpoint(self, up_to_id: int) -> None:
+        """
+        Drop the entries the Google Sheet reflects.
+
+        Args:
+            up_to_id (int): ID of the latest entry written to the sheet.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM journal WHERE id <= ?", (up_to_id,))
+
+    def checkpoint_entries(self, entry_ids: Iterable[int]) -> None:
+        """
+        Drop the given entries once the Google Sheet reflects them, while other rows may still be journaled.
+
+        Args:
+            entry_ids (Iterable[int]): IDs of the entries of the rows written to the sheet.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM journal WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+
+    def replay(self, jobs_df: pd.DataFrame) -> int:
+        """
+        Apply the entries of earlier runs that did not reach the sheet to the matching rows, in journal order.
+
+        Args:
+            jobs_df (pd.DataFrame): Jobs read from the Google Sheet, updated in place.
+
+        Returns:
+            int: Number of rows updated.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT job_key, outputs FROM journal ORDER BY id").fetchall()
+        if not entries or jobs_df.empty:
+            return 0
+
+        indices_by_key = {}
+        for index, job in jobs_df.iterrows():
+            indices_by_key.setdefault(self.make_key(job), []).append(index)
+
+        replayed_indices = set()
+        for job_key, outputs in entries:
+            for index in indices_by_key.get(job_key, []):
+                for column, value in json.loads(outputs).items():
+                    if column in jobs_df.columns:
+                        jobs_df.at[index, column] = value
+                replayed_indices.add(index)
+
+        logger.info(f"Replayed {len(entries)} journal entries onto {len(replayed_indices)} rows.")
+        return len(replayed_indices)
+
+    def close(self) -> None:
+        """Close the journal database."""
+        with self._lock:
+            self._connection.close()
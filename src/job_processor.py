@@ -1,17 +1,53 @@
 import logging
+import os
 import time
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, List, Optional
 
 import pandas as pd
 from tqdm import tqdm
 
-from src.google_drive_handler import GoogleDriveHandler
-from src.google_sheets_handler import GoogleSheetsHandler
-from src.linkedin_handler import LinkedInConnectorClass
-from src.LLM_handler import LLMConnectorClass
-from src.utils import create_job_folder, get_file_content
+from src.artifact_pipeline import (ArtifactMemoryBudget, DocumentRenderPool,
+                                   LocalCopyWriter)
+from src.description_compactor import DescriptionCompactor
+from src.duplicate_detector import (NearDuplicateDetector,
+                                    adapt_generated_content,
+                                    can_adapt_generated_content)
+from src.job_journal import JobJournal
+from src.llm_cache import LLMResponseCache
+from src.utils import (OPTIONAL_ARGUMENTS, create_job_folder, get_file_content,
+                       get_job_key)
+
+# The handlers pull in gspread, googleapiclient, langchain and selenium,
+# they are imported on the code paths that use them to keep startup fast
+if TYPE_CHECKING:
+    from src.google_drive_handler import GoogleDriveHandler
+    from src.google_session import GoogleSession
+    from src.google_sheets_handler import GoogleSheetsHandler
+    from src.linkedin_handler import LinkedInConnectorClass
+    from src.llm_handler import LLMConnectorClass
 
 tqdm.pandas()
 logger = logging.getLogger(__name__)
+
+# Statuses of the rows a run acts on, and the columns its stages read or write
+PENDING_STATUSES = ["New Job", "Content Generated", "Missing Contact", "Messages Queued"]
+PIPELINE_COLUMNS = [
+    "Company Name", "Position", "Description", "Contact Name", "Email", "LinkedIn Contact", "Status",
+    "Cover Letter", "Resume", "Missing Keywords", "Message Content", "Message Subject", "LinkedIn Note",
+    "Status Updated",
+]
+# Columns written on a status change, "Status Updated" holds the date of the change when the sheet has it
+STATUS_COLUMNS = ["Status", "Status Updated"]
+# Statuses no stage acts on anymore, such rows are archived once their status is ARCHIVE_AFTER_DAYS old
+TERMINAL_STATUSES = ["Email Sent", "LinkedIn Connection Sent", "Duplicate of Archived Job"]
+ARCHIVE_WORKSHEET_PREFIX = "Archive "
+# Status of the rows whose messages wait in the outbox, with USE_OUTBOX
+QUEUED_STATUS = "Messages Queued"
+LINKEDIN_NOTE_TEMPLATE = "Hi [Contact Name], I am keen on an open {position} role at {company_name}. I'd appreciate the opportunity to connect and explore how my expertise aligns with this role."
+JOB_KEY_COLUMN = "Job Key"
+
 class JobProcessor:
     """
     JobProcessor class to process job applications.
@@ -19,25 +55,75 @@ class JobProcessor:
     def __init__(
         self,
         kwargs: dict,
+        gc: Optional["GoogleSheetsHandler"] = None,
+        google_drive_handler: Optional["GoogleDriveHandler"] = None,
+        llm_client=None,
     ):
         """
         Initialize JobProcessor class.
+        Already connected Google Sheets and Google Drive handlers and an LLM chat model can be passed in,
+        e.g. offline stand-ins for benchmarking.
         """
 
         self.jobs_df = pd.DataFrame()
+        self.job_journal: Optional[JobJournal] = None
+        # Optional arguments fall back to their defaults when not passed in
+        for key, value in OPTIONAL_ARGUMENTS.items():
+            setattr(self, key, value)
         for key, value in kwargs.items():
             setattr(self, key, value)
+        self.options = {**OPTIONAL_ARGUMENTS, **kwargs}
         logger.info("JobProcessor initialized.")
-        self.gc = GoogleSheetsHandler(self.GOOGLE_API_CREDENTIALS_FILE)
+        self.llm_client = llm_client
+
+        # The Google Sheets and Google Drive clients share one credentials object and keep-alive connection pool,
+        # sized for the worker threads of the content generation stage
+        self.google_session: Optional["GoogleSession"] = None
+        if gc is None or google_drive_handler is None:
+            from src.google_session import GoogleSession
+            self.google_session = GoogleSession(self.GOOGLE_API_CREDENTIALS_FILE, pool_maxsize=max(16, self.LLM_CONCURRENCY))
+
+        self.gc = gc
+        if self.gc is None:
+            from src.google_sheets_handler import GoogleSheetsHandler
+            from src.sheet_mirror import SheetMirror
+            sheet_mirror = SheetMirror(self.SHEET_MIRROR_PATH) if self.USE_SHEET_MIRROR else None
+            self.gc = GoogleSheetsHandler(self.GOOGLE_API_CREDENTIALS_FILE, mirror=sheet_mirror, session=self.google_session)
         logger.info("Google Sheets Sevice Account connected.")
 
         # Extract the destination folder name from the path
         destination_folder_name = self.DESTINATION_FOLDER.split("/")[-1]
 
-        self.google_drive_handler = GoogleDriveHandler(self.GOOGLE_API_CREDENTIALS_FILE, destination_folder_name)
+        self.google_drive_handler = google_drive_handler
+        if self.google_drive_handler is None:
+            from src.google_drive_handler import GoogleDriveHandler
+            self.google_drive_handler = GoogleDriveHandler(
+                self.GOOGLE_API_CREDENTIALS_FILE,
+                destination_folder_name,
+                session=self.google_session,
+                upload_concurrency=self.DRIVE_UPLOAD_CONCURRENCY,
+                folder_index_path=self.DRIVE_FOLDER_INDEX_PATH,
+            )
+
+        # Documents of the jobs in flight are held in memory until uploaded, local copies are optional in memory mode
+        # Until a job is rendered, its documents are estimated at about two copies of the resume template
+        resume_template_bytes = os.path.getsize(self.RESUME_PATH) if os.path.isfile(self.RESUME_PATH) else 0
+        self.artifact_memory_budget = ArtifactMemoryBudget(
+            int(self.ARTIFACT_MEMORY_LIMIT_MB * 2**20), initial_job_bytes=2 * resume_template_bytes
+        )
+        self.local_copy_writer = LocalCopyWriter() if self.IN_MEMORY_ARTIFACTS and self.WRITE_LOCAL_COPIES else None
+        # Rendering is CPU bound, with RENDER_PROCESSES it runs outside of the GIL of the worker threads
+        self.render_pool = DocumentRenderPool(self.RESUME_PATH, self.RENDER_PROCESSES) if self.RENDER_PROCESSES > 0 else None
+
+        # Messages are spooled to disk and sent by a drain, with USE_OUTBOX
+        self.outbox = None
+        if self.USE_OUTBOX:
+            from src.outbox import Outbox
+            self.outbox = Outbox(self.OUTBOX_PATH)
 
         if self.USE_LINKEDIN:
             logger.info("Logging into LinkedIn...")
+            from src.linkedin_handler import LinkedInConnectorClass
             self.linkedin_handler = LinkedInConnectorClass(self.CHROMEDRIVER_PATH, self.INTERACTIVE)
             self.linkedin_handler.login(self.LINKEDIN_USERNAME, self.LINKEDIN_PASSWORD)
         
@@ -50,6 +136,14 @@ class JobProcessor:
             logger.info("Processing jobs...")
             self.jobs_df = self.get_all_jobs()
 
+            if not self.NO_JOB_JOURNAL:
+                # Rows finished by an earlier run that crashed before updating the sheet are not processed again
+                self.job_journal = JobJournal(self.JOB_JOURNAL_PATH)
+                self.job_journal.replay(self.jobs_df)
+
+            if self.ARCHIVE_AFTER_DAYS > 0:
+                self.mark_archived_duplicates()
+
             # logger.info("Scrape linkedin job from linkedin url...")
             # self.scrape_linkedin_job()
 
@@ -57,27 +151,99 @@ class JobProcessor:
             self.generate_content_for_jobs()
 
             logger.info("Updating Google Sheet to reflect content generation status...")
-            self.gc.update_gsheet_from_dataframe(self.jobs_df, self.GOOGLE_SHEET_NAME)
+            self.update_gsheet_and_checkpoint()
 
             logger.info("Processing Content Generated jobs...")
             self.send_messages_for_content_generated_jobs()
 
             logger.info("Updating Google Sheet to reflect email and LinkedIn connection status...")
-            self.gc.update_gsheet_from_dataframe(self.jobs_df, self.GOOGLE_SHEET_NAME)
+            self.update_gsheet_and_checkpoint()
+
+            if self.ARCHIVE_AFTER_DAYS > 0:
+                logger.info("Archiving completed jobs...")
+                self.archive_completed_jobs()
             
             logger.info("Job processing complete.")
 
         except Exception as e:
             logger.error(f"Error while processing jobs: {str(e)}")
             raise e
+        finally:
+            if self.job_journal is not None:
+                self.job_journal.close()
+                self.job_journal = None
+            self.google_drive_handler.close()
+            if self.local_copy_writer is not None:
+                self.local_copy_writer.close()
+            if self.render_pool is not None:
+                self.render_pool.close()
+                render_stats = self.render_pool.stats
+                logger.info(
+                    f"Rendered the documents of {render_stats['jobs']} jobs in {self.RENDER_PROCESSES} processes: "
+                    f"{render_stats['payload_bytes'] / 1024:.0f} KiB sent, {render_stats['document_bytes'] / 1024:.0f} KiB received."
+                )
+            artifact_stats = self.artifact_memory_budget.stats
+            if artifact_stats["jobs"]:
+                logger.info(
+                    f"Documents of {artifact_stats['jobs']} jobs: peak {artifact_stats['peak_bytes'] / 1024:.0f} KiB in memory, "
+                    f"largest job {artifact_stats['largest_job_bytes'] / 1024:.0f} KiB, {artifact_stats['waits']} jobs waited for memory."
+                )
+            if self.google_session is not None:
+                stats = self.google_session.connection_stats
+                logger.info(
+                    f"Google API: {stats['requests']} requests over {stats['connections']} connections, "
+                    f"{stats['handshakes_saved']} TLS handshakes saved."
+                )
+
+    def update_gsheet_and_checkpoint(self, entry_ids: Optional[List[int]] = None):
+        """
+        Write the jobs DataFrame back to the Google Sheet, then drop the journal entries it now reflects.
+        Parameters:
+            - entry_ids (list): Journal entries of the rows merged into the DataFrame, while workers may still be
+              journaling other rows. By default no stage is running and every entry is dropped.
+        """
+        checkpoint_id = self.job_journal.last_entry_id() if self.job_journal is not None and entry_ids is None else 0
+        self.gc.update_gsheet_from_dataframe(self.jobs_df, self.GOOGLE_SHEET_NAME)
+        if self.job_journal is None:
+            return
+        if entry_ids is None:
+            self.job_journal.checkpoint(checkpoint_id)
+        else:
+            self.job_journal.checkpoint_entries(entry_ids)
+
+    @staticmethod
+    def set_status(job: pd.Series, status: str) -> None:
+        """
+        Set the status of a row, and the date of the change if the sheet has a "Status Updated" column.
+        """
+        job['Status'] = status
+        if 'Status Updated' in job.index:
+            job['Status Updated'] = date.today().isoformat()
+
+    def journal_job(self, job: pd.Series, columns) -> Optional[int]:
+        """
+        Journal the columns of a row written by a finished stage, if the journal is enabled.
+        Returns the ID of the journal entry, None if the journal is disabled.
+        """
+        if self.job_journal is not None:
+            return self.job_journal.record(job, columns)
+        return None
 
     def get_all_jobs(self) -> pd.DataFrame:
         """
         Get all jobs from the Google Sheet.
+        With READ_PENDING_ROWS_ONLY, only the rows with a pending status and the pipeline columns are read.
         """
-        gsheet = self.gc.get_gsheet(self.GOOGLE_SHEET_NAME)
-        jobs = pd.DataFrame(gsheet.sheet1.get_all_records())
+        if self.READ_PENDING_ROWS_ONLY:
+            jobs = self.gc.get_pending_dataframe_from_gsheet(self.GOOGLE_SHEET_NAME, PENDING_STATUSES, PIPELINE_COLUMNS)
+            logger.info(f"Found {len(jobs)} pending jobs in Google Sheet.")
+            return jobs
+
+        jobs = self.gc.get_dataframe_from_gsheet(self.GOOGLE_SHEET_NAME)
         logger.info(f"Found {len(jobs)} jobs in Google Sheet.")
+        if self.ARCHIVE_AFTER_DAYS > 0 and 'Status Updated' not in jobs.columns:
+            # Status changes are dated from now on, the column is added by the next write
+            jobs['Status Updated'] = ""
 
         # filter job with Applied field containing False
         # jobs = jobs[jobs['Applied'].str.contains('False', case=False)].copy()
@@ -89,7 +255,7 @@ class JobProcessor:
         """
         Scrape linkedin job from linkedin url
         """
-        def scrape_linkedin_job_wrapper(job: pd.Series, linkedin_handler: LinkedInConnectorClass) -> pd.Series:
+        def scrape_linkedin_job_wrapper(job: pd.Series, linkedin_handler: "LinkedInConnectorClass") -> pd.Series:
             try:
                 scrapped_job_content = linkedin_handler.scrape_job(job['link'])
                 for key, value in scrapped_job_content.items():
@@ -132,6 +298,10 @@ class JobProcessor:
             'api_key': self.LLM_API_KEY,
             # 'LLM_api_url': self.LLM_API_URL,
             'model_name': self.LLM_MODEL,
+            'requests_per_minute': self.LLM_REQUESTS_PER_MINUTE,
+            'tokens_per_minute': self.LLM_TOKENS_PER_MINUTE,
+            'max_retries': self.LLM_MAX_RETRIES,
+            'llm_client': self.llm_client,
         }
         prompt_args = {
             'resume_template': get_file_content(self.RESUME_PATH),
@@ -141,33 +311,229 @@ class JobProcessor:
             # 'linkedin_note_template': self.LINKEDIN_NOTE if self.USE_LINKEDIN else "",
         }
 
-        LLM_handler = LLMConnectorClass(llm_args, prompt_args, self.USE_GMAIL, self.USE_LINKEDIN)
+        llm_cache = None
+        if not self.NO_LLM_CACHE:
+            llm_cache = LLMResponseCache(
+                self.LLM_CACHE_PATH,
+                max_entries=self.LLM_CACHE_MAX_ENTRIES,
+                max_age_days=self.LLM_CACHE_MAX_AGE_DAYS,
+            )
 
-        def generate_custom_contents_wrapper(job: pd.Series, LLM_handler: LLMConnectorClass) -> pd.Series:
-            try:
-                generated_contents = LLM_handler.generate_custom_content(job)
-                
-                for key, value in generated_contents.items():
-                    job[key] = value
-                # job['Content Generated'] = 'True'
-                job['Status'] = 'Content Generated'
-                logger.info(f"Custom contents generated for job at Company Name {job['Company Name']}")
-
-                create_job_folder(
-                    job=job,
-                    resume_path=self.RESUME_PATH,
-                    google_drive_handler=self.google_drive_handler,
-                    destination=self.DESTINATION_FOLDER,
+        # The cache is always closed, also when no batch results are available yet or a job fails
+        try:
+            description_compactor = None
+            if not self.NO_DESCRIPTION_COMPACTION:
+                # Boilerplate is detected across every row of the current sheet, not only the new jobs
+                description_compactor = DescriptionCompactor(
+                    self.jobs_df['Description'].tolist(),
+                    self.jobs_df['Company Name'].tolist(),
+                    token_budget=self.DESCRIPTION_TOKEN_BUDGET,
                 )
 
-            except Exception as e:
-                logger.error(f"Failed to generate custom contents for job at Company Name {job['Company Name']}. Error: {str(e)}")
-                job['Status'] = 'ERROR: Failed to generate custom contents'
-            return job
-        
+            from src.llm_handler import LLMConnectorClass
+            LLM_handler = LLMConnectorClass(
+                llm_args,
+                prompt_args,
+                self.USE_GMAIL,
+                self.USE_LINKEDIN,
+                cache=llm_cache,
+                description_compactor=description_compactor,
+            )
 
-        jobs_to_generate_content.progress_apply(lambda job: generate_custom_contents_wrapper(job, LLM_handler), axis=1) # type: ignore
-        self.jobs_df.update(jobs_to_generate_content)
+            # Near-duplicate postings of the same company are generated once per cluster
+            duplicates = {index: [] for index in jobs_to_generate_content.index}
+            if not self.NO_DUPLICATE_REUSE:
+                duplicate_detector = NearDuplicateDetector(threshold=self.DUPLICATE_SIMILARITY_THRESHOLD)
+                duplicates = duplicate_detector.cluster(jobs_to_generate_content)
+                # Duplicates the content cannot be adapted to (e.g. no contact name to swap) are generated on their own
+                for representative, duplicate_indices in list(duplicates.items()):
+                    representative_job = jobs_to_generate_content.loc[representative]
+                    duplicates[representative] = []
+                    for index in duplicate_indices:
+                        if can_adapt_generated_content(representative_job, jobs_to_generate_content.loc[index]):
+                            duplicates[representative].append(index)
+                        else:
+                            duplicates[index] = []
+                reused_count = sum(len(duplicate_indices) for duplicate_indices in duplicates.values())
+                logger.info(
+                    f"Reusing generated content for {reused_count} near-duplicate jobs "
+                    f"across {sum(1 for duplicate_indices in duplicates.values() if duplicate_indices)} clusters."
+                )
+            representative_jobs = jobs_to_generate_content.loc[list(duplicates.keys())]
+
+            batch_contents = None
+            if self.LLM_BATCH_MODE:
+                batch_contents = self.generate_contents_with_batch(representative_jobs, LLM_handler)
+                # Jobs whose batch results are not available yet stay "New Job" for a later run
+                representative_jobs = representative_jobs.loc[list(batch_contents.keys())]
+                if representative_jobs.empty:
+                    logger.info("No batch results available yet for content generation.")
+                    return
+
+            def generate_custom_contents_wrapper(job: pd.Series, LLM_handler: "LLMConnectorClass") -> tuple:
+                cluster_jobs = [job] + [jobs_to_generate_content.loc[index].copy() for index in duplicates[job.name]]
+                entry_ids = []
+                try:
+                    if batch_contents is not None:
+                        generated_contents = batch_contents[job.name]
+                        if isinstance(generated_contents, Exception):
+                            raise generated_contents
+                    else:
+                        generated_contents = LLM_handler.generate_custom_content(job)
+                except Exception as e:
+                    for cluster_job in cluster_jobs:
+                        logger.error(f"Failed to generate custom contents for job at Company Name {cluster_job['Company Name']}. Error: {str(e)}")
+                        self.set_status(cluster_job, 'ERROR: Failed to generate custom contents')
+                        entry_ids.append(self.journal_job(cluster_job, STATUS_COLUMNS))
+                    return cluster_jobs, entry_ids
+
+                for cluster_job in cluster_jobs:
+                    try:
+                        job_contents = generated_contents
+                        if cluster_job is not job:
+                            job_contents = adapt_generated_content(generated_contents, job, cluster_job)
+                        for key, value in job_contents.items():
+                            cluster_job[key] = value
+                        # job['Content Generated'] = 'True'
+                        self.set_status(cluster_job, 'Content Generated')
+                        logger.info(f"Custom contents generated for job at Company Name {cluster_job['Company Name']}")
+
+                        create_job_folder(
+                            job=cluster_job,
+                            resume_path=self.RESUME_PATH,
+                            google_drive_handler=self.google_drive_handler,
+                            destination=self.DESTINATION_FOLDER,
+                            in_memory=self.IN_MEMORY_ARTIFACTS,
+                            memory_budget=self.artifact_memory_budget,
+                            local_copy_writer=self.local_copy_writer,
+                            render_pool=self.render_pool,
+                        )
+
+                    except Exception as e:
+                        logger.error(f"Failed to generate custom contents for job at Company Name {cluster_job['Company Name']}. Error: {str(e)}")
+                        self.set_status(cluster_job, 'ERROR: Failed to generate custom contents')
+                    entry_ids.append(self.journal_job(cluster_job, list(generated_contents) + STATUS_COLUMNS))
+                return cluster_jobs, entry_ids
+
+            # Fan the jobs out over a bounded thread pool, the LLM calls are network bound
+            max_workers = max(1, int(self.LLM_CONCURRENCY))
+            logger.info(f"Generating content with {max_workers} concurrent worker(s).")
+            generated_jobs = {}
+            # Journal entries of the rows collected since the last flush, the workers journal other rows meanwhile
+            unflushed_entry_ids = []
+            flushed_count = 0
+            flushed_at = time.monotonic()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(generate_custom_contents_wrapper, job.copy(), LLM_handler)
+                    for _, job in representative_jobs.iterrows()
+                ]
+                with tqdm(total=sum(1 + len(duplicates[index]) for index in representative_jobs.index)) as progress_bar:
+                    for future in as_completed(futures):
+                        cluster_jobs, entry_ids = future.result()
+                        for job in cluster_jobs:
+                            generated_jobs[job.name] = job
+                        unflushed_entry_ids.extend(entry_id for entry_id in entry_ids if entry_id is not None)
+                        progress_bar.update(len(cluster_jobs))
+
+                        # Periodically write the rows finished so far back to the sheet in one coalesced update
+                        if self.JOURNAL_FLUSH_INTERVAL > 0 and time.monotonic() - flushed_at >= self.JOURNAL_FLUSH_INTERVAL:
+                            self.jobs_df.update(pd.DataFrame.from_dict(generated_jobs, orient='index'))
+                            self.update_gsheet_and_checkpoint(unflushed_entry_ids)
+                            unflushed_entry_ids = []
+                            logger.info(f"Flushed {len(generated_jobs) - flushed_count} finished rows to the Google Sheet.")
+                            flushed_count = len(generated_jobs)
+                            flushed_at = time.monotonic()
+        finally:
+            if llm_cache is not None:
+                llm_cache.close()
+
+        token_usage = LLM_handler.token_usage
+        logger.info(
+            f"LLM token usage: {token_usage['calls']} calls, {token_usage['input_tokens']} input tokens "
+            f"({token_usage['cached_input_tokens']} cached), {token_usage['output_tokens']} output tokens."
+        )
+        rate_limit_stats = LLM_handler.rate_limit_stats
+        logger.info(
+            f"LLM rate limiter: {rate_limit_stats['total_wait']:.1f}s total queue wait "
+            f"(max {rate_limit_stats['max_wait']:.1f}s), {rate_limit_stats['retries']} retries, "
+            f"{rate_limit_stats['pauses']} Retry-After pauses."
+        )
+
+        # Write all the results back in a single columnar update
+        generated_jobs_df = pd.DataFrame.from_dict(generated_jobs, orient='index')
+        self.jobs_df.update(generated_jobs_df)
+
+    def generate_contents_with_batch(self, jobs_df: pd.DataFrame, LLM_handler: "LLMConnectorClass") -> dict:
+        """
+        Generate custom contents for the jobs through the OpenAI Batch API.
+        - Cached contents are used as-is and never submitted.
+        - If an earlier run left a pending batch, its results are picked up instead of submitting a new batch.
+        - Otherwise the prompts of all remaining jobs are submitted as a new batch.
+        Parameters:
+            - jobs_df (DataFrame): Jobs to generate content for.
+            - LLM_handler (LLMConnectorClass): Instance of LLMConnectorClass.
+        Returns:
+            - dict: Generated contents (or the error) keyed by the jobs_df index, only for the jobs whose results are available.
+        """
+        from src.llm_batch_handler import LLMBatchHandler
+        batch_handler = LLMBatchHandler(
+            api_key=self.LLM_API_KEY,
+            model_name=LLM_handler.model_name,
+            state_path=self.LLM_BATCH_STATE_PATH,
+            api_base_url=self.LLM_BATCH_API_BASE_URL,
+            poll_interval=self.LLM_BATCH_POLL_INTERVAL,
+            max_wait_minutes=self.LLM_BATCH_MAX_WAIT_MINUTES,
+        )
+
+        # Each enabled artifact of a job is a separate batch request, unless it is cached
+        contents = {}
+        pending_requests = {}
+        for index, job in jobs_df.iterrows():
+            contents[index] = {}
+            for artifact in LLM_handler.enabled_artifacts:
+                cached_content = LLM_handler.get_cached_content(job, artifact)
+                if cached_content is not None:
+                    contents[index].update(cached_content)
+                else:
+                    # Only rows with the same prompt inputs (e.g. the same contact) share a request
+                    request_key = LLM_handler.get_request_key(job, artifact)
+                    pending_requests.setdefault(f"{request_key}:{artifact}", []).append(index)
+
+        pending_batch = batch_handler.get_pending_batch()
+        if pending_batch is not None:
+            batch_id = pending_batch["batch_id"]
+            logger.info(f"Picking up the results of batch {batch_id} submitted by an earlier run.")
+        elif pending_requests:
+            prompts = {
+                custom_id: LLM_handler.render_prompt(jobs_df.loc[indices[0]], custom_id.split(":")[1])
+                for custom_id, indices in pending_requests.items()
+            }
+            batch_id = batch_handler.submit(prompts)
+        else:
+            return contents
+
+        results = batch_handler.wait_for_results(batch_id)
+        if results is not None:
+            for custom_id, result in results.items():
+                artifact = custom_id.split(":")[1]
+                # Jobs that are no longer "New Job" are skipped
+                for index in pending_requests.pop(custom_id, []):
+                    if isinstance(contents[index], Exception):
+                        continue
+                    try:
+                        if isinstance(result, Exception):
+                            raise result
+                        artifact_content = LLM_handler.parse_response(artifact, result)
+                        LLM_handler.cache_content(jobs_df.loc[index], artifact, artifact_content)
+                        contents[index].update(artifact_content)
+                    except Exception as e:
+                        contents[index] = e
+            batch_handler.clear_pending_batch()
+
+        # Jobs with artifacts still missing stay "New Job" for a later run
+        incomplete = {index for indices in pending_requests.values() for index in indices}
+        return {index: content for index, content in contents.items() if index not in incomplete}
 
     def update_missing_contacts(self):
         """
@@ -208,7 +574,7 @@ class JobProcessor:
         - In the message subject, replace [Contact Name] with the name of the contact.
         If the name is not provided, fetch it from LinkedIn profile if available.
         """
-        def update_message_content_with_name_wrapper(job: pd.Series, linkedin_handler: LinkedInConnectorClass) -> pd.Series:
+        def update_message_content_with_name_wrapper(job: pd.Series, linkedin_handler: "LinkedInConnectorClass") -> pd.Series:
             try:
                 if job['Contact Name'] == "":
                     linkedin_handler.driver.get(job['LinkedIn Contact'])
@@ -235,6 +601,15 @@ class JobProcessor:
         self.update_missing_contacts()
 
         jobs_with_content_generated_status = self.jobs_df[self.jobs_df['Status'] == 'Content Generated'].copy()
+        if self.outbox is not None:
+            # Messages are queued to the outbox and sent by its drain, here unless OUTBOX_SEPARATE_DRAIN
+            if not jobs_with_content_generated_status.empty:
+                self.queue_messages(jobs_with_content_generated_status)
+            if not self.OUTBOX_SEPARATE_DRAIN:
+                self.drain_outbox()
+            self.update_queued_jobs()
+            return
+
         if jobs_with_content_generated_status.empty:
             logger.info("No jobs with 'Content Generated' status found for sending messages.")
             return
@@ -252,35 +627,138 @@ class JobProcessor:
                 self.send_linkedin_connections(linkedin_jobs_df)
                 self.jobs_df.update(linkedin_jobs_df)
 
+    def get_outbox_messages(self, job: pd.Series) -> list:
+        """
+        Render the messages of a job for the outbox: its email with USE_GMAIL and its LinkedIn note with USE_LINKEDIN,
+        each keyed by channel, job row and recipient.
+        """
+        from src.outbox import EMAIL_CHANNEL, LINKEDIN_CHANNEL, Outbox
+        job_key = JobJournal.make_key(job)
+        messages = []
+        if self.USE_GMAIL and str(job.get('Email', '')).strip():
+            messages.append({
+                'key': Outbox.make_key(EMAIL_CHANNEL, job_key, job['Email']),
+                'channel': EMAIL_CHANNEL,
+                'recipient': job['Email'],
+                'subject': job['Message Subject'],
+                'content': job['Message Content'].replace("[Contact Name]", job['Contact Name']),
+            })
+        if self.USE_LINKEDIN and str(job.get('LinkedIn Contact', '')).strip():
+            messages.append({
+                'key': Outbox.make_key(LINKEDIN_CHANNEL, job_key, job['LinkedIn Contact']),
+                'channel': LINKEDIN_CHANNEL,
+                'recipient': job['LinkedIn Contact'],
+                'content': LINKEDIN_NOTE_TEMPLATE.format(position=job['Position'], company_name=job['Company Name']),
+            })
+        return messages
+
+    def queue_messages(self, jobs_df: pd.DataFrame):
+        """
+        Queue the rendered messages of each job in the DataFrame to the outbox and set their status to "Messages Queued".
+        Messages already in the outbox are not queued again.
+        """
+        queued_count = 0
+        for index, job in jobs_df.iterrows():
+            job = job.copy()
+            job['Message Content'] = job['Message Content'].replace("[Contact Name]", job['Contact Name'])
+            messages = self.get_outbox_messages(job)
+            if not messages:
+                continue
+            queued_count += sum(self.outbox.enqueue(message) for message in messages)
+            self.set_status(job, QUEUED_STATUS)
+            self.journal_job(job, ['Message Content'] + STATUS_COLUMNS)
+            jobs_df.loc[index] = job
+        logger.info(f"Queued {queued_count} messages of {len(jobs_df)} jobs to the outbox.")
+        self.jobs_df.update(jobs_df)
+
+    def drain_outbox(self):
+        """
+        Send the messages of the outbox that are due.
+        """
+        from src.outbox import drain_outbox
+        drain_outbox(self.outbox, self.options, self.linkedin_handler if self.USE_LINKEDIN else None)
+
+    def update_queued_jobs(self):
+        """
+        Update the status of the "Messages Queued" jobs from the outbox, once none of their messages is waiting:
+        to the status of their last message, sent or failed, as without the outbox.
+        Jobs whose messages are missing from the outbox are set back to "Content Generated" to be queued again.
+        """
+        from src.outbox import EMAIL_CHANNEL, LINKEDIN_CHANNEL
+        statuses = {
+            (EMAIL_CHANNEL, 'cur'): 'Email Sent',
+            (EMAIL_CHANNEL, 'failed'): 'Failed to send email',
+            (LINKEDIN_CHANNEL, 'cur'): 'LinkedIn Connection Sent',
+            (LINKEDIN_CHANNEL, 'failed'): 'Failed to send LinkedIn connection request',
+        }
+        queued_jobs = self.jobs_df[self.jobs_df['Status'] == QUEUED_STATUS].copy()
+        for index, job in queued_jobs.iterrows():
+            states = [(message['channel'], self.outbox.state(message['key'])) for message in self.get_outbox_messages(job)]
+            if any(state in ('new', 'sending') for _, state in states):
+                continue
+            finished_states = [channel_state for channel_state in states if channel_state[1] is not None]
+            status = statuses[finished_states[-1]] if finished_states else 'Content Generated'
+            self.set_status(job, status)
+            self.journal_job(job, STATUS_COLUMNS)
+            queued_jobs.loc[index] = job
+        self.jobs_df.update(queued_jobs)
+        if not queued_jobs.empty:
+            logger.info(f"{(queued_jobs['Status'] == QUEUED_STATUS).sum()} jobs still have messages waiting in the outbox.")
+
     def send_emails(self, jobs_df: pd.DataFrame):
         """
         Send emails for each job in the DataFrame and update the status.
-        Wrapper: send_email_wrapper
-            Parameters:
-            - job (Series): Pandas Series containing the details of a job.
-            - email_handler (EmailHandler): Instance of EmailHandler.
+        The emails are queued to an EmailDispatcher, sending over EMAIL_CONCURRENCY connections within
+        EMAIL_MESSAGES_PER_MINUTE and EMAIL_DAILY_LIMIT. Emails deferred past the daily quota leave their
+        row "Content Generated", to be sent by a later run.
         """
-        from src.email_handler import EmailHandler
-        email_handler = EmailHandler(self.GMAIL_ADDRESS, self.GMAIL_PASSWORD)
-        logger.info("Email Connection Established.")
+        from src.email_dispatcher import DEFERRED, SENT, create_email_dispatcher
+        email_handler, email_dispatcher = create_email_dispatcher(self.options)
         logger.info(f"Sending emails to {len(jobs_df)} contacts...")
-        def send_email_wrapper(job: pd.Series, email_handler: EmailHandler) -> pd.Series:
-                try:
-                    # Set the name in the message content
-                    job['Message Content'] = job['Message Content'].replace("[Contact Name]", job['Contact Name'])
-                    email_handler.send(
-                        content=job['Message Content'],
-                        recepient_email=job['Email'],
-                        subject=job['Message Subject'],
-                    )
-                    job['Status'] = 'Email Sent'
-                    logger.info(f"Email sent to {job['Email']} for job at Company Name {job['Company Name']}")
-                except Exception as e:
-                    logger.warning(f"Failed to send email for job at Company Name {job['Company Name']}. Error: {str(e)}")
-                    job['Status'] = 'Failed to send email'
-                return job
-                
-        jobs_df.progress_apply(lambda job: send_email_wrapper(job, email_handler), axis=1) # type: ignore
+
+        jobs = {}
+        messages = []
+        for index, job in jobs_df.iterrows():
+            job = job.copy()
+            # Set the name in the message content
+            job['Message Content'] = job['Message Content'].replace("[Contact Name]", job['Contact Name'])
+            jobs[index] = job
+            messages.append({
+                'key': index,
+                'recipient': job['Email'],
+                'subject': job['Message Subject'],
+                'content': job['Message Content'],
+            })
+
+        progress_bar = tqdm(total=len(messages))
+
+        def update_job_status(message: dict, result: dict) -> None:
+            # Called from the sending threads, each with the rows of its own messages
+            job = jobs[message['key']]
+            if result['status'] == SENT:
+                self.set_status(job, 'Email Sent')
+                logger.info(f"Email sent to {job['Email']} for job at Company Name {job['Company Name']}")
+            elif result['status'] == DEFERRED:
+                logger.info(f"Email deferred to a later run for job at Company Name {job['Company Name']}")
+            else:
+                logger.warning(f"Failed to send email for job at Company Name {job['Company Name']}. Error: {result['error']}")
+                self.set_status(job, 'Failed to send email')
+            self.journal_job(job, ['Message Content'] + STATUS_COLUMNS)
+            progress_bar.update(1)
+
+        # The connections of the handler are closed once all the emails are sent
+        with email_handler, progress_bar:
+            email_dispatcher.dispatch(messages, on_result=update_job_status)
+
+        dispatch_stats = email_dispatcher.stats
+        email_stats = email_handler.stats
+        logger.info(
+            f"Emails: {dispatch_stats['sent']} sent, {dispatch_stats['failed']} failed, {dispatch_stats['deferred']} deferred "
+            f"after {dispatch_stats['retries']} retries, p50/p95 latency {dispatch_stats['p50_send_seconds']:.2f}/"
+            f"{dispatch_stats['p95_send_seconds']:.2f}s per message, over {email_stats['connections']} SMTP connections "
+            f"({email_stats['reconnects']} dropped connections replaced)."
+        )
+        jobs_df.update(pd.DataFrame.from_dict(jobs, orient='index'))
         self.jobs_df.update(jobs_df)
 
     def send_linkedin_connections(self, jobs_df: pd.DataFrame):
@@ -292,39 +770,98 @@ class JobProcessor:
             - linkedin_handler (LinkedInConnectorClass): Instance of LinkedInConnectorClass.
         """        
 
-        linkedin_note = "Hi [Contact Name], I am keen on an open {position} role at {company_name}. I'd appreciate the opportunity to connect and explore how my expertise aligns with this role."
-
         logger.info("LinkedIn Connection Established.")
         logger.info(f"Sending LinkedIn connection requests to {len(jobs_df)} contacts...")
-        def send_linkedin_connection_with_message(job: pd.Series, linkedin_handler: LinkedInConnectorClass) -> pd.Series:
+        def send_linkedin_connection_with_message(job: pd.Series, linkedin_handler: "LinkedInConnectorClass") -> pd.Series:
             try:
                 name = linkedin_handler.send_connection_request(
                     profile_url=job['LinkedIn Contact'],
-                    note=linkedin_note.format(
+                    note=LINKEDIN_NOTE_TEMPLATE.format(
                         position = job['Position'],
                         company_name =  job['Company Name'],
                     )
                 )
                     
-                job['Status'] = 'LinkedIn Connection Sent'
+                self.set_status(job, 'LinkedIn Connection Sent')
                 logger.info(f"LinkedIn connection request sent to {job['Contact Name']} for job at Company Name {job['Company Name']}")
                 time.sleep(5)
                 
             except Exception as e:
                 logger.warning(f"Failed to send LinkedIn connection request for job at Company Name {job['Company Name']}. Error: {str(e)}")
-                job['Status'] = 'Failed to send LinkedIn connection request'
+                self.set_status(job, 'Failed to send LinkedIn connection request')
 
+            self.journal_job(job, STATUS_COLUMNS)
             return job
 
         jobs_df.progress_apply(lambda job: send_linkedin_connection_with_message(job, self.linkedin_handler), axis=1) # type: ignore
         self.jobs_df.update(jobs_df)
 
+    def mark_archived_duplicates(self):
+        """
+        Set the status of the "New Job" rows of a job that was already archived to "Duplicate of Archived Job",
+        so a posting added again after its row was archived is not applied to twice.
+        """
+        new_jobs = self.jobs_df[self.jobs_df['Status'] == 'New Job']
+        if new_jobs.empty:
+            return
+
+        archived_job_keys = self.gc.get_archived_values(self.GOOGLE_SHEET_NAME, JOB_KEY_COLUMN, ARCHIVE_WORKSHEET_PREFIX)
+        for index in new_jobs.index[new_jobs.apply(get_job_key, axis=1).isin(archived_job_keys)]:
+            job = self.jobs_df.loc[index].copy()
+            self.set_status(job, 'Duplicate of Archived Job')
+            self.jobs_df.loc[index] = job
+            self.journal_job(job, STATUS_COLUMNS)
+            logger.info(f"Job at Company Name {job['Company Name']} was already archived, skipping it.")
+
+    def archive_completed_jobs(self):
+        """
+        Move the rows with a terminal status older than ARCHIVE_AFTER_DAYS days to monthly archive worksheets
+        of the Google Sheet ("Archive 2024-05"), keeping the active worksheet small.
+        Archived rows carry a "Job Key" column to be found by mark_archived_duplicates.
+        Rows with a terminal status but no "Status Updated" date are dated today and archived once old enough.
+        """
+        if self.READ_PENDING_ROWS_ONLY:
+            # The pending rows read by the run do not hold the completed rows
+            jobs_df = self.gc.get_dataframe_from_gsheet(self.GOOGLE_SHEET_NAME)
+        else:
+            jobs_df = self.jobs_df.copy()
+        if jobs_df.empty:
+            return
+        if 'Status Updated' not in jobs_df.columns:
+            jobs_df['Status Updated'] = ""
+
+        completed = jobs_df['Status'].isin(TERMINAL_STATUSES)
+        undated = completed & (jobs_df['Status Updated'].astype(str).str.strip() == "")
+        jobs_df.loc[undated, 'Status Updated'] = date.today().isoformat()
+
+        status_dates = pd.to_datetime(jobs_df['Status Updated'], errors='coerce')
+        archived = completed & (status_dates <= pd.Timestamp(date.today() - timedelta(days=self.ARCHIVE_AFTER_DAYS)))
+        if archived.any():
+            archived_jobs = jobs_df[archived].copy()
+            archived_jobs[JOB_KEY_COLUMN] = archived_jobs.apply(get_job_key, axis=1)
+            archive_months = status_dates[archived].dt.strftime("%Y-%m")
+            self.gc.append_to_worksheets(
+                self.GOOGLE_SHEET_NAME,
+                {
+                    f"{ARCHIVE_WORKSHEET_PREFIX}{month}": month_jobs
+                    for month, month_jobs in archived_jobs.groupby(archive_months, sort=True)
+                },
+            )
+            # Rows are appended to the archive before they are removed, a crash in between leaves them in both
+            jobs_df = jobs_df[~archived].reset_index(drop=True)
+            logger.info(f"Archived {int(archived.sum())} completed jobs, {len(jobs_df)} jobs left in Google Sheet.")
+
+        if archived.any() or undated.any():
+            self.gc.update_gsheet_from_dataframe(jobs_df, self.GOOGLE_SHEET_NAME)
+        if not self.READ_PENDING_ROWS_ONLY:
+            self.jobs_df = jobs_df
+
     def update_gsheet(self):
         """
         Update Google Sheet with the updated jobs DataFrame.
         """
         try:
-            self.gc.update_gsheet_from_dataframe(self.jobs_df)
+            self.gc.update_gsheet_from_dataframe(self.jobs_df, self.GOOGLE_SHEET_NAME)
             logger.info("Google Sheet updated successfully.")
         except Exception as e:
             logger.error(f"Error while updating Google Sheet: {str(e)}")
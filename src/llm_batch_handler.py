@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Union
+
+import requests
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+FINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Error codes of the requests that did not run before the batch expired or was cancelled
+NOT_RUN_ERROR_CODES = ("batch_expired", "batch_cancelled")
+
+
+class LLMBatchHandler:
+    """
+    Submits prompts through the OpenAI Batch API and collects the results.
+
+    The ID of the submitted batch is persisted in a state file, so a later invocation can
+    pick up the results of a batch submitted by an earlier one.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        state_path: str,
+        api_base_url: str = "https://api.openai.com/v1",
+        poll_interval: float = 60,
+        max_wait_minutes: float = 1440,
+    ):
+        """
+        Initialize LLMBatchHandler.
+
+        Args:
+            api_key (str): OpenAI API key.
+            model_name (str): Model to run the batch requests against.
+            state_path (str): Path to the JSON file the pending batch is persisted in.
+            api_base_url (str): Base URL of the API. Point it at a local stand-in server for testing.
+            poll_interval (float): Seconds between two batch status checks.
+            max_wait_minutes (float): Stop polling after this long, leaving the batch for a later invocation.
+        """
+        self.model_name = model_name
+        self.state_path = state_path
+        self.api_base_url = api_base_url.rstrip("/")
+        self.poll_interval = poll_interval
+        self.max_wait_seconds = max_wait_minutes * 60
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+
+    def get_pending_batch(self) -> Optional[dict]:
+        """
+        Get the batch persisted by an earlier invocation.
+
+        Returns:
+            Optional[dict]: Batch state (batch_id, custom_ids, submitted_at), or None if there is none.
+        """
+        if not os.path.isfile(self.state_path):
+            return None
+        with open(self.state_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def clear_pending_batch(self) -> None:
+        """Forget the persisted batch once its results are consumed."""
+        if os.path.isfile(self.state_path):
+            os.remove(self.state_path)
+
+    def submit(self, prompts: Dict[str, str]) -> str:
+        """
+        Serialize the prompts into a batch JSONL file, upload it and create the batch.
+
+        Args:
+            prompts (Dict[str, str]): Prompts keyed by their custom ID.
+
+        Returns:
+            str: ID of the created batch.
+        """
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model_name,
+                    "messages": [{"role": "user", "content": prompt}],
+                },
+            }, ensure_ascii=False)
+            for custom_id, prompt in prompts.items()
+        ]
+        batch_file = ("\n".join(lines) + "\n").encode("utf-8")
+
+        response = self.session.post(
+            f"{self.api_base_url}/files",
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", batch_file, "application/jsonl")},
+        )
+        response.raise_for_status()
+        input_file_id = response.json()["id"]
+
+        response = self.session.post(
+            f"{self.api_base_url}/batches",
+            json={
+                "input_file_id": input_file_id,
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+            },
+        )
+        response.raise_for_status()
+        batch_id = response.json()["id"]
+
+        state_folder = os.path.dirname(self.state_path)
+        if state_folder:
+            os.makedirs(state_folder, exist_ok=True)
+        with open(self.state_path, "w", encoding="utf-8") as file:
+            json.dump({"batch_id": batch_id, "custom_ids": list(prompts.keys()), "submitted_at": time.time()}, file)
+
+        logger.info(f"Submitted batch {batch_id} with {len(prompts)} requests ({len(batch_file)} bytes).")
+        return batch_id
+
+    def wait_for_results(self, batch_id: str) -> Optional[Dict[str, Union[str, Exception]]]:
+        """
+        Poll the batch until it reaches a final status and download its results.
+
+        Args:
+            batch_id (str): ID of the batch.
+
+        Returns:
+            Optional[Dict[str, Union[str, Exception]]]: Response text (or the error) keyed by custom ID,
+            or None if the batch did not finish within max_wait_minutes. The requests that did not run
+            (the whole batch failed, or it expired or was cancelled first) have no result, so they can
+            be submitted again.
+        """
+        started_at = time.monotonic()
+        while True:
+            response = self.session.get(f"{self.api_base_url}/batches/{batch_id}")
+            response.raise_for_status()
+            batch = response.json()
+            status = batch.get("status")
+            logger.info(f"Batch {batch_id} status: {status}, request counts: {batch.get('request_counts')}")
+
+            if status in FINAL_BATCH_STATUSES:
+                break
+            if time.monotonic() - started_at + self.poll_interval > self.max_wait_seconds:
+                logger.info(f"Batch {batch_id} is still {status}, a later invocation will pick up its results.")
+                return None
+            time.sleep(self.poll_interval)
+
+        if status == "failed":
+            logger.warning(f"Batch {batch_id} failed: {batch.get('errors')}")
+
+        results: Dict[str, Union[str, Exception]] = {}
+        # Expired and cancelled batches can still have partial results
+        if batch.get("output_file_id"):
+            for line in self._download_file(batch["output_file_id"]):
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[result["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    results[result["custom_id"]] = ValueError(f"Batch request failed: {result.get('error') or response}")
+        if batch.get("error_file_id"):
+            for line in self._download_file(batch["error_file_id"]):
+                result = json.loads(line)
+                if (result.get("error") or {}).get("code") in NOT_RUN_ERROR_CODES:
+                    continue
+                results[result["custom_id"]] = ValueError(f"Batch request failed: {result.get('error') or result.get('response')}")
+
+        logger.info(f"Batch {batch_id} {status} with {len(results)} results.")
+        return results
+
+    def _download_file(self, file_id: str) -> list:
+        """Download a JSONL file and return its non-empty lines."""
+        response = self.session.get(f"{self.api_base_url}/files/{file_id}/content")
+        response.raise_for_status()
+        return [line for line in response.text.splitlines() if line.strip()]
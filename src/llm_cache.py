@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Persistent, content-addressed cache for generated LLM content.
+
+    Responses are stored in a SQLite database keyed by a hash of every input that
+    influences the prompt, so a retried or re-run job never pays for the same prompt twice.
+    """
+
+    def __init__(self, cache_path: str, max_entries: int = 5000, max_age_days: float = 30):
+        """
+        Open (or create) the cache database and evict stale entries.
+
+        Args:
+            cache_path (str): Path to the SQLite cache file.
+            max_entries (int): Maximum number of responses to keep.
+            max_age_days (float): Responses older than this are evicted.
+        """
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        cache_folder = os.path.dirname(cache_path)
+        if cache_folder:
+            os.makedirs(cache_folder, exist_ok=True)
+
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(fields: Dict[str, str]) -> str:
+        """
+        Create the cache key for the given prompt inputs.
+
+        Args:
+            fields (Dict[str, str]): All inputs that influence the LLM response.
+
+        Returns:
+            str: SHA-256 hex digest of the inputs.
+        """
+        serialized = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Get a cached response.
+
+        Args:
+            key (str): Cache key from make_key.
+
+        Returns:
+            Optional[Dict[str, str]]: The cached response, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, response: Dict[str, str]) -> None:
+        """
+        Store a response in the cache.
+
+        Args:
+            key (str): Cache key from make_key.
+            response (Dict[str, str]): Generated content to store.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response, ensure_ascii=False), now, now),
+            )
+            self._connection.commit()
+
+    def evict(self) -> int:
+        """
+        Remove expired entries and trim the cache down to max_entries, least recently used first.
+
+        Returns:
+            int: Number of evicted entries.
+        """
+        with self._lock:
+            expired = self._connection.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+            overflow = self._connection.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+            self._connection.commit()
+
+        if expired or overflow:
+            logger.info(f"Evicted {expired} expired and {overflow} least recently used LLM cache entries.")
+        return expired + overflow
+
+    def close(self) -> None:
+        """
+        Evict stale entries, log the hit/miss counters and close the database.
+        """
+        self.evict()
+        logger.info(f"LLM cache stats: {self.hits} hits, {self.misses} misses.")
+        with self._lock:
+            self._connection.close()
@@ -1,142 +1,431 @@
 import logging
-from typing import Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
-from gptrim import trim
 from langchain.callbacks import get_openai_callback
 from langchain.chat_models import ChatOpenAI
 from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import PromptTemplate
+from langchain.schema import BaseMessage
 from pydantic import BaseModel, Field
 
+from src.description_compactor import DescriptionCompactor
+from src.llm_cache import LLMResponseCache
+from src.rate_limiter import RateLimiter, call_with_retries, parse_retry_after
+
 # Configure logging for the application.
 logging.basicConfig(level=logging.INFO)
 
-class CustomJobApplicationMaterials(BaseModel):
+class ResumeMaterials(BaseModel):
     """
-    Model for custom job application materials.
+    Model for the enhanced resume.
     """
-    cover_letter: str = Field(description="Customized Cover Letter")
     resume_summary: str = Field(description="Enhanced Resume Summary")
     missing_keywords: str = Field(description="Missing Keywords")
+
+class CoverLetterMaterials(BaseModel):
+    """
+    Model for the customized cover letter.
+    """
+    cover_letter: str = Field(description="Customized Cover Letter")
+
+class EmailMaterials(BaseModel):
+    """
+    Model for the email to the recruiter or hiring manager.
+    """
     email_content: str = Field(description="Refined Email Content")
     email_subject: str = Field(description="Email Subject Line")
+
+class LinkedInNoteMaterials(BaseModel):
+    """
+    Model for the LinkedIn connection note.
+    """
     linkedin_note: str = Field(description="LinkedIn Note")
 
+class CustomJobApplicationMaterials(ResumeMaterials, CoverLetterMaterials, EmailMaterials, LinkedInNoteMaterials):
+    """
+    Model for custom job application materials.
+    """
+
 class LLMConnectorClass:
     """
     Connects with a Language Learning Model (LLM) to generate custom content.
     """
-    prompt_template = """
+    # Each artifact is generated by its own sub-chain. Static material (instructions, templates,
+    # professional summary and format instructions) forms a stable leading prefix so provider-side
+    # prompt caching can reuse it across jobs. Per-job fields only appear in the "Job Details"
+    # section at the end of the prompt.
+    prompt_header = """
         Prompt: Job Description Refinement and Application Materials Creation
 
         Task Overview: 
-        - Start with analyzing the job description. 
-        - Then, create specific application materials.
+        - Start with analyzing the job description given in the Job Details section at the end. 
+        - Then, create the application material described in Step 2.
         Return only the final output json with all the keys and values populated.
 
+        Reference Material:
+        - Resume Template: ``` {resume_template} ```
+        - Resume Professional Summary: ``` {resume_professional_summary} ```
+        - Cover Letter Template: ``` {cover_letter_template} ```
+
         Step 1: Analyze the Job Description
-        - Input: Raw Job Description: {job_description}, Job Title: {position}
+        - Input: The Raw Job Description and the Job Title from the Job Details section.
         - Sub-steps:
             1.1 Analyze the raw job description for key roles and responsibilities.
             1.2 Identify and list essential hard skills such as technical skills and tools.
             1.3 Identify soft skills like communication, teamwork, problem-solving.
             1.4 Understand the company's culture, values, mission, and vision.
+    """
 
+    artifact_prompts = {
+        "resume": """
         Step 2: Enhance the Resume
         - Reference the updated job description from Step 1.
         - Sub-steps:
-            3.1 Utilize the Resume Template: ``` {resume_template} ``` and the Resume Professional Summary: ``` {resume_professional_summary} ```
-            3.2 Revise the professional summary to align with the new job description. Have a statement "Seeking a {position} at {company_name} ..." in it and provide it in the "resume_summary" key. If the {position} seems inappropriate, generalize it from what can be understood.
-            3.4 Provide the technical skills and tools that are missing in the resume but are required for the job (based on the job description). Provide only technical keywords which generally reflect hard skills.
+            2.1 Utilize the Resume Template and the Resume Professional Summary from the Reference Material.
+            2.2 Revise the professional summary to align with the new job description. Have a statement "Seeking a <Job Title> at <Company Name> ..." in it and provide it in the "resume_summary" key. If the Job Title seems inappropriate, generalize it from what can be understood.
+            2.3 Provide the technical skills and tools that are missing in the resume but are required for the job (based on the job description). Provide only technical keywords which generally reflect hard skills.
             Provide the missing keywords in the "missing_keywords" key.
         - Aim: Reflect the key aspects of the job description accurately. Ensure adequate soft skills are also covered.
         - Place the outputs in the keys "resume_summary" and "missing_keywords" in the output JSON.
-        
-        Step 3: Craft a Customized Cover Letter
-        - Use the updated job description from Step 1 and the resume from Step 2.
+    """,
+        "cover_letter": """
+        Step 2: Craft a Customized Cover Letter
+        - Use the updated job description from Step 1 and the Resume Template from the Reference Material.
         - Sub-steps:
-            2.1 Start with the Cover Letter Template: ``` {cover_letter_template} ```
-            2.2 Integrate elements from the updated job description relevant to the {position} and my skills from the resume.
+            2.1 Start with the Cover Letter Template from the Reference Material.
+            2.2 Integrate elements from the updated job description relevant to the Job Title and my skills from the resume.
             2.3 Personalize the introduction, emphasizing your interest in the role. Ensure to follow the instruction and fill the placeholder <Two sentences about what inspires me to join the company.>
             2.4 Tailor the body of the letter to reflect your matching skills and experiences.
             2.5 Conclude with a strong, relevant closing statement.
             2.6 Ensure proper grammar, punctuation, and spacing and no redundancy. Ensure text is properly formatted with proper spacing, line breaks, salutations, signatures and paragraphs.
         - Focus: Clarity, relevance, and personalization.
         - Place the output in the key "cover_letter" in the output JSON.
-
-        Step 4: Compose a Professional Email
+    """,
+        "email": """
+        Step 2: Compose a Professional Email
         - Sub-steps:
-            4.1 Based on the job description, draft a professional email to the recruiter or hiring manager with content from the cover letter.
-            4.2 Use the name: {name} and the company name: {company_name} in the email.
-            4.3 Write a concise email body, mentioning the job link and company name.
-            4.4 Develop a subject line that is both relevant and attention-grabbing. It should be under 100 characters. Ensure text is properly formatted with proper spacing and line breaks.
+            2.1 Based on the job description and my skills from the resume, draft a professional email to the recruiter or hiring manager.
+            2.2 Use the Contact Name and the Company Name from the Job Details section in the email.
+            2.3 Write a concise email body, mentioning the job link and company name.
+            2.4 Develop a subject line that is both relevant and attention-grabbing. It should be under 100 characters. Ensure text is properly formatted with proper spacing and line breaks.
         - Objective: Clear and professional email communication.
         - Place the output in the keys "email_content" and "email_subject" in the output JSON.
-
-        Step 5: Compose a LinkedIn Note
+    """,
+        "linkedin_note": """
+        Step 2: Compose a LinkedIn Note
         - Use the following template:
-            Dear {name},
-            I am keen on an open {position} role at {company_name}. I'd appreciate the opportunity to connect and explore how my expertise aligns with this role
+            Dear <Contact Name>,
+            I am keen on an open <Job Title> role at <Company Name>. I'd appreciate the opportunity to connect and explore how my expertise aligns with this role
         - Provide with proper grammar, punctuation, and spacing, formatted with proper spacing, line breaks, salutations, signatures and paragraphs.
         - Place the output in the key "linkedin_note" in the output JSON.
+    """,
+    }
 
+    prompt_footer = """
         Output: 
         - Present the output in a JSON format, as per {format_instructions}.
+
+        Job Details:
+        - Job Title: {position}
+        - Company Name: {company_name}
+        - Contact Name: {name}
+        - Raw Job Description: {job_description}
     """
 
+    # Output model, Google Sheet columns and estimated output tokens of each artifact
+    artifacts = {
+        "resume": {
+            "model": ResumeMaterials,
+            "columns": {"resume_summary": "Resume", "missing_keywords": "Missing Keywords"},
+            "estimated_output_tokens": 300,
+        },
+        "cover_letter": {
+            "model": CoverLetterMaterials,
+            "columns": {"cover_letter": "Cover Letter"},
+            "estimated_output_tokens": 600,
+        },
+        "email": {
+            "model": EmailMaterials,
+            "columns": {"email_content": "Message Content", "email_subject": "Message Subject"},
+            "estimated_output_tokens": 400,
+        },
+        "linkedin_note": {
+            "model": LinkedInNoteMaterials,
+            "columns": {"linkedin_note": "LinkedIn Note"},
+            "estimated_output_tokens": 100,
+        },
+    }
 
-    def __init__(self, llm_args: dict, prompt_args: dict, use_email: bool = True, use_linkedin: bool = True):
+    # Rate limiters are shared by every instance in the process, one per model and budget
+    _rate_limiters: Dict[Tuple[str, float, float], RateLimiter] = {}
+    _rate_limiters_lock = threading.Lock()
+
+    def __init__(
+        self,
+        llm_args: dict,
+        prompt_args: dict,
+        use_email: bool = True,
+        use_linkedin: bool = True,
+        cache: Optional[LLMResponseCache] = None,
+        description_compactor: Optional[DescriptionCompactor] = None,
+    ):
         """
         Initializes the connector with LLM and prompt configurations.
 
         Args:
-            llm_args (dict): Configuration for LLM (API key and model name).
+            llm_args (dict): Configuration for LLM (API key and model name). Optionally the requests and
+                tokens per minute budgets, the maximum number of retries and an already built chat model
+                ("llm_client") to use instead of ChatOpenAI, e.g. an offline stand-in.
             prompt_args (dict): Templates and other arguments for the prompts.
-            use_email (bool): Indicates if email template is to be used.
-            use_linkedin (bool): Indicates if LinkedIn note template is to be used.
+            use_email (bool): Indicates if the email is to be generated.
+            use_linkedin (bool): Indicates if the LinkedIn note is to be generated.
+            cache (Optional[LLMResponseCache]): Cache for generated content. No caching if None.
+            description_compactor (Optional[DescriptionCompactor]): Compacts job descriptions before prompting. No compaction if None.
         """
-        self._llm_client = ChatOpenAI(
+        # Retries are handled here, so they go through the shared rate limiter
+        self._llm_client = llm_args.get("llm_client") or ChatOpenAI(
             api_key=llm_args["api_key"],
             model_name=llm_args["model_name"],
+            max_retries=0,
         )
+        self._model_name = llm_args["model_name"]
         self._prompt_args = prompt_args
         self._use_email = use_email
         self._use_linkedin = use_linkedin
+        self._cache = cache
+        self._description_compactor = description_compactor
+
+        # Only the enabled artifacts are requested from the LLM
+        self._enabled_artifacts = ["resume", "cover_letter"]
+        if use_email:
+            self._enabled_artifacts.append("email")
+        if use_linkedin:
+            self._enabled_artifacts.append("linkedin_note")
+
+        # Compile the parsers, prompts and chains once, they only depend on the static prompt arguments
+        static_prompt_args = self._create_static_prompt_arguments()
+        self._output_parsers = {}
+        self._prompts = {}
+        self._chains = {}
+        self._static_prompt_tokens = {}
+        for artifact in self._enabled_artifacts:
+            self._output_parsers[artifact] = self._select_output_parser(artifact)
+            self._prompts[artifact] = self._construct_prompt(artifact, static_prompt_args, self._output_parsers[artifact])
+            self._chains[artifact] = self._prompts[artifact] | self._llm_client
+            self._static_prompt_tokens[artifact] = len(
+                self._prompts[artifact].format(job_description="", position="", company_name="", name="")
+            ) // 4
+
+        self._rate_limiter = self._get_rate_limiter(
+            llm_args["model_name"],
+            llm_args.get("requests_per_minute", 0),
+            llm_args.get("tokens_per_minute", 0),
+        )
+        self._max_retries = llm_args.get("max_retries", 6)
+        self._retries = 0
+
+        self._token_usage_lock = threading.Lock()
+        self._token_usage = {"calls": 0, "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0}
 
     def generate_custom_content(self, job: pd.Series) -> Dict[str, str]:
         """
         Generates custom content based on the job data.
+        The enabled artifacts are generated concurrently by their own sub-chains, so the latency
+        is set by the slowest artifact rather than the sum of all of them.
 
         Args:
             job (pd.Series): Job data used to generate custom content.
 
         Returns:
-            Dict[str, str]: Generated custom content.
+            Dict[str, str]: Generated custom content for the enabled artifacts.
         """
         prompt_args = self._create_prompt_arguments(job)
-        output_parser = self._select_output_parser()
-        prompt = self._construct_prompt(prompt_args, output_parser)
-        chain = prompt | self._llm_client | output_parser
 
-        with get_openai_callback() as callback:
-            response_raw = chain.invoke(prompt_args)
-            response = response_raw.model_dump()
-            logging.info(f"Tokens used: {callback}")
+        generated_content = {}
+        with ThreadPoolExecutor(max_workers=len(self._enabled_artifacts)) as executor:
+            futures = [
+                executor.submit(self._generate_artifact, artifact, prompt_args)
+                for artifact in self._enabled_artifacts
+            ]
+            for future in futures:
+                generated_content.update(future.result())
 
-        # Update response with proper keys.
-        return {
-            "Cover Letter": response["cover_letter"],
-            "Resume": response["resume_summary"],
-            "Missing Keywords": response["missing_keywords"],
-            "Message Content": response["email_content"],
-            "Message Subject": response["email_subject"],
-            "LinkedIn Note": response["linkedin_note"],
-        }
+        return generated_content
+
+    def _generate_artifact(self, artifact: str, prompt_args: Dict[str, str]) -> Dict[str, str]:
+        """
+        Generates a single artifact, going through the cache and the shared rate limiter.
+
+        Args:
+            artifact (str): Name of the artifact.
+            prompt_args (Dict[str, str]): Per-job arguments for the prompt.
+
+        Returns:
+            Dict[str, str]: Generated content of the artifact.
+        """
+        cached_content = self._get_cached_content(artifact, prompt_args)
+        if cached_content is not None:
+            logging.info(f"Using cached {artifact} for job at Company Name {prompt_args['company_name']}")
+            return cached_content
+
+        compacted_prompt_args = self._compact_prompt_arguments(prompt_args)
+        estimated_tokens = (
+            self._static_prompt_tokens[artifact]
+            + sum(len(str(value)) for value in compacted_prompt_args.values()) // 4
+            + self.artifacts[artifact]["estimated_output_tokens"]
+        )
+
+        def invoke_chain() -> BaseMessage:
+            self._rate_limiter.acquire(estimated_tokens)
+            with get_openai_callback() as callback:
+                message = self._chains[artifact].invoke(compacted_prompt_args)
+                logging.info(f"Tokens used for {artifact}: {callback}")
+            return message
+
+        message = call_with_retries(
+            invoke_chain,
+            is_retryable=self._is_retryable_error,
+            max_retries=self._max_retries,
+            get_retry_after=self._get_retry_after,
+            on_retry=self._on_retry,
+        )
+        self._record_token_usage(message)
+        generated_content = self._to_custom_content(artifact, self._output_parsers[artifact].invoke(message).model_dump())
+
+        self._set_cached_content(artifact, prompt_args, generated_content)
+        return generated_content
+
+    @property
+    def enabled_artifacts(self) -> List[str]:
+        """
+        Returns the names of the artifacts that are generated.
+
+        Returns:
+            List[str]: Names of the enabled artifacts.
+        """
+        return list(self._enabled_artifacts)
+
+    def get_cached_content(self, job: pd.Series, artifact: str) -> Optional[Dict[str, str]]:
+        """
+        Returns the cached content of an artifact for the job, if any.
+
+        Args:
+            job (pd.Series): Job data.
+            artifact (str): Name of the artifact.
+
+        Returns:
+            Optional[Dict[str, str]]: Cached content, or None if not cached.
+        """
+        return self._get_cached_content(artifact, self._create_prompt_arguments(job))
+
+    def cache_content(self, job: pd.Series, artifact: str, generated_content: Dict[str, str]) -> None:
+        """
+        Caches content generated outside of generate_custom_content, e.g. through the Batch API.
+
+        Args:
+            job (pd.Series): Job data.
+            artifact (str): Name of the artifact.
+            generated_content (Dict[str, str]): Generated content of the artifact.
+        """
+        self._set_cached_content(artifact, self._create_prompt_arguments(job), generated_content)
+
+    def get_request_key(self, job: pd.Series, artifact: str) -> str:
+        """
+        Returns a key of the prompt of an artifact for the job, e.g. as the custom ID of a Batch API request.
+        Rows share the key only if every per-job prompt input (including the contact name) is the same.
+
+        Args:
+            job (pd.Series): Job data.
+            artifact (str): Name of the artifact.
+
+        Returns:
+            str: Key of the prompt, the cache key of its content.
+        """
+        return self._get_cache_key(artifact, self._create_prompt_arguments(job))
+
+    def render_prompt(self, job: pd.Series, artifact: str) -> str:
+        """
+        Renders the complete prompt of an artifact for the job, e.g. to submit it through the Batch API.
+
+        Args:
+            job (pd.Series): Job data.
+            artifact (str): Name of the artifact.
+
+        Returns:
+            str: Rendered prompt.
+        """
+        return self._prompts[artifact].format(**self._compact_prompt_arguments(self._create_prompt_arguments(job)))
+
+    def parse_response(self, artifact: str, response_text: str) -> Dict[str, str]:
+        """
+        Parses a raw LLM response into the content of an artifact.
+
+        Args:
+            artifact (str): Name of the artifact.
+            response_text (str): Raw text of the LLM response.
+
+        Returns:
+            Dict[str, str]: Generated content of the artifact.
+        """
+        return self._to_custom_content(artifact, self._output_parsers[artifact].parse(response_text).model_dump())
+
+    @classmethod
+    def _to_custom_content(cls, artifact: str, response: Dict[str, str]) -> Dict[str, str]:
+        """
+        Maps the parsed response of an artifact onto the Google Sheet columns.
+
+        Args:
+            artifact (str): Name of the artifact.
+            response (Dict[str, str]): Parsed response.
+
+        Returns:
+            Dict[str, str]: Generated content of the artifact.
+        """
+        return {column: response[key] for key, column in cls.artifacts[artifact]["columns"].items()}
+
+    def _get_cache_key(self, artifact: str, prompt_args: Dict[str, str]) -> str:
+        """
+        Creates the cache key of an artifact for the given per-job prompt arguments.
+        The key holds the raw job description rather than the compacted one, since what compaction
+        removes depends on the other rows of the sheet, and the prompt template, so that changing
+        the prompt invalidates the cached content.
+
+        Args:
+            artifact (str): Name of the artifact.
+            prompt_args (Dict[str, str]): Per-job arguments for the prompt, before compaction.
+
+        Returns:
+            str: Cache key.
+        """
+        return LLMResponseCache.make_key({
+            **prompt_args,
+            **self._create_static_prompt_arguments(),
+            "model_name": self._model_name,
+            "artifact": artifact,
+            "prompt_template": self._prompts[artifact].template,
+        })
+
+    def _get_cached_content(self, artifact: str, prompt_args: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """
+        Looks up cached content of an artifact. Always a miss if caching is disabled.
+        """
+        if self._cache is None:
+            return None
+        return self._cache.get(self._get_cache_key(artifact, prompt_args))
+
+    def _set_cached_content(self, artifact: str, prompt_args: Dict[str, str], generated_content: Dict[str, str]) -> None:
+        """
+        Stores content of an artifact in the cache, if caching is enabled.
+        """
+        if self._cache is not None:
+            self._cache.set(self._get_cache_key(artifact, prompt_args), generated_content)
 
     def _create_prompt_arguments(self, job: pd.Series) -> Dict[str, str]:
         """
-        Creates prompt arguments from job data.
+        Creates the per-job prompt arguments from job data.
 
         Args:
             job (pd.Series): Job data.
@@ -145,11 +434,36 @@ class LLMConnectorClass:
             Dict[str, str]: Arguments for the prompt.
         """
         prompt_args = {
-            # "job_description": trim(job["Description"]),
             "job_description": job["Description"],
             "position": job["Position"],
             "company_name": job["Company Name"],
             "name": job['Contact Name'],
+        }
+
+        return prompt_args
+
+    def _compact_prompt_arguments(self, prompt_args: Dict[str, str]) -> Dict[str, str]:
+        """
+        Compacts the job description of the per-job prompt arguments, if a compactor is set.
+
+        Args:
+            prompt_args (Dict[str, str]): Per-job arguments for the prompt.
+
+        Returns:
+            Dict[str, str]: Arguments for the prompt with the compacted job description.
+        """
+        if self._description_compactor is None:
+            return prompt_args
+        return {**prompt_args, "job_description": self._description_compactor.compact(prompt_args["job_description"])}
+
+    def _create_static_prompt_arguments(self) -> Dict[str, str]:
+        """
+        Creates the prompt arguments shared by every job.
+
+        Returns:
+            Dict[str, str]: Static arguments for the prompt.
+        """
+        return {
             "cover_letter_template": self._prompt_args["cover_letter_template"],
             "resume_template": self._prompt_args["resume_template"],
             "resume_professional_summary": self._prompt_args["resume_professional_summary"],
@@ -157,35 +471,143 @@ class LLMConnectorClass:
             # "linkedin_note_template": self._prompt_args["linkedin_note_template"] if self._use_linkedin else "",
         }
 
-        return prompt_args
+    def _record_token_usage(self, message: BaseMessage) -> None:
+        """
+        Records the input, cached input and output token counts reported for an LLM call.
+
+        Args:
+            message (BaseMessage): Raw LLM response message.
+        """
+        token_usage = getattr(message, "response_metadata", {}).get("token_usage") or {}
+        input_tokens = token_usage.get("prompt_tokens") or 0
+        output_tokens = token_usage.get("completion_tokens") or 0
+        cached_input_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        logging.info(f"Input tokens: {input_tokens} (cached: {cached_input_tokens}), output tokens: {output_tokens}")
+
+        with self._token_usage_lock:
+            self._token_usage["calls"] += 1
+            self._token_usage["input_tokens"] += input_tokens
+            self._token_usage["cached_input_tokens"] += cached_input_tokens
+            self._token_usage["output_tokens"] += output_tokens
+
+    @classmethod
+    def _get_rate_limiter(cls, model_name: str, requests_per_minute: float, tokens_per_minute: float) -> RateLimiter:
+        """
+        Returns the process-wide rate limiter of the model and budget, creating it on first use.
+
+        Args:
+            model_name (str): LLM model name.
+            requests_per_minute (float): Requests per minute budget. No limit if 0.
+            tokens_per_minute (float): Tokens per minute budget. No limit if 0.
+
+        Returns:
+            RateLimiter: Shared rate limiter.
+        """
+        with cls._rate_limiters_lock:
+            key = (model_name, requests_per_minute, tokens_per_minute)
+            if key not in cls._rate_limiters:
+                cls._rate_limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+            return cls._rate_limiters[key]
 
     @staticmethod
-    def _construct_prompt(args: Dict[str, str], output_parser: PydanticOutputParser) -> PromptTemplate:
+    def _get_status_code(error: Exception) -> Optional[int]:
+        """
+        Returns the HTTP status code of an OpenAI error, if any.
+        """
+        return getattr(error, "status_code", None) or getattr(error, "http_status", None)
+
+    @classmethod
+    def _is_retryable_error(cls, error: Exception) -> bool:
+        """
+        Rate limit (429), server (5xx), timeout and connection errors are retried.
+        """
+        status_code = cls._get_status_code(error)
+        if status_code is not None:
+            return status_code == 429 or status_code >= 500
+        return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "Timeout", "RateLimitError")
+
+    @staticmethod
+    def _get_retry_after(error: Exception) -> Optional[float]:
+        """
+        Returns the Retry-After of an OpenAI error in seconds, if any.
+        """
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or getattr(error, "headers", None)
+        return parse_retry_after(headers)
+
+    def _on_retry(self, error: Exception, delay: float) -> None:
+        """
+        Holds back every caller of the shared rate limiter when a rate limit is hit.
+        """
+        with self._token_usage_lock:
+            self._retries += 1
+        if self._get_status_code(error) == 429 or type(error).__name__ == "RateLimitError":
+            self._rate_limiter.pause(delay)
+
+    @property
+    def rate_limit_stats(self) -> Dict[str, float]:
+        """
+        Returns the queue wait metrics of the shared rate limiter and the number of retries of this instance.
+
+        Returns:
+            Dict[str, float]: Acquisitions, pauses, total and maximum queue wait in seconds and retries.
         """
-        Constructs the prompt template.
+        with self._token_usage_lock:
+            retries = self._retries
+        return {**self._rate_limiter.stats, "retries": retries}
+
+    @property
+    def token_usage(self) -> Dict[str, int]:
+        """
+        Returns the token counts accumulated over all LLM calls.
+
+        Returns:
+            Dict[str, int]: Number of calls and input, cached input and output tokens.
+        """
+        with self._token_usage_lock:
+            return dict(self._token_usage)
+
+    @classmethod
+    def _construct_prompt(cls, artifact: str, args: Dict[str, str], output_parser: PydanticOutputParser) -> PromptTemplate:
+        """
+        Constructs the prompt template of an artifact.
 
         Args:
-            args (Dict[str, str]): Arguments for the prompt.
+            artifact (str): Name of the artifact.
+            args (Dict[str, str]): Static arguments for the prompt.
             output_parser (PydanticOutputParser): Parser for the LLM response.
 
         Returns:
             PromptTemplate: Constructed prompt template.
         """
         return PromptTemplate(
-            template=LLMConnectorClass.prompt_template,
-            input_variables=list(args.keys()),
-            partial_variables={"format_instructions": output_parser.get_format_instructions()},
+            template=cls.prompt_header + cls.artifact_prompts[artifact] + cls.prompt_footer,
+            input_variables=["job_description", "position", "company_name", "name"],
+            partial_variables={**args, "format_instructions": output_parser.get_format_instructions()},
         )
 
-    @staticmethod
-    def _select_output_parser() -> PydanticOutputParser:
+    @classmethod
+    def _select_output_parser(cls, artifact: str) -> PydanticOutputParser:
         """
-        Selects the appropriate output parser.
+        Selects the appropriate output parser of an artifact.
+
+        Args:
+            artifact (str): Name of the artifact.
 
         Returns:
             PydanticOutputParser: Output parser for the LLM response.
         """
-        return PydanticOutputParser(pydantic_object=CustomJobApplicationMaterials)
+        return PydanticOutputParser(pydantic_object=cls.artifacts[artifact]["model"])
+
+    @property
+    def model_name(self) -> str:
+        """
+        Returns the name of the LLM model.
+
+        Returns:
+            str: LLM model name.
+        """
+        return self._model_name
 
     @property
     def llm_client(self) -> ChatOpenAI:
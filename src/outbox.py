@@ -0,0 +1,354 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from src.rate_limiter import backoff_delay
+
+# The email dispatcher and the LinkedIn handler are only needed to drain the outbox
+if TYPE_CHECKING:
+    from src.email_dispatcher import EmailDispatcher
+    from src.linkedin_handler import LinkedInConnectorClass
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+# Channels of the messages of the outbox
+EMAIL_CHANNEL = "email"
+LINKEDIN_CHANNEL = "linkedin"
+
+# Suffix of the messages claimed by a drain, in tmp/ until they are sent, released or failed
+CLAIM_SUFFIX = ".sending"
+
+# Seconds between two LinkedIn connection requests
+LINKEDIN_REQUEST_INTERVAL = 5
+
+
+class Outbox:
+    """
+    Maildir-style on-disk spool of the rendered messages waiting to be sent.
+
+    - tmp/: messages being written, and messages claimed by a drain that is sending them.
+    - new/: messages waiting to be sent.
+    - cur/: messages sent, kept as the record that they were.
+    - failed/: messages that failed for good.
+
+    Every message is a JSON file named after its idempotency key, and moves between the folders with atomic
+    renames, so a crash never loses a message or leaves a half-written one in new/. A message whose key is
+    already in the outbox, in any folder, is not queued again.
+    """
+
+    def __init__(self, outbox_path: str):
+        """
+        Open (or create) the outbox.
+
+        Args:
+            outbox_path (str): Folder of the outbox.
+        """
+        self.outbox_path = outbox_path
+        for folder in ("tmp", "new", "cur", "failed"):
+            os.makedirs(os.path.join(outbox_path, folder), exist_ok=True)
+
+    @staticmethod
+    def make_key(channel: str, job_key: str, recipient: str) -> str:
+        """
+        Create the idempotency key of a message: one message per channel, job row and recipient.
+
+        Args:
+            channel (str): Channel of the message, email or linkedin.
+            job_key (str): Key of the job row, see JobJournal.make_key.
+            recipient (str): Email address or LinkedIn profile URL of the recipient.
+
+        Returns:
+            str: Idempotency key.
+        """
+        return hashlib.sha1("\x1f".join([channel, job_key, recipient.strip().lower()]).encode("utf-8")).hexdigest()
+
+    def _path(self, folder: str, key: str, suffix: str = "") -> str:
+        return os.path.join(self.outbox_path, folder, f"{key}.json{suffix}")
+
+    def _write(self, folder: str, message: Dict[str, Any]) -> None:
+        """Write a message to a folder atomically, through tmp/."""
+        temporary_path = self._path("tmp", message["key"], f".{os.getpid()}.tmp")
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(message, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self._path(folder, message["key"]))
+
+    def state(self, key: str) -> Optional[str]:
+        """
+        Get the state of a message.
+
+        Args:
+            key (str): Idempotency key of the message.
+
+        Returns:
+            Optional[str]: new, sending, cur or failed, None if the message is not in the outbox.
+        """
+        for folder in ("cur", "failed", "new"):
+            if os.path.exists(self._path(folder, key)):
+                return folder
+        if os.path.exists(self._path("tmp", key, CLAIM_SUFFIX)):
+            return "sending"
+        return None
+
+    def enqueue(self, message: Dict[str, Any]) -> bool:
+        """
+        Queue a rendered message, unless a message with the same key is already in the outbox.
+
+        Args:
+            message (Dict[str, Any]): Message with its key, channel, recipient and content (and subject for emails).
+
+        Returns:
+            bool: Whether the message was queued.
+        """
+        if self.state(message["key"]) is not None:
+            return False
+        self._write("new", {**message, "attempts": 0, "not_before": 0.0, "enqueued_at": time.time()})
+        return True
+
+    def claim(self, channel: str) -> List[Dict[str, Any]]:
+        """
+        Claim the messages of a channel that are due, oldest first, moving them from new/ to tmp/.
+        A message claimed by another drain at the same time is skipped.
+
+        Args:
+            channel (str): Channel of the messages.
+
+        Returns:
+            List[Dict[str, Any]]: Claimed messages.
+        """
+        messages = []
+        now = time.time()
+        for file_name in os.listdir(os.path.join(self.outbox_path, "new")):
+            if not file_name.endswith(".json"):
+                continue
+            key = file_name[:-len(".json")]
+            try:
+                with open(self._path("new", key), "r", encoding="utf-8") as file:
+                    message = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if message.get("channel") != channel or message.get("not_before", 0) > now:
+                continue
+            try:
+                os.rename(self._path("new", key), self._path("tmp", key, CLAIM_SUFFIX))
+            except FileNotFoundError:
+                continue
+            # The age of a claim tells whether its drain stopped, see recover_claims
+            os.utime(self._path("tmp", key, CLAIM_SUFFIX))
+            messages.append(message)
+        return sorted(messages, key=lambda message: message.get("enqueued_at", 0))
+
+    def complete(self, message: Dict[str, Any]) -> None:
+        """Record a claimed message as sent."""
+        self._write("cur", {**message, "sent_at": time.time()})
+        os.remove(self._path("tmp", message["key"], CLAIM_SUFFIX))
+
+    def release(self, message: Dict[str, Any], error: str = "", delay: float = 0.0, count_attempt: bool = True) -> None:
+        """Put a claimed message back in new/, to be sent by a later drain no earlier than delay seconds from now."""
+        attempts = message.get("attempts", 0) + (1 if count_attempt else 0)
+        self._write("new", {**message, "attempts": attempts, "not_before": time.time() + delay, "last_error": error})
+        os.remove(self._path("tmp", message["key"], CLAIM_SUFFIX))
+
+    def fail(self, message: Dict[str, Any], error: str) -> None:
+        """Record a claimed message as failed for good."""
+        self._write("failed", {**message, "attempts": message.get("attempts", 0) + 1, "last_error": error, "failed_at": time.time()})
+        os.remove(self._path("tmp", message["key"], CLAIM_SUFFIX))
+
+    def recover_claims(self, max_age_seconds: float = 3600) -> int:
+        """
+        Put the messages claimed by a drain that stopped before finishing back in new/.
+        A message the drain sent before it stopped may be sent again.
+
+        Args:
+            max_age_seconds (float): Age of a claim after which its drain is assumed to have stopped.
+
+        Returns:
+            int: Number of messages recovered.
+        """
+        recovered = 0
+        tmp_folder = os.path.join(self.outbox_path, "tmp")
+        for file_name in os.listdir(tmp_folder):
+            path = os.path.join(tmp_folder, file_name)
+            if not file_name.endswith(CLAIM_SUFFIX) or time.time() - os.path.getmtime(path) < max_age_seconds:
+                continue
+            key = file_name[:-len(".json" + CLAIM_SUFFIX)]
+            os.replace(path, self._path("new", key))
+            recovered += 1
+        if recovered:
+            logger.warning(f"Recovered {recovered} messages claimed by a drain that did not finish.")
+        return recovered
+
+    def retry_failed(self) -> int:
+        """
+        Queue the failed messages again, with their attempts reset.
+
+        Returns:
+            int: Number of messages queued again.
+        """
+        retried = 0
+        for file_name in os.listdir(os.path.join(self.outbox_path, "failed")):
+            key = file_name[:-len(".json")]
+            with open(self._path("failed", key), "r", encoding="utf-8") as file:
+                message = json.load(file)
+            self._write("new", {**message, "attempts": 0, "not_before": 0.0})
+            os.remove(self._path("failed", key))
+            retried += 1
+        return retried
+
+    def counts(self) -> Dict[str, int]:
+        """Number of messages waiting, being sent, sent and failed."""
+        counts = {
+            folder: sum(1 for file_name in os.listdir(os.path.join(self.outbox_path, folder)) if file_name.endswith(".json"))
+            for folder in ("new", "cur", "failed")
+        }
+        counts["sending"] = sum(
+            1 for file_name in os.listdir(os.path.join(self.outbox_path, "tmp")) if file_name.endswith(CLAIM_SUFFIX)
+        )
+        return counts
+
+
+class OutboxDrainer:
+    """
+    Sends the messages of an Outbox: the emails through an EmailDispatcher and the LinkedIn notes through
+    a LinkedIn handler. A message failing with a transient error goes back to the outbox for a later drain,
+    until it has been tried max_attempts times.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        email_dispatcher: Optional["EmailDispatcher"] = None,
+        linkedin_handler: Optional["LinkedInConnectorClass"] = None,
+        max_attempts: int = 5,
+        retry_base_delay: float = 300.0,
+    ):
+        """
+        Args:
+            outbox (Outbox): Outbox to drain.
+            email_dispatcher (Optional[EmailDispatcher]): Dispatcher sending the emails. Emails are left queued if None.
+            linkedin_handler (Optional[LinkedInConnectorClass]): Logged in LinkedIn handler. Notes are left queued if None.
+            max_attempts (int): Drains a message is tried in before it fails for good.
+            retry_base_delay (float): Delay before the first retry of a message by a later drain, in seconds.
+        """
+        self.outbox = outbox
+        self.email_dispatcher = email_dispatcher
+        self.linkedin_handler = linkedin_handler
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+
+    def _retry_or_fail(self, message: Dict[str, Any], error: str, transient: bool) -> str:
+        if transient and message.get("attempts", 0) + 1 < self.max_attempts:
+            delay = backoff_delay(message.get("attempts", 0), self.retry_base_delay, 24 * 3600)
+            self.outbox.release(message, error, delay)
+            return "retried"
+        self.outbox.fail(message, error)
+        return "failed"
+
+    def drain(self) -> Dict[str, int]:
+        """
+        Send the messages that are due.
+
+        Returns:
+            Dict[str, int]: Number of messages sent, put back for a later drain (retried or deferred) and failed.
+        """
+        from src.email_dispatcher import DEFERRED, SENT
+
+        counts = {"sent": 0, "retried": 0, "deferred": 0, "failed": 0}
+        counts_lock = threading.Lock()
+        self.outbox.recover_claims()
+
+        if self.email_dispatcher is not None:
+            messages = self.outbox.claim(EMAIL_CHANNEL)
+            if messages:
+                logger.info(f"Sending {len(messages)} queued emails...")
+
+            def record_email_result(message: Dict[str, Any], result: Dict[str, Any]) -> None:
+                if result["status"] == SENT:
+                    self.outbox.complete(message)
+                    outcome = "sent"
+                elif result["status"] == DEFERRED:
+                    # The daily quota is used up, not the fault of the message
+                    self.outbox.release(message, "Daily quota reached", count_attempt=False)
+                    outcome = "deferred"
+                else:
+                    outcome = self._retry_or_fail(message, result["error"], result["transient"])
+                # Called from the sending threads of the dispatcher
+                with counts_lock:
+                    counts[outcome] += 1
+
+            self.email_dispatcher.dispatch(messages, on_result=record_email_result)
+
+        if self.linkedin_handler is not None:
+            messages = self.outbox.claim(LINKEDIN_CHANNEL)
+            if messages:
+                logger.info(f"Sending {len(messages)} queued LinkedIn connection requests...")
+            for message in messages:
+                try:
+                    self.linkedin_handler.send_connection_request(profile_url=message["recipient"], note=message["content"])
+                    self.outbox.complete(message)
+                    counts["sent"] += 1
+                except Exception as e:
+                    logger.warning(f"Failed to send LinkedIn connection request to {message['recipient']}. Error: {str(e)}")
+                    # Selenium errors are mostly transient (page loads, stale elements)
+                    counts[self._retry_or_fail(message, str(e), transient=True)] += 1
+                time.sleep(LINKEDIN_REQUEST_INTERVAL)
+
+        logger.info(
+            f"Outbox drained: {counts['sent']} sent, {counts['retried']} to retry, {counts['deferred']} deferred, "
+            f"{counts['failed']} failed. {self.outbox.counts()['new']} messages waiting."
+        )
+        return counts
+
+
+def drain_outbox(
+    outbox: Outbox, options: Dict[str, Any], linkedin_handler: Optional["LinkedInConnectorClass"] = None
+) -> Dict[str, int]:
+    """
+    Drain an outbox with the email settings of a run, and a logged in LinkedIn handler if given.
+
+    Args:
+        outbox (Outbox): Outbox to drain.
+        options (Dict[str, Any]): Validated arguments of the run, see src.utils.validate_arguments.
+        linkedin_handler (Optional[LinkedInConnectorClass]): Logged in LinkedIn handler. Notes are left queued if None.
+
+    Returns:
+        Dict[str, int]: Number of messages sent, retried, deferred and failed.
+    """
+    email_handler, email_dispatcher = None, None
+    if options.get("USE_GMAIL"):
+        from src.email_dispatcher import create_email_dispatcher
+        email_handler, email_dispatcher = create_email_dispatcher(options)
+    try:
+        drainer = OutboxDrainer(outbox, email_dispatcher, linkedin_handler, max_attempts=options["OUTBOX_MAX_ATTEMPTS"])
+        return drainer.drain()
+    finally:
+        if email_handler is not None:
+            email_handler.close()
+
+
+def run_outbox_drain(options: Dict[str, Any]) -> None:
+    """
+    Drain the outbox of a run once or, with OUTBOX_DRAIN_INTERVAL, every OUTBOX_DRAIN_INTERVAL seconds until interrupted.
+    The statuses of the rows are updated from the outbox by the next run of the pipeline.
+
+    Args:
+        options (Dict[str, Any]): Validated arguments of the run, see src.utils.validate_arguments.
+    """
+    outbox = Outbox(options["OUTBOX_PATH"])
+    linkedin_handler = None
+    if options.get("USE_LINKEDIN"):
+        from src.linkedin_handler import LinkedInConnectorClass
+        linkedin_handler = LinkedInConnectorClass(options["CHROMEDRIVER_PATH"], options["INTERACTIVE"])
+        linkedin_handler.login(options["LINKEDIN_USERNAME"], options["LINKEDIN_PASSWORD"])
+
+    while True:
+        drain_outbox(outbox, options, linkedin_handler)
+        if options["OUTBOX_DRAIN_INTERVAL"] <= 0:
+            return
+        time.sleep(options["OUTBOX_DRAIN_INTERVAL"])
@@ -0,0 +1,203 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at a fixed rate per minute.
+
+    Callers reserve tokens up front and are told how long to wait for them, so the bucket can go
+    negative and concurrent callers are served in the order they reserved.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute (float): Tokens added per minute.
+            capacity (Optional[float]): Maximum burst. Defaults to a tenth of the per-minute rate.
+        """
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 10)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """
+        Reserve tokens.
+
+        Args:
+            amount (float): Number of tokens to reserve.
+
+        Returns:
+            float: Seconds to wait before the reserved tokens are available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+            self._updated_at = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+
+class RateLimiter:
+    """
+    Budgets requests and (estimated) tokens per minute across all threads of the process.
+
+    A rate of 0 disables the corresponding budget. The limiter can be paused, e.g. when the
+    server answers with a Retry-After header, which holds back every caller.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        """
+        Args:
+            requests_per_minute (float): Maximum number of requests per minute. No limit if 0.
+            tokens_per_minute (float): Maximum number of tokens per minute. No limit if 0.
+        """
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"acquisitions": 0, "total_wait": 0.0, "max_wait": 0.0, "pauses": 0}
+
+    def acquire(self, tokens: float = 0) -> float:
+        """
+        Block until a request with the given number of tokens fits in the budget.
+
+        Args:
+            tokens (float): Estimated number of tokens of the request.
+
+        Returns:
+            float: Seconds spent waiting in the queue.
+        """
+        with self._lock:
+            wait = max(0.0, self._paused_until - time.monotonic())
+        if self._request_bucket is not None:
+            wait = max(wait, self._request_bucket.reserve(1))
+        if self._token_bucket is not None and tokens:
+            wait = max(wait, self._token_bucket.reserve(tokens))
+
+        if wait > 0:
+            time.sleep(wait)
+
+        with self._lock:
+            self._stats["acquisitions"] += 1
+            self._stats["total_wait"] += wait
+            self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back every caller for the given number of seconds.
+
+        Args:
+            seconds (float): Pause duration.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._stats["pauses"] += 1
+
+    @property
+    def stats(self) -> dict:
+        """Number of acquisitions and pauses, total and maximum queue wait in seconds."""
+        with self._lock:
+            return dict(self._stats)
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter.
+
+    Args:
+        attempt (int): Number of the retry, starting at 0.
+        base_delay (float): Delay of the first retry in seconds.
+        max_delay (float): Upper bound of the delay in seconds.
+
+    Returns:
+        float: Seconds to wait before the retry.
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Parse the Retry-After (or retry-after-ms) header of a response.
+
+    Args:
+        headers: Response headers (any mapping with a case-insensitive get).
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retries(
+    func: Callable,
+    is_retryable: Callable[[Exception], bool],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    get_retry_after: Optional[Callable[[Exception], Optional[float]]] = None,
+    on_retry: Optional[Callable[[Exception, float], None]] = None,
+):
+    """
+    Call a function, retrying retryable errors with jittered exponential backoff.
+    A Retry-After returned by get_retry_after takes precedence over the backoff delay.
+
+    Args:
+        func (Callable): Function to call without arguments.
+        is_retryable (Callable[[Exception], bool]): Whether an error is worth retrying.
+        max_retries (int): Maximum number of retries.
+        base_delay (float): Delay of the first retry in seconds.
+        max_delay (float): Upper bound of the backoff delay in seconds.
+        get_retry_after (Optional[Callable[[Exception], Optional[float]]]): Extracts the Retry-After of an error.
+        on_retry (Optional[Callable[[Exception, float], None]]): Called with the error and the delay before each retry.
+
+    Returns:
+        The return value of func.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            retry_after = get_retry_after(e) if get_retry_after is not None else None
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, base_delay)
+            else:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+            if on_retry is not None:
+                on_retry(e, delay)
+            logger.warning(f"Retrying in {delay:.1f}s after error: {str(e)}")
+            time.sleep(delay)
+            attempt += 1
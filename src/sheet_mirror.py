@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+
+class SheetMirror:
+    """
+    Local SQLite mirror of the last read values of each Google Sheet.
+
+    The mirror is stored together with the Drive modifiedTime of the spreadsheet, so a run can
+    skip downloading a sheet that did not change since the last run. A sheet written to is forgotten.
+    """
+
+    def __init__(self, mirror_path: str):
+        """
+        Open (or create) the mirror database.
+
+        Args:
+            mirror_path (str): Path to the SQLite mirror file.
+        """
+        self.mirror_path = mirror_path
+        self._lock = threading.Lock()
+
+        mirror_folder = os.path.dirname(mirror_path)
+        if mirror_folder:
+            os.makedirs(mirror_folder, exist_ok=True)
+
+        self._connection = sqlite3.connect(mirror_path, check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sheets (
+                gsheet_name TEXT PRIMARY KEY,
+                modified_time TEXT NOT NULL,
+                header TEXT NOT NULL,
+                partial INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sheet_rows (
+                gsheet_name TEXT NOT NULL,
+                row_index INTEGER NOT NULL,
+                cells TEXT NOT NULL,
+                PRIMARY KEY (gsheet_name, row_index)
+            );
+            """
+        )
+        self._connection.commit()
+
+    def load(self, gsheet_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the mirrored snapshot of a sheet.
+
+        Args:
+            gsheet_name (str): Name of the Google Sheet.
+
+        Returns:
+            Optional[Dict[str, Any]]: modified_time, header, partial and the cells of each row keyed
+            by dataframe index, or None if the sheet is not mirrored.
+        """
+        with self._lock:
+            sheet = self._connection.execute(
+                "SELECT modified_time, header, partial FROM sheets WHERE gsheet_name = ?", (gsheet_name,)
+            ).fetchone()
+            if sheet is None:
+                return None
+            rows = self._connection.execute(
+                "SELECT row_index, cells FROM sheet_rows WHERE gsheet_name = ? ORDER BY row_index", (gsheet_name,)
+            ).fetchall()
+
+        modified_time, header, partial = sheet
+        return {
+            "modified_time": modified_time,
+            "header": json.loads(header),
+            "partial": bool(partial),
+            "cells": {row_index: json.loads(cells) for row_index, cells in rows},
+        }
+
+    def save(self, gsheet_name: str, modified_time: str, snapshot: Dict[str, Any]) -> None:
+        """
+        Replace the mirrored snapshot of a sheet.
+
+        Args:
+            gsheet_name (str): Name of the Google Sheet.
+            modified_time (str): Drive modifiedTime of the spreadsheet the snapshot is current for.
+            snapshot (Dict[str, Any]): header, partial and the cells of each row keyed by dataframe index.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM sheet_rows WHERE gsheet_name = ?", (gsheet_name,))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sheets (gsheet_name, modified_time, header, partial) VALUES (?, ?, ?, ?)",
+                (gsheet_name, modified_time, json.dumps(snapshot["header"]), int(snapshot["partial"])),
+            )
+            self._connection.executemany(
+                "INSERT INTO sheet_rows (gsheet_name, row_index, cells) VALUES (?, ?, ?)",
+                [
+                    (gsheet_name, int(row_index), json.dumps(cells, ensure_ascii=False, default=str))
+                    for row_index, cells in snapshot["cells"].items()
+                ],
+            )
+        logger.info(f"Mirrored {len(snapshot['cells'])} rows of Google Sheet '{gsheet_name}' at {modified_time}.")
+
+    def invalidate(self, gsheet_name: str) -> None:
+        """
+        Forget the mirrored snapshot of a sheet, e.g. after writing to it.
+
+        Args:
+            gsheet_name (str): Name of the Google Sheet.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM sheet_rows WHERE gsheet_name = ?", (gsheet_name,))
+            self._connection.execute("DELETE FROM sheets WHERE gsheet_name = ?", (gsheet_name,))
+
+    def close(self) -> None:
+        """Close the mirror database."""
+        with self._lock:
+            self._connection.close()
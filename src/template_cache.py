@@ -0,0 +1,202 @@
+import copy
+import io
+import logging
+import os
+import threading
+import zipfile
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# python-docx, docxtpl and jinja2 are imported on first use, this module is imported by src.utils
+
+# Setting up logger
+logger = logging.getLogger(__name__)
+
+# Fixed timestamp of the zip entries of the saved documents, so the same document always gives the same bytes
+DOCX_ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Compiled Jinja templates kept per template cache; a resume has a body and a few headers and footers
+MAX_COMPILED_TEMPLATES = 64
+
+
+class _FixedTimestampZipWriter:
+    """Physical package writer of python-docx writing the zip entries with a fixed timestamp."""
+
+    def __init__(self, file):
+        self._zipfile = zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, pack_uri, blob: bytes) -> None:
+        entry = zipfile.ZipInfo(pack_uri.membername, date_time=DOCX_ENTRY_DATE_TIME)
+        entry.compress_type = zipfile.ZIP_DEFLATED
+        # Permissions given by ZipFile.writestr to the entries written by python-docx
+        entry.external_attr = 0o600 << 16
+        self._zipfile.writestr(entry, blob)
+
+    def close(self) -> None:
+        self._zipfile.close()
+
+
+def save_docx(document) -> bytes:
+    """
+    Save a python-docx Document to bytes with fixed timestamps of its zip entries.
+
+    Unlike Document.save, saving the same document twice gives the same bytes (and the same md5Checksum
+    in Google Drive), without rewriting the saved package.
+
+    Args:
+        document (docx.document.Document): Document to save.
+
+    Returns:
+        bytes: Content of the .docx file.
+    """
+    from docx.opc.pkgwriter import PackageWriter
+
+    package = document.part.package
+    parts = list(package.iter_parts())
+    content = io.BytesIO()
+    writer = _FixedTimestampZipWriter(content)
+    # Same entries in the same order as PackageWriter.write, which opens its own zip file
+    PackageWriter._write_content_types_stream(writer, parts)
+    PackageWriter._write_pkg_rels(writer, package.rels)
+    PackageWriter._write_parts(writer, parts)
+    writer.close()
+    return content.getvalue()
+
+
+def _compiling_environment_class():
+    """Jinja Environment keeping the templates compiled from source strings."""
+    from jinja2 import Environment
+
+    class CompiledTemplateEnvironment(Environment):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._compiled_templates = {}
+            self._compiled_templates_lock = threading.Lock()
+
+        def from_string(self, source, globals=None, template_class=None):
+            if globals or template_class:
+                return super().from_string(source, globals, template_class)
+            with self._compiled_templates_lock:
+                template = self._compiled_templates.get(source)
+            if template is None:
+                template = super().from_string(source)
+                with self._compiled_templates_lock:
+                    if len(self._compiled_templates) >= MAX_COMPILED_TEMPLATES:
+                        self._compiled_templates.clear()
+                    self._compiled_templates[source] = template
+            return template
+
+    return CompiledTemplateEnvironment
+
+
+class TemplateCache:
+    """
+    Per-process cache of the parsed .docx templates.
+
+    Each file is unzipped and parsed once, and parsed again only when its modification time or size changes.
+    Documents are rendered from a deep copy of the parsed package, and the Jinja templates docxtpl builds
+    from the document XML are compiled once. The cached documents are shared and must not be modified.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[Tuple[int, int]], Any]] = {}
+        self._lock = threading.Lock()
+        self._jinja_env = None
+        self._stats = {"loads": 0, "hits": 0}
+
+    @staticmethod
+    def _file_stamp(path: Optional[str]) -> Optional[Tuple[int, int]]:
+        if path is None:
+            return None
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _get(self, kind: str, path: Optional[str], load: Callable[[], Any]) -> Any:
+        stamp = self._file_stamp(path)
+        key = (kind, path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._stats["hits"] += 1
+                return entry[1]
+        # Parsed outside of the lock, two threads loading the same file at once keep one of the results
+        value = load()
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._stats["loads"] += 1
+        if path is not None:
+            logger.debug(f"Parsed template {path}.")
+        return value
+
+    def document(self, path: Optional[str] = None):
+        """
+        Get the parsed document of a .docx file, shared by all callers and not to be modified.
+
+        Args:
+            path (Optional[str]): Path to the .docx file. Defaults to the blank document of python-docx.
+
+        Returns:
+            docx.document.Document: Parsed document.
+        """
+        import docx
+        return self._get("document", path, lambda: docx.Document(path))
+
+    def text(self, path: str) -> str:
+        """
+        Get the text of the paragraphs of a .docx file.
+
+        Args:
+            path (str): Path to the .docx file.
+
+        Returns:
+            str: Text of the paragraphs, joined without separators.
+        """
+        return self._get("text", path, lambda: "".join(paragraph.text for paragraph in self.document(path).paragraphs))
+
+    def clone(self, path: Optional[str] = None):
+        """
+        Get a copy of the parsed document of a .docx file, to be modified.
+
+        Args:
+            path (Optional[str]): Path to the .docx file. Defaults to the blank document of python-docx.
+
+        Returns:
+            docx.document.Document: Copy of the parsed document.
+        """
+        return copy.deepcopy(self.document(path))
+
+    def render(self, path: str, context: Dict[str, Any]) -> bytes:
+        """
+        Render a docxtpl template with the given variables.
+
+        Args:
+            path (str): Path to the .docx template.
+            context (Dict[str, Any]): Jinja variables of the template.
+
+        Returns:
+            bytes: Content of the rendered .docx file.
+        """
+        import docxtpl
+
+        template = docxtpl.DocxTemplate(path)
+        # docxtpl only loads the file when no document is set yet
+        template.docx = self.clone(path)
+        template.render(context, self.jinja_env)
+        return save_docx(template.docx)
+
+    @property
+    def jinja_env(self):
+        """Jinja environment compiling each template source once."""
+        with self._lock:
+            if self._jinja_env is None:
+                self._jinja_env = _compiling_environment_class()()
+            return self._jinja_env
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Number of files parsed and of cache hits."""
+        with self._lock:
+            return dict(self._stats)
+
+
+# Shared by the jobs rendered in this process
+TEMPLATE_CACHE = TemplateCache()
@@ -1,39 +1,125 @@
+import hashlib
+import json
 import logging
 import os
 import re
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-import docx
-import docxtpl
-import pandas as pd
 from dotenv import find_dotenv, load_dotenv
 
-from src.google_drive_handler import GoogleDriveHandler
+# pandas, python-docx and the Google Drive client are only needed once jobs are processed,
+# validate_arguments is imported at startup
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from src.artifact_pipeline import (ArtifactMemoryBudget, DocumentRenderPool,
+                                       LocalCopyWriter)
+    from src.google_drive_handler import GoogleDriveHandler
 
 # Setting up logger
 logger = logging.getLogger(__name__)
 
+# Checksums and Google Drive IDs of the files uploaded from a job folder
+MANIFEST_FILE_NAME = ".drive_manifest.json"
+
+# Generated columns of a job its documents are rendered from
+DOCUMENT_COLUMNS = ["Resume", "Cover Letter", "Message Subject", "Message Content", "LinkedIn Note"]
+
 TEMPLATES = ["cover_letter_template", "resume_template", "email_template", "linkedin_note_template"]
 
+# Optional arguments and their default values
+OPTIONAL_ARGUMENTS = {
+    "LLM_CONCURRENCY": 1,
+    "LLM_REQUESTS_PER_MINUTE": 0,
+    "LLM_TOKENS_PER_MINUTE": 0,
+    "LLM_MAX_RETRIES": 6,
+    "NO_LLM_CACHE": False,
+    "LLM_CACHE_PATH": ".aijobapply/llm_cache.sqlite",
+    "LLM_CACHE_MAX_ENTRIES": 5000,
+    "LLM_CACHE_MAX_AGE_DAYS": 30.0,
+    "NO_DESCRIPTION_COMPACTION": False,
+    "DESCRIPTION_TOKEN_BUDGET": 1500,
+    "NO_DUPLICATE_REUSE": False,
+    "DUPLICATE_SIMILARITY_THRESHOLD": 0.9,
+    "LLM_BATCH_MODE": False,
+    "LLM_BATCH_STATE_PATH": ".aijobapply/llm_batch.json",
+    "LLM_BATCH_API_BASE_URL": "https://api.openai.com/v1",
+    "LLM_BATCH_POLL_INTERVAL": 60.0,
+    "LLM_BATCH_MAX_WAIT_MINUTES": 1440.0,
+    "SMTP_HOST": "smtp.gmail.com",
+    "SMTP_PORT": 587,
+    "SMTP_STARTTLS": True,
+    "SMTP_MAX_MESSAGES_PER_CONNECTION": 100,
+    "EMAIL_CONCURRENCY": 1,
+    "EMAIL_MESSAGES_PER_MINUTE": 0,
+    "EMAIL_DAILY_LIMIT": 0,
+    "EMAIL_QUOTA_STATE_PATH": ".aijobapply/email_quota.json",
+    "EMAIL_MAX_RETRIES": 3,
+    "USE_OUTBOX": False,
+    "OUTBOX_PATH": ".aijobapply/outbox",
+    "OUTBOX_SEPARATE_DRAIN": False,
+    "OUTBOX_MAX_ATTEMPTS": 5,
+    "DRAIN_OUTBOX": False,
+    "OUTBOX_DRAIN_INTERVAL": 0.0,
+    "READ_PENDING_ROWS_ONLY": False,
+    "USE_SHEET_MIRROR": False,
+    "SHEET_MIRROR_PATH": ".aijobapply/sheet_mirror.sqlite",
+    "NO_JOB_JOURNAL": False,
+    "JOB_JOURNAL_PATH": ".aijobapply/job_journal.sqlite",
+    "JOURNAL_FLUSH_INTERVAL": 60.0,
+    "ARCHIVE_AFTER_DAYS": 0,
+    "DRIVE_UPLOAD_CONCURRENCY": 4,
+    "DRIVE_FOLDER_INDEX_PATH": ".aijobapply/drive_folder_index.json",
+    "IN_MEMORY_ARTIFACTS": False,
+    "WRITE_LOCAL_COPIES": False,
+    "ARTIFACT_MEMORY_LIMIT_MB": 64.0,
+    "RENDER_PROCESSES": 0,
+}
+
+
 def get_file_content(path: str) -> str:
-    """Get the content of a file."""
+    """Get the content of a file, parsed once per process while the file is unchanged."""
     try:
         # Ensure the file is .docx only
         if not path.endswith((".docx")):
             raise ValueError("Only .docx files are supported.")
 
         # Read the entire docx file as a string
-        doc = docx.Document(path)
-        content = "".join([paragraph.text for paragraph in doc.paragraphs])
-        return content
+        from src.template_cache import TEMPLATE_CACHE
+        return TEMPLATE_CACHE.text(path)
     except Exception as e:
         logger.exception(f"Error reading file: {e}")
         return ""
 
 
-def create_job_folder(job:pd.Series, resume_path:str, google_drive_handler:GoogleDriveHandler, destination:str = "Job Applications"):
+def get_job_key(job: "pd.Series") -> str:
+    """
+    Get a stable key identifying a job posting across runs, independent of its row in the Google Sheet.
+    """
+    fields = [str(job.get(column, "")) for column in ("Company Name", "Position", "Description")]
+    return hashlib.sha1("\x1f".join(fields).encode("utf-8")).hexdigest()
+
+
+def create_job_folder(
+    job: "pd.Series",
+    resume_path: str,
+    google_drive_handler: "GoogleDriveHandler",
+    destination: str = "Job Applications",
+    in_memory: bool = False,
+    memory_budget: Optional["ArtifactMemoryBudget"] = None,
+    local_copy_writer: Optional["LocalCopyWriter"] = None,
+    render_pool: Optional["DocumentRenderPool"] = None,
+):
     """
     Create a folder for the job application process.
     Add relevant files to the folder.
+    The documents are rendered in memory and uploaded from memory, only the new or changed ones,
+    checked against the manifest of the folder and the md5Checksum of the files in Google Drive.
+    Local copies are written to the job folder, unless in_memory is set: then they are only written,
+    in the background, by local_copy_writer if one is given.
+    The documents count against memory_budget from before they are rendered until they are uploaded.
+    The documents are rendered by render_pool if one is given, else in the calling thread.
     """
     # Create a folder for the job application
     # Name the folder as CompanyName_Position, no special characters or spaces. Add an underscore between company name and position
@@ -41,42 +127,118 @@ def create_job_folder(job:pd.Series, resume_path:str, google_drive_handler:Googl
     position = re.sub(r"\W+", "", job["Position"])
     job_name = f"{company_name}_{position}"
     job_folder = f"{destination}/{job_name}"
-    if os.path.exists(job_folder):
-        import shutil
-        shutil.rmtree(job_folder)
-    os.makedirs(job_folder, exist_ok=True)
 
     # Get the ID of the job folder (Creating the folder if it doesn't exist)
     job_folder_id = google_drive_handler.get_folder(job_name, google_drive_handler.job_root_folder_id)
 
-    # Load the resume and replace jinja2 variables
+    # Without local copies, the files in Google Drive are compared with their md5Checksum
+    manifest_path = os.path.join(job_folder, MANIFEST_FILE_NAME)
+    manifest = None
+    if (not in_memory or local_copy_writer is not None) and os.path.isfile(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+
+    # The documents count against the memory budget from before they are rendered, with an estimate
+    # until their size is known, until they are uploaded
+    with memory_budget.reserve() if memory_budget is not None else nullcontext() as reservation:
+        if render_pool is not None:
+            files = render_pool.render(get_document_payload(job))
+        else:
+            files = render_job_documents(job, resume_path)
+        if reservation is not None:
+            reservation.resize(sum(len(content) for _, content in files))
+
+        # The files of the job are uploaded concurrently, in about the time of a single upload,
+        # and only the new or changed ones are uploaded
+        manifest = google_drive_handler.sync_files(files, job_folder_id, manifest)
+
+    if not in_memory:
+        os.makedirs(job_folder, exist_ok=True)
+        for file_name, content in files:
+            write_file_if_changed(os.path.join(job_folder, file_name), content)
+        write_file_if_changed(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    elif local_copy_writer is not None:
+        local_copy_writer.submit(job_folder, files, manifest)
+
+
+def render_job_documents(job: "pd.Series", resume_path: str) -> List[Tuple[str, bytes]]:
+    """
+    Render the documents of a job in memory: the resume, the cover letter and, when generated,
+    the email and the LinkedIn note. Returns the file name and content of each document.
+    """
+    return render_documents(get_document_payload(job), resume_path)
+
+
+def get_document_payload(job: "pd.Series") -> Tuple[str, ...]:
+    """
+    Get the generated contents of a job that its documents are rendered from, in the order of DOCUMENT_COLUMNS.
+    A plain tuple of strings, compact to send to a rendering process; contents not generated are empty.
+    """
+    payload = []
+    for column in DOCUMENT_COLUMNS:
+        value = job.get(column)
+        payload.append(value if isinstance(value, str) else "")
+    return tuple(payload)
+
+
+def render_documents(payload: Tuple[str, ...], resume_path: str) -> List[Tuple[str, bytes]]:
+    """
+    Render the documents of a job from its document payload (see get_document_payload).
+    Returns the file name and content of each document.
+    """
+    from src.template_cache import TEMPLATE_CACHE, save_docx
+
+    contents = dict(zip(DOCUMENT_COLUMNS, payload))
+
+    # Render the resume, replacing jinja2 variables, from a copy of the template parsed once
     resume_variables = {
-        "resume_professional_summary": job["Resume"],
+        "resume_professional_summary": contents["Resume"],
     }
-    resume = docxtpl.DocxTemplate(resume_path)
-    resume.render(resume_variables)
-    resume_file_path = os.path.join(job_folder, "Resume.docx")
-    resume.save(resume_file_path)
-    google_drive_handler.upload_file("Resume.docx", resume_file_path, job_folder_id)
-
-    cover_letter_text = job["Cover Letter"]
-    cover_letter_doc = docx.Document()
+    files = [("Resume.docx", TEMPLATE_CACHE.render(resume_path, resume_variables))]
+
+    cover_letter_text = contents["Cover Letter"]
+    cover_letter_doc = TEMPLATE_CACHE.clone()
     cover_letter_doc.add_paragraph(cover_letter_text)
-    cover_letter_file_path = os.path.join(job_folder, "Cover Letter.docx")
-    cover_letter_doc.save(cover_letter_file_path)
-    google_drive_handler.upload_file("Cover Letter.docx", cover_letter_file_path, job_folder_id)
+    files.append(("Cover Letter.docx", save_docx(cover_letter_doc)))
 
-    email = job["Message Subject"] + "\n\n" + job["Message Content"]
-    email_file_path = os.path.join(job_folder, "Email.txt")
-    with open(email_file_path, "w", encoding="utf-8") as file:
-        file.write(email)
-    google_drive_handler.upload_file("Email.txt", email_file_path, job_folder_id)
+    # The email and LinkedIn note are only generated when Gmail and LinkedIn are used
+    if contents["Message Content"]:
+        email = contents["Message Subject"] + "\n\n" + contents["Message Content"]
+        files.append(("Email.txt", email.encode("utf-8")))
 
-    linkedin_note = job["LinkedIn Note"]
-    linkedin_note_file_path = os.path.join(job_folder, "LinkedIn Note.txt")
-    with open(linkedin_note_file_path, "w", encoding="utf-8") as file:
-        file.write(linkedin_note)
-    google_drive_handler.upload_file("LinkedIn Note.txt", linkedin_note_file_path, job_folder_id)
+    if contents["LinkedIn Note"]:
+        files.append(("LinkedIn Note.txt", contents["LinkedIn Note"].encode("utf-8")))
+
+    return files
+
+
+def write_file_if_changed(path: str, content: bytes) -> bool:
+    """
+    Write a file unless it already holds the given content.
+    Returns whether the file was written.
+    """
+    if os.path.isfile(path) and os.path.getsize(path) == len(content):
+        with open(path, "rb") as file:
+            if file.read() == content:
+                return False
+    with open(path, "wb") as file:
+        file.write(content)
+    return True
+
+
+def parse_optional_argument(arg_name: str, value, default_value):
+    """
+    Convert an optional argument to the type of its default value.
+    Values coming from the environment, the web form or the GUI are strings.
+    """
+    if value is None or value == "":
+        return default_value
+    if isinstance(default_value, bool):
+        return value if isinstance(value, bool) else str(value).strip().lower() in ("true", "1", "yes")
+    try:
+        return type(default_value)(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for optional argument '{arg_name}': {value}")
 
 
 def validate_arguments(args: dict) -> dict:
@@ -155,6 +317,13 @@ def validate_arguments(args: dict) -> dict:
         validate_args["USE_LINKEDIN"] = False
         validate_args["INTERACTIVE"] = False
 
+    # Fall back to the environment and then to the default for optional arguments
+    for arg_name, default_value in OPTIONAL_ARGUMENTS.items():
+        value = args.get(arg_name)
+        if value is None or value == "":
+            value = os.getenv(arg_name)
+        validate_args[arg_name] = parse_optional_argument(arg_name, value, default_value)
+
     # validate_args["LLM_API_URL"] = validate_args["LLM_API_URL"].strip()
     # if not validate_args["LLM_API_URL"].startswith("https://"):
     #     raise ValueError(f"LLM_API_URL must start with 'https://'.")
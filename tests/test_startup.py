@@ -0,0 +1,39 @@
+"""
+Startup checks of the aijobapply CLI entry point, see benchmarks/startup_benchmark.py.
+
+The startup time is checked against a generous budget of DEFAULT_STARTUP_BUDGET seconds over the
+interpreter startup, which the AIJOBAPPLY_STARTUP_BUDGET environment variable overrides.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.startup_benchmark import (COMMANDS, ROOT_FOLDER,
+                                          eagerly_imported_modules,
+                                          time_command)
+
+# Seconds over the interpreter startup, generous so slow machines pass, heavy imports are caught by
+# test_cli_does_not_import_heavy_modules
+DEFAULT_STARTUP_BUDGET = 2.0
+
+
+def test_cli_does_not_import_heavy_modules():
+    # None of HEAVY_MODULES may be imported before jobs are processed
+    assert eagerly_imported_modules() == []
+
+
+def test_cli_help_runs():
+    result = subprocess.run(
+        [sys.executable, "-m", "aijobapply.main", "--help"], cwd=ROOT_FOLDER, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert "--LLM_API_KEY" in result.stdout
+
+
+@pytest.mark.parametrize("command", ["import aijobapply.main", "aijobapply --help"])
+def test_cli_startup_within_budget(command):
+    budget = float(os.environ.get("AIJOBAPPLY_STARTUP_BUDGET") or DEFAULT_STARTUP_BUDGET)
+    baseline = time_command(["-c", "pass"], runs=3)
+    assert time_command(COMMANDS[command], runs=3) - baseline <= budget